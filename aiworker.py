@@ -0,0 +1,142 @@
+import copy
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import ACTIONS, POINTS_TO_NEXT_LEVEL
+from profiler import PROFILER
+
+PLAN_DEADLINE = 0.008
+
+
+class EnemyPlan:
+    __slots__ = ("positions", "team_targets", "ai_state", "held")
+
+    def __init__(self, positions, team_targets, ai_state, held=False):
+        self.positions = positions
+        self.team_targets = team_targets
+        self.ai_state = ai_state
+        self.held = held
+
+    @classmethod
+    def hold(cls, game):
+        return cls(game.enemy_positions, (game.team_target_1, game.team_target_2), game.ai_rng.getstate(), True)
+
+
+def plan_key(game):
+    # Everything a player move can change before the ghosts plan their next step.
+    return (game.player_pos, game.last_player_direction, game.score)
+
+
+def snapshot(game):
+    # What the worker plans from: the game at the end of a tick. The food index and RNG are
+    # copied because the main thread keeps mutating its own; the maze and routing table are
+    # shared (a lazy routing table guards its fields with a lock and at worst builds the
+    # same one twice).
+    other = copy.copy(game)
+    other.prefetcher = None
+    other.planner = None
+    other.food = game.food.copy()
+    other.enemy_positions = list(game.enemy_positions)
+    other.ai_rng = random.Random()
+    other.ai_rng.setstate(game.ai_rng.getstate())
+    return other
+
+
+def after_move(state, action):
+    # The state one tick on if the player sends action, or None when that move would end
+    # the level: the next level is not known until the main thread builds it.
+    game = copy.copy(state)
+    game.player_field = None
+    if action and game.maze.is_open(game.player_pos, action):
+        new_pos = (game.player_pos[0] + action[0], game.player_pos[1] + action[1])
+        game.player_pos = new_pos
+        game.last_player_direction = action
+        if new_pos in state.food:
+            if game.score + 1 >= POINTS_TO_NEXT_LEVEL * game.level:
+                return None
+            game.food = state.food.copy()
+            game.food.remove(new_pos)
+            game.score += 1
+    game.tick += 1
+    game.ai_rng = random.Random()
+    game.ai_rng.setstate(state.ai_rng.getstate())
+    return game
+
+
+class GhostWorker:
+    # Plans the next enemy tick on a worker thread while the frame is drawn. request() is
+    # called at the end of the tick before an enemy tick; the worker then plans the ghosts'
+    # answer to every move the player could make, the likeliest first. take() hands the one
+    # matching the move actually made to update_enemies, so the game plays exactly as if it
+    # had planned inline. If that plan is not ready within deadline seconds, the ghosts hold
+    # this tick instead of stalling the frame. A move that ends the level, or a tick that was
+    # never requested, is planned inline.
+    def __init__(self, deadline=PLAN_DEADLINE):
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ghost-ai")
+        self.condition = threading.Condition()
+        self.plans = {}
+        self.requested = None
+        self.future = None
+        self.hits = 0
+        self.misses = 0
+        self.held = 0
+
+    def request(self, game):
+        state = snapshot(game)
+        with self.condition:
+            self.requested = (game.seed, game.level_serial, game.tick + 1)
+            self.plans = {}
+            self.future = self.executor.submit(self._plan, state, self.requested)
+            self.future.add_done_callback(self._notify)
+
+    def _plan(self, state, requested):
+        moves = [state.last_player_direction if state.last_player_direction in ACTIONS else None, None]
+        moves += [action for action in ACTIONS if action not in moves]
+        for action in moves:
+            if self.requested != requested:
+                return
+            game = after_move(state, action)
+            if game is None:
+                continue
+            positions = game.plan_enemies()
+            plan = EnemyPlan(positions, (game.team_target_1, game.team_target_2), game.ai_rng.getstate())
+            with self.condition:
+                if self.requested != requested:
+                    return
+                self.plans[plan_key(game)] = plan
+                self.condition.notify_all()
+
+    def _notify(self, future):
+        with self.condition:
+            self.condition.notify_all()
+
+    def take(self, game):
+        plan = None
+        with self.condition:
+            future = self.future
+            if self.requested == (game.seed, game.level_serial, game.tick):
+                key = plan_key(game)
+                self.condition.wait_for(lambda: key in self.plans or future.done(), self.deadline)
+                plan = self.plans.get(key)
+                if plan is None and not future.done():
+                    plan = EnemyPlan.hold(game)
+            self.requested = None
+        if plan is None:
+            self.misses += 1
+            counter = "ai.plan_misses"
+        elif plan.held:
+            self.held += 1
+            counter = "ai.plan_held"
+        else:
+            self.hits += 1
+            counter = "ai.plan_hits"
+        if PROFILER.enabled:
+            PROFILER.count(counter)
+        return plan
+
+    def close(self):
+        with self.condition:
+            self.requested = None
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,333 @@
+import argparse
+import random
+import time
+
+import numpy as np
+
+from engine import (DEFAULT_CONFIG, ENEMY_PERIOD, LEVEL_COUNT, POINTS_TO_NEXT_LEVEL, ROLES, LevelConfig, build_level, get_zone,
+                    role_choices)
+from maze import DELTAS
+from routing import FULL_TABLE_CELLS, DistanceField, GapIndex
+
+# Games share a pool of boards; each board carries its all-pairs next-hop and distance
+# tables, so every ghost decision is a handful of gathers into them. Actions use the
+# replay encoding: 0 is no input, 1-4 are ACTIONS in order. Boards are drawn from the
+# pool and ghost coin flips from a per-game xorshift64* stream, so a batch reproduces
+# itself from its seed but not the levels or random ghosts of a Game with the same seed.
+# Every other decision matches Game tick for tick on the same board.
+
+FAR = np.iinfo(np.uint16).max
+GOLDEN = 0x9E3779B97F4A7C15
+
+ROLE_RANDOM, ROLE_BFS, ROLE_PREDICT, ROLE_FOOD_HUNTER, ROLE_TEAM = range(len(ROLES))
+
+# Behaviours: what a ghost slot does for the rest of a level, given its role and the team mode.
+(RANDOM, CHASE, PREDICT, FOOD_HUNTER, ZONE_ABOVE, ZONE_BELOW, GAP_ABOVE, GAP_BELOW,
+ TEAM_PREDICT, TEAM_FOOD_HUNTER) = range(10)
+INDEPENDENT = np.array([RANDOM, CHASE, PREDICT, FOOD_HUNTER, CHASE], dtype=np.int8)
+HUNTERS = np.array([FOOD_HUNTER, TEAM_FOOD_HUNTER], dtype=np.int8)
+
+# Candidate targets, chosen per behaviour. A ghost next to the player always targets it;
+# JUMPS marks the behaviours that then step onto it without checking the cells taken.
+(T_PLAYER, T_PREDICTED, T_FOOD_OR_STAY, T_FOOD_OR_PLAYER, T_ZONE_ABOVE, T_ZONE_BELOW,
+ T_GAP_ABOVE, T_GAP_BELOW) = range(8)
+TARGETS = np.array([T_PLAYER, T_PLAYER, T_PREDICTED, T_FOOD_OR_STAY, T_ZONE_ABOVE, T_ZONE_BELOW,
+                    T_GAP_ABOVE, T_GAP_BELOW, T_PREDICTED, T_FOOD_OR_PLAYER], dtype=np.int8)
+JUMPS = np.array([1, 0, 1, 1, 0, 0, 1, 1, 0, 0], dtype=bool)
+
+# Random moves: the r-th open direction of a wall mask, as in random.choice(neighbors).
+OPEN_COUNT = np.array([bin(~mask & 15).count("1") for mask in range(16)], dtype=np.uint64)
+NTH_OPEN = np.full((16, 4), 4, dtype=np.int64)
+for mask in range(16):
+    for r, d in enumerate(d for d in range(4) if not mask >> d & 1):
+        NTH_OPEN[mask, r] = d
+# CAN_MOVE[mask, action]: the action is not blocked by the wall mask.
+CAN_MOVE = np.array([[a > 0 and not mask >> (a - 1) & 1 for a in range(5)] for mask in range(16)])
+
+
+# ROLE_TABLE[level, coin]: role codes of the lineup roles_for_level picks for either coin outcome.
+ROLE_TABLE = np.array([[[ROLES.index(role) for role in roles] for roles in role_choices(level)]
+                       for level in range(LEVEL_COUNT + 1)], dtype=np.int8)
+
+
+def splitmix64(values):
+    z = values + np.uint64(GOLDEN)
+    z = (z ^ (z >> 30)) * np.uint64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> 27)) * np.uint64(0x94D049BB133111EB)
+    return z ^ (z >> 31)
+
+
+class LevelPool:
+    # Stacked per-board arrays for boards of one size. hops[m, s, g] is the routing table's
+    # next-hop code (NO_HOP when there is none) and dist[m, s, g] the path length, FAR when
+    # unreachable. A ghost chasing the player takes the lowest direction on a shortest path
+    # either way, so the player distance field of Game needs no table of its own.
+    def __init__(self, builds, config=DEFAULT_CONFIG):
+        builds = list(builds)
+        if not builds:
+            raise ValueError("a level pool needs at least one level")
+        width, height = config.width, config.height
+        cells = width * height
+        if cells > FULL_TABLE_CELLS:
+            raise ValueError(f"batched games need boards of at most {FULL_TABLE_CELLS} cells, not {width}x{height}")
+        self.config = config
+        self.width = width
+        self.height = height
+        self.cells = cells
+        count = len(builds)
+        self.walls = np.zeros((count, cells), dtype=np.uint8)
+        self.food = np.zeros((count, cells), dtype=bool)
+        self.hops = np.zeros((count, cells, cells), dtype=np.uint8)
+        self.dist = np.zeros((count, cells, cells), dtype=np.uint16)
+        self.gap_above = np.zeros((count, cells), dtype=np.int32)
+        self.gap_below = np.zeros((count, cells), dtype=np.int32)
+        for m, build in enumerate(builds):
+            maze = build.maze
+            if (maze.width, maze.height) != (width, height):
+                raise ValueError(f"level is {maze.width}x{maze.height}, pool is {width}x{height}")
+            self.walls[m] = np.frombuffer(bytes(maze.walls), dtype=np.uint8)
+            self.food[m] = np.array(build.grid, dtype=bool).ravel()
+            routing = build.routing
+            for s in range(cells):
+                self.hops[m, s] = np.frombuffer(bytes(routing.hop_row(s)), dtype=np.uint8)
+                dist = routing.distances_to((s % width, s // width))
+                if dist is None:
+                    dist = DistanceField(maze, (s % width, s // width)).dist
+                dist = np.frombuffer(dist, dtype=np.int32)
+                self.dist[m, s] = np.where(dist < 0, FAR, dist)
+            gaps = GapIndex(maze, build.sorted_rows)
+            for y in range(height):
+                band = gaps.band(y)
+                above, below = gaps.gap_above(band), gaps.gap_below(band)
+                self.gap_above[m, y * width:(y + 1) * width] = -1 if above is None else above[1] * width + above[0]
+                self.gap_below[m, y * width:(y + 1) * width] = -1 if below is None else below[1] * width + below[0]
+
+    def __len__(self):
+        return len(self.walls)
+
+    @classmethod
+    def generate(cls, count, config=DEFAULT_CONFIG, seed=0):
+        builds = [build_level(1, random.Random(f"{seed}:pool:{i}").getstate(), config) for i in range(count)]
+        return cls(builds, config)
+
+    @classmethod
+    def from_cache(cls, cache, indices=None):
+        if indices is None:
+            indices = range(len(cache))
+        return cls((cache.level(i) for i in indices), cache.config)
+
+
+class BatchGame:
+    # n independent games advanced together. All state is public, one row per game:
+    # player (n,), enemies (n, 4) and food (n, cells) hold flat cell indices y * width + x,
+    # board is the pool index of each game's current level. Finished games stay frozen
+    # until reset() is called for them. Ghosts move every enemy_period ticks, ENEMY_PERIOD
+    # by default as in the real game.
+    def __init__(self, n, pool, seed=0, enemy_period=ENEMY_PERIOD):
+        config = pool.config
+        width, cells = pool.width, pool.cells
+        self.n = n
+        self.pool = pool
+        self.enemy_period = enemy_period
+        self.width = width
+        self.cells = cells
+        self.start = config.player_start()[1] * width + config.player_start()[0]
+        self.enemy_starts = np.array([y * width + x for x, y in config.enemy_starts()], dtype=np.int64)
+        self.action_steps = np.array([0] + [dy * width + dx for dx, dy in DELTAS], dtype=np.int64)
+        self.hop_steps = np.zeros(256, dtype=np.int64)
+        self.hop_steps[:4] = self.action_steps[1:]
+        # Per-cell targets of the team mode 1 interceptors and of the predicter, by last action.
+        zone = np.array([get_zone(c // width, config.bands) for c in range(cells)])
+        bands = config.bands
+        self.zone = zone
+        self.zone_above = np.array([c if zone[c] == 0 else bands[zone[c] - 1][1] * width + c % width
+                                    for c in range(cells)], dtype=np.int64)
+        self.zone_below = np.array([c if zone[c] == len(bands) - 1 else bands[zone[c] + 1][0] * width + c % width
+                                    for c in range(cells)], dtype=np.int64)
+        predicted = np.arange(cells, dtype=np.int64)[None, :].repeat(5, axis=0)
+        for a, (dx, dy) in enumerate(DELTAS, 1):
+            for c in range(cells):
+                x, y = c % width + 2 * dx, c // width + 2 * dy
+                if 0 <= x < width and 0 <= y < config.height:
+                    predicted[a, c] = y * width + x
+        self.predicted = predicted.ravel()
+        self.walls = pool.walls.ravel()
+        self.hops = pool.hops.ravel()
+        self.dist = pool.dist.ravel()
+        self.gap_above = pool.gap_above.ravel()
+        self.gap_below = pool.gap_below.ravel()
+
+        self.rows = np.arange(n)
+        self.rng = splitmix64(np.full(n, seed, dtype=np.uint64) * np.uint64(GOLDEN) + np.arange(1, n + 1, dtype=np.uint64))
+        self.rng[self.rng == 0] = 1
+        self.board = np.zeros(n, dtype=np.int64)
+        self.level = np.zeros(n, dtype=np.int64)
+        self.team_mode = np.zeros(n, dtype=np.int8)
+        self.score = np.zeros(n, dtype=np.int64)
+        self.tick = np.zeros(n, dtype=np.int64)
+        self.player = np.zeros(n, dtype=np.int64)
+        self.last_action = np.zeros(n, dtype=np.int64)
+        self.enemies = np.zeros((n, 4), dtype=np.int64)
+        self.roles = np.zeros((n, 4), dtype=np.int8)
+        self.behaviours = np.zeros((n, 4), dtype=np.int8)
+        self.hunts = np.zeros(n, dtype=bool)
+        self.food = np.zeros((n, cells), dtype=bool)
+        self.over = np.zeros(n, dtype=bool)
+        self.won = np.zeros(n, dtype=bool)
+        self.reset()
+
+    def draw(self, games):
+        # Advances the xorshift64* stream of each game in games and returns one word per game.
+        x = self.rng[games]
+        x ^= x >> np.uint64(12)
+        x ^= x << np.uint64(25)
+        x ^= x >> np.uint64(27)
+        self.rng[games] = x
+        return x * np.uint64(0x2545F4914F6CDD1D)
+
+    def reset(self, mask=None):
+        games = self.rows if mask is None else np.flatnonzero(mask)
+        self.level[games] = 1
+        self.team_mode[games] = 0
+        self.score[games] = 0
+        self.tick[games] = 0
+        self.over[games] = False
+        self.won[games] = False
+        self.start_level(games, advance=False)
+
+    def start_level(self, games, advance):
+        # Bits 0-31 of the draw pick the board, bit 32 the team mode, bit 33 the role coin.
+        word = self.draw(games)
+        board = (word & np.uint64(0xFFFFFFFF)) % np.uint64(len(self.pool))
+        self.board[games] = board
+        if advance:
+            self.team_mode[games] = np.where(word >> np.uint64(32) & np.uint64(1), 2, 1)
+        self.food[games] = self.pool.food[board]
+        self.player[games] = self.start
+        self.last_action[games] = 0
+        self.enemies[games] = self.enemy_starts
+        self.set_roles(games, ROLE_TABLE[self.level[games], (word >> np.uint64(33) & np.uint64(1)).astype(np.int64)])
+
+    def set_roles(self, games, roles):
+        # roles holds ROLES codes, one row of four per game; levels above 5 play as a team.
+        roles = np.asarray(roles, dtype=np.int8)
+        self.roles[games] = roles
+        behaviours = INDEPENDENT[roles]
+        team = self.level[games] > 5
+        zone = self.team_mode[games][team] == 1
+        behaviours[team, 0] = CHASE
+        behaviours[team, 1] = np.where(zone, ZONE_ABOVE, GAP_ABOVE)
+        behaviours[team, 2] = np.where(zone, ZONE_BELOW, GAP_BELOW)
+        behaviours[team, 3] = np.where(roles[team, 3] == ROLE_PREDICT, TEAM_PREDICT, TEAM_FOOD_HUNTER)
+        self.behaviours[games] = behaviours
+        self.hunts[games] = np.isin(behaviours, HUNTERS).any(axis=1)
+
+    def step(self, actions):
+        # Returns the score each game gained this tick and which games finished on it.
+        actions = np.asarray(actions, dtype=np.int64)
+        alive = ~self.over
+        player = self.player
+        cells = self.cells
+        board_cells = self.board * cells
+        moved = alive & CAN_MOVE[self.walls[board_cells + player], actions]
+        player = np.where(moved, player + self.action_steps[actions], player)
+        self.player = player
+        self.last_action = np.where(moved, actions, self.last_action)
+        eaten = moved & self.food[self.rows, player]
+        self.food[self.rows[eaten], player[eaten]] = False
+        self.score += eaten
+        levelled = eaten & (self.score >= POINTS_TO_NEXT_LEVEL * self.level)
+        if levelled.any():
+            won = levelled & (self.level == LEVEL_COUNT)
+            self.won |= won
+            self.over |= won
+            advanced = np.flatnonzero(levelled & ~won)
+            if len(advanced):
+                self.level[advanced] += 1
+                self.start_level(advanced, advance=True)
+                board_cells = self.board * cells
+        self.tick += alive
+        ghosts = alive & ~self.over
+        if self.enemy_period > 1:
+            ghosts &= self.tick % self.enemy_period == 0
+        if ghosts.any():
+            self.update_enemies(ghosts, board_cells)
+        return eaten.astype(np.int64), alive & self.over
+
+    def nearest_food(self, games):
+        # The pellet Game.nearest_food_to_player returns (lowest index on ties), or -1.
+        dist = self.pool.dist.reshape(-1, self.cells)[self.board[games] * self.cells + self.player[games]]
+        dist = np.where(self.food[games], dist, FAR)
+        nearest = dist.argmin(axis=1)
+        return np.where(dist[np.arange(len(games)), nearest] == FAR, -1, nearest)
+
+    def update_enemies(self, moving, board_cells):
+        cells = self.cells
+        player = self.player
+        base = board_cells * cells
+        food = np.full(self.n, -1, dtype=np.int64)
+        hunting = np.flatnonzero(moving & self.hunts)
+        if len(hunting):
+            food[hunting] = self.nearest_food(hunting)
+        food_or_player = np.where(food < 0, player, food)
+        predicted = self.predicted[self.last_action * cells + player]
+        gap_above = self.gap_above[board_cells + player]
+        gap_above = np.where(gap_above < 0, player, gap_above)
+        gap_below = self.gap_below[board_cells + player]
+        gap_below = np.where(gap_below < 0, player, gap_below)
+        player_zone = self.zone[player]
+        enemy_walls = self.walls[board_cells[:, None] + self.enemies]
+        word = self.draw(self.rows)
+        new = []
+        for k in range(4):
+            pos = self.enemies[:, k]
+            behaviour = self.behaviours[:, k]
+            adjacent = self.dist[base + pos * cells + player] == 1
+            same_zone = self.zone[pos] == player_zone
+            candidates = [player, predicted, np.where(food < 0, pos, food), food_or_player,
+                          np.where(same_zone, player, self.zone_above[player]),
+                          np.where(same_zone, player, self.zone_below[player]), gap_above, gap_below]
+            target = np.where(adjacent, player, np.choose(TARGETS[behaviour], candidates))
+            step = pos + self.hop_steps[self.hops[base + pos * cells + target]]
+            for taken in new:
+                step = np.where(step == taken, pos, step)
+            mask = enemy_walls[:, k]
+            r = (word >> np.uint64(16 * k) & np.uint64(0xFFFF)) * OPEN_COUNT[mask] >> np.uint64(16)
+            wander = pos + self.hop_steps[NTH_OPEN[mask, r.astype(np.int64)]]
+            step = np.where(behaviour == RANDOM, wander, step)
+            new.append(np.where(adjacent & JUMPS[behaviour], player, step))
+        new = np.stack(new, axis=1)
+        self.enemies = np.where(moving[:, None], new, self.enemies)
+        self.over |= moving & (new == player[:, None]).any(axis=1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure batched simulation throughput")
+    parser.add_argument("--games", type=int, default=4096)
+    parser.add_argument("--steps", type=int, default=1000)
+    parser.add_argument("--pool", type=int, default=32, help="number of distinct boards")
+    parser.add_argument("--width", type=int, default=DEFAULT_CONFIG.width)
+    parser.add_argument("--height", type=int, default=DEFAULT_CONFIG.height)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--enemy-period", type=int, default=ENEMY_PERIOD, help="ticks between ghost moves")
+    args = parser.parse_args(argv)
+
+    config = LevelConfig(args.width, args.height)
+    start = time.perf_counter()
+    pool = LevelPool.generate(args.pool, config, args.seed)
+    batch = BatchGame(args.games, pool, args.seed, args.enemy_period)
+    print(f"{args.pool} boards ready in {time.perf_counter() - start:.1f}s")
+    actions = np.random.default_rng(args.seed).integers(0, 5, size=(64, args.games))
+    ticks = 0
+    start = time.perf_counter()
+    for i in range(args.steps):
+        ticks += int((~batch.over).sum())
+        _, done = batch.step(actions[i % len(actions)])
+        if done.any():
+            batch.reset(done)
+    elapsed = time.perf_counter() - start
+    print(f"{ticks} game ticks in {elapsed:.2f}s: {ticks / elapsed:,.0f} ticks/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,277 @@
+import argparse
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from coop import CooperativePlanner
+from engine import ACTIONS, GRID_WIDTH, Game, LevelConfig, find_nearest_food_to_player, generate_level, is_connected
+from lookahead import RolloutSearch
+
+# Every case is a setup(size, spacing, rng) -> op pair; op is timed once per iteration.
+# Barrier density is controlled through the wall row spacing: 3 is the game's default,
+# larger values leave fewer walls.
+
+# Cases the game runs inside a frame: at its default size their p99 has to fit in one 60 fps
+# frame, or main() exits with an error.
+FRAME_US = 1e6 / 60
+FRAME_CASES = {"enemy_tick_search"}
+
+ROLE_MIXES = {
+    "random": ["random"],
+    "bfs": ["bfs"],
+    "predict": ["predict"],
+    "food_hunter": ["food_hunter"],
+    "mixed": ["bfs", "predict", "food_hunter", "random"],
+    "team1": None,
+    "team2": None,
+}
+
+
+def make_config(size, spacing):
+    backend = "python" if size <= 100 else "numpy"
+    return LevelConfig(size, size, row_spacing=spacing, backend=backend)
+
+
+def make_game(size, spacing, rng):
+    return Game(rng.getrandbits(32), make_config(size, spacing))
+
+
+def random_cell(game, rng):
+    return (rng.randrange(game.width), rng.randrange(game.height))
+
+
+def wander(game, rng):
+    # Moves the player without eating, so the timed op never includes a level transition.
+    game.player_pos = rng.choice(game.maze.neighbor_cells(game.player_pos))
+    game.last_player_direction = rng.choice(ACTIONS)
+    game.player_field = None
+
+
+def setup_bfs(size, spacing, rng, **_):
+    game = make_game(size, spacing, rng)
+    return lambda: game.maze.bfs(random_cell(game, rng), random_cell(game, rng))
+
+
+def setup_is_connected(size, spacing, rng, **_):
+    game = make_game(size, spacing, rng)
+    return lambda: is_connected(game.player_pos, game.maze)
+
+
+def setup_generate_level(size, spacing, rng, **_):
+    config = make_config(size, spacing)
+    return lambda: generate_level(1, config.player_start(), rng, config)
+
+
+def setup_nearest_food(size, spacing, rng, **_):
+    game = make_game(size, spacing, rng)
+
+    def op():
+        wander(game, rng)
+        return game.nearest_food_to_player()
+    return op
+
+
+def setup_nearest_food_reference(size, spacing, rng, **_):
+    game = make_game(size, spacing, rng)
+
+    def op():
+        wander(game, rng)
+        return find_nearest_food_to_player(game.grid, game.player_pos, game.maze)
+    return op
+
+
+def setup_enemy_tick(size, spacing, rng, mix="mixed", enemies=4, coordinator=None, searcher=None, **_):
+    game = make_game(size, spacing, rng)
+    game.coordinator = coordinator
+    game.searcher = searcher
+    if ROLE_MIXES[mix] is None:
+        game.level = 6
+        game.team_mode = 1 if mix == "team1" else 2
+        game.enemy_team_mode = True
+        game.enemy_roles = ['bfs', 'team', 'team', rng.choice(['predict', 'food_hunter'])]
+        game.enemy_positions = game.config.enemy_starts()
+    else:
+        roles = ROLE_MIXES[mix]
+        game.enemy_team_mode = False
+        game.enemy_roles = [roles[i % len(roles)] for i in range(enemies)]
+        game.enemy_positions = [random_cell(game, rng) for _ in range(enemies)]
+
+    def op():
+        wander(game, rng)
+        game.update_enemies()
+        game.game_over = False
+    return op
+
+
+def setup_enemy_tick_coop(size, spacing, rng, **params):
+    return setup_enemy_tick(size, spacing, rng, coordinator=CooperativePlanner(), **params)
+
+
+def setup_enemy_tick_search(size, spacing, rng, **params):
+    return setup_enemy_tick(size, spacing, rng, searcher=RolloutSearch(), **params)
+
+
+CASES = {
+    "bfs": setup_bfs,
+    "is_connected": setup_is_connected,
+    "generate_level": setup_generate_level,
+    "nearest_food": setup_nearest_food,
+    "nearest_food_reference": setup_nearest_food_reference,
+    "enemy_tick": setup_enemy_tick,
+    "enemy_tick_coop": setup_enemy_tick_coop,
+    "enemy_tick_search": setup_enemy_tick_search,
+}
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def traced_peak(name, size, spacing, calls, seed, **params):
+    # Peak traced memory over setup and calls ops, on a fresh setup seeded like the timed run
+    # so it makes the same calls; tracing would slow the timed run itself.
+    rng = random.Random(seed)
+    tracemalloc.start()
+    op = CASES[name](size, spacing, rng, **params)
+    for _ in range(calls):
+        op()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+
+def run_case(name, size, spacing, ops, max_seconds, seed, run_memory=True, **params):
+    warmup = min(ops, 3)
+    peak = traced_peak(name, size, spacing, warmup, seed, **params)
+    rng = random.Random(seed)
+    op = CASES[name](size, spacing, rng, **params)
+    for _ in range(warmup):
+        op()
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + max_seconds
+    for i in range(ops):
+        t0 = time.perf_counter_ns()
+        op()
+        latencies.append(time.perf_counter_ns() - t0)
+        if i >= 2 and time.perf_counter() > deadline:
+            break
+    total = sum(latencies) / 1e9
+    latencies.sort()
+    result = {
+        "case": name,
+        "size": size,
+        "row_spacing": spacing,
+        "ops": len(latencies),
+        "ops_per_sec": len(latencies) / total if total else float("inf"),
+        "p50_us": percentile(latencies, 0.50) / 1000,
+        "p99_us": percentile(latencies, 0.99) / 1000,
+        "peak_mem_bytes": peak,
+        "run_peak_mem_bytes": traced_peak(name, size, spacing, warmup + len(latencies), seed, **params)
+        if run_memory else None,
+    }
+    result.update(params)
+    return result
+
+
+def iter_cases(args):
+    for size in args.sizes:
+        for spacing in args.spacings:
+            for name in args.cases:
+                if name.startswith("enemy_tick"):
+                    for mix in args.mixes:
+                        yield name, size, spacing, {"mix": mix, "enemies": args.enemies}
+                else:
+                    yield name, size, spacing, {}
+
+
+def case_id(result):
+    parts = [result["case"], f"{result['size']}x{result['size']}", f"s{result['row_spacing']}"]
+    if "mix" in result:
+        parts.append(f"{result['mix']}/{result['enemies']}")
+    return " ".join(parts)
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline_path, results):
+    with open(baseline_path) as f:
+        baseline = {case_id(r): r for r in json.load(f)["results"]}
+    print(f"\n{'case':<44} {'before':>12} {'after':>12} {'speedup':>8}")
+    for result in results:
+        key = case_id(result)
+        if key in baseline:
+            before = baseline[key]["ops_per_sec"]
+            after = result["ops_per_sec"]
+            print(f"{key:<44} {before:>12.1f} {after:>12.1f} {after / before:>7.2f}x")
+
+
+def parse_list(cast):
+    return lambda text: [cast(item) for item in text.split(",") if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Headless Pac-Man benchmarks")
+    parser.add_argument("--cases", type=parse_list(str), default=list(CASES))
+    parser.add_argument("--sizes", type=parse_list(int), default=[15, 50, 200, 1000])
+    parser.add_argument("--spacings", type=parse_list(int), default=[3, 6])
+    parser.add_argument("--mixes", type=parse_list(str), default=list(ROLE_MIXES))
+    parser.add_argument("--enemies", type=int, default=4)
+    parser.add_argument("--ops", type=int, default=200, help="iterations per case")
+    parser.add_argument("--max-seconds", type=float, default=2.0, help="time budget per case")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-run-memory", action="store_true",
+                        help="skip the traced replay of each timed run that measures run_peak_mem_bytes")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="print speedups against an earlier results file")
+    args = parser.parse_args(argv)
+    for name in args.cases:
+        if name not in CASES:
+            parser.error(f"unknown case {name}; choose from {', '.join(CASES)}")
+    for mix in args.mixes:
+        if mix not in ROLE_MIXES:
+            parser.error(f"unknown role mix {mix}; choose from {', '.join(ROLE_MIXES)}")
+
+    results = []
+    print(f"{'case':<44} {'ops/s':>12} {'p50 us':>10} {'p99 us':>10} {'peak MB':>9} {'run MB':>9}")
+    for name, size, spacing, params in iter_cases(args):
+        result = run_case(name, size, spacing, args.ops, args.max_seconds, args.seed, not args.no_run_memory,
+                          **params)
+        results.append(result)
+        run_peak = result["run_peak_mem_bytes"]
+        print(f"{case_id(result):<44} {result['ops_per_sec']:>12.1f} {result['p50_us']:>10.1f} "
+              f"{result['p99_us']:>10.1f} {result['peak_mem_bytes'] / 1e6:>9.2f} "
+              f"{'-' if run_peak is None else f'{run_peak / 1e6:.2f}':>9}")
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"results written to {args.output}")
+    if args.compare:
+        compare(args.compare, results)
+    late = [r for r in results if r["case"] in FRAME_CASES and r["size"] == GRID_WIDTH and r["p99_us"] > FRAME_US]
+    for result in late:
+        print(f"{case_id(result)}: p99 {result['p99_us'] / 1000:.1f} ms is over a {FRAME_US / 1000:.1f} ms frame")
+    if late:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
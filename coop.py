@@ -0,0 +1,146 @@
+import heapq
+import time
+
+from profiler import PROFILER
+from routing import UNREACHABLE, DistanceField
+
+COOP_WINDOW = 8
+COOP_NODE_BUDGET = 20000
+
+
+class CooperativePlanner:
+    # Windowed cooperative A*: ghosts plan one after another, nearest to their target first,
+    # through (cell, tick) space for window ticks ahead, avoiding the cells and the swaps
+    # already reserved by the ghosts before them. Only the first step of each plan is taken;
+    # the rest is planned again next tick. The heuristic is the exact maze distance to the
+    # target from the level's routing rows (the player distance field for the player), so a
+    # ghost nobody is in the way of expands little more than its own path.
+    #
+    # node_budget caps the A* expansions per tick; once it is spent the remaining ghosts take
+    # the greedy step_towards move, avoiding the cells already reserved for the next tick.
+    # time_budget (seconds) adds a wall-clock cap on top, which makes the outcome depend on
+    # the machine: replays of games planned with one may not reproduce.
+    #
+    # The player's cell is never reserved, so any number of ghosts may close in on it.
+    def __init__(self, window=COOP_WINDOW, node_budget=COOP_NODE_BUDGET, time_budget=None):
+        self.window = window
+        self.node_budget = node_budget
+        self.time_budget = time_budget
+        self.expansions = 0
+        self.fallbacks = 0
+
+    def plan(self, game):
+        deadline = None if self.time_budget is None else time.perf_counter() + self.time_budget
+        maze = game.maze
+        width = maze.width
+        player = game.player_pos[1] * width + game.player_pos[0]
+        positions = game.enemy_positions
+        targets = game.enemy_targets()
+        new_positions = [None] * len(positions)
+        reserved = set()
+        swaps = set()
+        # Random ghosts move first, to a neighbour no other random ghost took, so they draw
+        # from the AI stream in the same order whatever the budget allows; the others plan
+        # around where they end up.
+        for i, target in enumerate(targets):
+            if target is None:
+                neighbors = maze.neighbor_cells(positions[i])
+                free = [n for n in neighbors if (n[1] * width + n[0], 1) not in reserved]
+                new = game.ai_rng.choice(free or neighbors) if neighbors else positions[i]
+                new_positions[i] = new
+                self._reserve(reserved, swaps, [positions[i][1] * width + positions[i][0],
+                                                new[1] * width + new[0]], player, 1)
+        fields = {}
+        order = []
+        for i, target in enumerate(targets):
+            if target is not None:
+                goal = target[1] * width + target[0]
+                if goal not in fields:
+                    fields[goal] = self._field(game, target)
+                start = positions[i][1] * width + positions[i][0]
+                order.append((fields[goal][start] if fields[goal][start] != UNREACHABLE else maze.cells, i, start, goal))
+        order.sort()
+        budget = self.node_budget
+        expansions = 0
+        fallbacks = 0
+        for _, i, start, goal in order:
+            path = None
+            until = self.window
+            if expansions < budget and (deadline is None or time.perf_counter() < deadline):
+                path, spent = self._search(maze, start, goal, fields[goal], reserved, swaps, player,
+                                           budget - expansions, deadline)
+                expansions += spent
+            if path is None:
+                fallbacks += 1
+                taken = {cell for cell, t in reserved if t == 1}
+                taken = [(c % width, c // width) for c in taken]
+                new = game.step_towards(positions[i], targets[i], taken)
+                path = [start, new[1] * width + new[0]]
+                until = 1
+            self._reserve(reserved, swaps, path, player, until)
+            new_positions[i] = (path[1] % width, path[1] // width)
+        self.expansions += expansions
+        self.fallbacks += fallbacks
+        if PROFILER.enabled:
+            PROFILER.count("coop.expansions", expansions)
+            PROFILER.count("coop.fallbacks", fallbacks)
+        return new_positions
+
+    def _field(self, game, target):
+        # Distances to target from every cell; the maze is undirected, so a routing row or
+        # distance field out of target serves.
+        if target == game.player_pos and not game.routing.full:
+            return game.get_player_field().dist
+        dist = game.routing.distances_to(target)
+        if dist is None:
+            dist = DistanceField(game.maze, target).dist
+        return dist
+
+    def _reserve(self, reserved, swaps, path, player, until):
+        # path[t] is the ghost's cell t ticks from now; it then waits at the last one until
+        # tick until.
+        last = len(path) - 1
+        for t in range(1, until + 1):
+            cell = path[min(t, last)]
+            if cell != player:
+                reserved.add((cell, t))
+            if t <= last and path[t - 1] != cell:
+                swaps.add((cell, path[t - 1], t))
+
+    def _search(self, maze, start, goal, dist, reserved, swaps, player, budget, deadline):
+        # Returns (path, expansions); path is None when no plan was found within budget.
+        if dist[start] == UNREACHABLE:
+            return [start, start], 1
+        offsets, targets = maze.offsets, maze.targets
+        window = self.window
+        parent = {(start, 0): None}
+        heap = [(dist[start], dist[start], 0, 0, start)]
+        counter = 1
+        expansions = 0
+        while heap:
+            _, h, _, t, cell = heapq.heappop(heap)
+            if cell == goal or t == window:
+                path = [cell]
+                node = parent[(cell, t)]
+                while node is not None:
+                    path.append(node[0])
+                    node = parent[node]
+                path.reverse()
+                if len(path) == 1:
+                    path.append(start)
+                return path, expansions
+            expansions += 1
+            if expansions > budget or (deadline is not None and expansions % 64 == 0 and time.perf_counter() > deadline):
+                return None, expansions
+            nt = t + 1
+            for n in list(targets[offsets[cell]:offsets[cell + 1]]) + [cell]:
+                if (n, nt) in parent or dist[n] == UNREACHABLE:
+                    continue
+                if n != player and (n, nt) in reserved:
+                    continue
+                if (cell, n, nt) in swaps:
+                    continue
+                parent[(n, nt)] = (cell, t)
+                heapq.heappush(heap, (nt + dist[n], dist[n], counter, nt, n))
+                counter += 1
+        return [start, start], expansions
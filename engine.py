@@ -0,0 +1,641 @@
+import copy
+import random
+import time
+from collections import deque
+
+from maze import Maze
+from profiler import PROFILER, profiled
+from routing import DistanceField, FoodIndex, GapIndex, RoutingTable
+
+GRID_WIDTH = 15
+GRID_HEIGHT = 15
+FOOD_DENSITY = 0.2
+ROW_SPACING = 3
+POINTS_TO_NEXT_LEVEL = 15
+LEVEL_COUNT = 7
+LOGIC_TICK_MS = 50
+ENEMY_MOVE_INTERVAL = 400
+# Logic ticks between ghost moves in the real game.
+ENEMY_PERIOD = ENEMY_MOVE_INTERVAL // LOGIC_TICK_MS
+
+LEFT = (-1, 0)
+RIGHT = (1, 0)
+UP = (0, -1)
+DOWN = (0, 1)
+ACTIONS = [LEFT, RIGHT, UP, DOWN]
+
+ROLES = ['random', 'bfs', 'predict', 'food_hunter', 'team']
+
+difficulty_labels = {1: "very easy", 2: "easy", 3: "normal", 4: "hard", 5: "very hard"}
+
+
+def get_difficulty(level):
+    return difficulty_labels.get(level, "insane")
+
+
+def make_bands(height, row_spacing):
+    bands = [(0, 0)]
+    ymin = 1
+    while ymin <= height - 1:
+        bands.append((ymin, min(ymin + row_spacing - 1, height - 1)))
+        ymin += row_spacing
+    return bands
+
+
+class LevelConfig:
+    def __init__(self, width=GRID_WIDTH, height=GRID_HEIGHT, food_density=FOOD_DENSITY,
+                 row_spacing=ROW_SPACING, backend="python"):
+        if width < 4 or height < row_spacing:
+            raise ValueError(f"grid {width}x{height} is too small for row spacing {row_spacing}")
+        if row_spacing < 3:
+            raise ValueError("row_spacing must be at least 3")
+        if backend not in ("python", "numpy"):
+            raise ValueError(f"unknown level backend: {backend}")
+        self.width = width
+        self.height = height
+        self.food_density = food_density
+        self.row_spacing = row_spacing
+        self.backend = backend
+        self.bands = make_bands(height, row_spacing)
+
+    def player_start(self):
+        return (self.width // 2, self.height // 2)
+
+    def enemy_starts(self):
+        return [(0, 0), (self.width - 1, 0), (0, self.height - 1), (self.width - 1, self.height - 1)]
+
+
+DEFAULT_CONFIG = LevelConfig()
+BANDS = DEFAULT_CONFIG.bands
+
+
+def generate_grid(player_pos, rng=random, config=DEFAULT_CONFIG):
+    width, height = config.width, config.height
+    grid = [[0 for _ in range(width)] for _ in range(height)]
+    for y in range(height):
+        for x in range(width):
+            if (x, y) != tuple(player_pos) and rng.random() < config.food_density:
+                grid[y][x] = 1
+    return grid
+
+
+def generate_barriers(level, rng=random, config=DEFAULT_CONFIG):
+    width, height, spacing = config.width, config.height, config.row_spacing
+    barriers = set()
+    row_count = height // spacing
+    used_rows = set()
+    while len(used_rows) < row_count:
+        y = spacing * rng.randint(1, height // spacing) - (spacing - 1)
+        if y not in used_rows:
+            used_rows.add(y)
+            gap_positions = rng.sample(range(1, width - 1), 1)
+            for x in range(1, width - 1):
+                if x not in gap_positions:
+                    a = (x, y)
+                    b = (x, y - 1)
+                    barriers.add((a, b))
+                    barriers.add((b, a))
+    sorted_rows = sorted(used_rows)
+    for i in range(len(sorted_rows) - 1):
+        y_cur = sorted_rows[i]
+        x1 = rng.randint(1, width - 2)
+        x2 = x1
+        while x2 == x1:
+            x2 = rng.randint(1, width - 2)
+        for j in range(0, 2):
+            a = (x1, y_cur + j)
+            b = (x1 + 1, y_cur + j)
+            barriers.add((a, b))
+            barriers.add((b, a))
+        for j in range(1, 3):
+            a = (x2, y_cur + j)
+            b = (x2 + 1, y_cur + j)
+            barriers.add((a, b))
+            barriers.add((b, a))
+    return barriers, sorted_rows
+
+
+def generate_adjacency(barriers, config=DEFAULT_CONFIG):
+    width, height = config.width, config.height
+    adjacency = {}
+    for y in range(height):
+        for x in range(width):
+            current = (x, y)
+            neighbors = []
+            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
+                nx, ny = x + dx, y + dy
+                neighbor = (nx, ny)
+                if 0 <= nx < width and 0 <= ny < height:
+                    if ((current, neighbor) not in barriers):
+                        neighbors.append(neighbor)
+            adjacency[current] = neighbors
+    return adjacency
+
+
+def is_connected(start, maze):
+    seen = maze.reachable(start)
+    return {maze.cell(i) for i in range(maze.cells) if seen[i]}
+
+
+class DisjointSet:
+    def __init__(self, size, weights):
+        self.parent = list(range(size))
+        self.weight = list(weights)
+
+    def find(self, c):
+        parent = self.parent
+        while parent[c] != c:
+            parent[c] = parent[parent[c]]
+            c = parent[c]
+        return c
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            if self.weight[ra] < self.weight[rb]:
+                ra, rb = rb, ra
+            self.parent[rb] = ra
+            self.weight[ra] += self.weight[rb]
+
+
+def generate_valid_barriers(level, grid, player_pos, rng=random, config=DEFAULT_CONFIG):
+    # Same outcome as removing random barriers one at a time and re-checking reachability,
+    # but the components are kept in a union-find so each removal costs O(alpha) instead of a rebuild.
+    width, height = config.width, config.height
+    barriers, sorted_rows = generate_barriers(level, rng, config)
+    food = [grid[y][x] for y in range(height) for x in range(width)]
+    total_food = sum(food)
+    components = DisjointSet(width * height, food)
+    for y in range(height):
+        for x in range(width):
+            if x + 1 < width and ((x, y), (x + 1, y)) not in barriers:
+                components.union(y * width + x, y * width + x + 1)
+            if y + 1 < height and ((x, y), (x, y + 1)) not in barriers:
+                components.union(y * width + x, (y + 1) * width + x)
+    start = player_pos[1] * width + player_pos[0]
+    if components.weight[components.find(start)] < total_food:
+        barrier_pairs = sorted((a, b) for (a, b) in barriers if a < b)
+        rng.shuffle(barrier_pairs)
+        for a, b in barrier_pairs:
+            barriers.discard((a, b))
+            barriers.discard((b, a))
+            components.union(a[1] * width + a[0], b[1] * width + b[0])
+            if components.weight[components.find(start)] == total_food:
+                break
+    return barriers, Maze.from_barriers(barriers, width, height), sorted_rows
+
+
+def generate_level(level, player_pos, rng=random, config=DEFAULT_CONFIG):
+    if config.backend == "numpy":
+        import levelgen_numpy
+        return levelgen_numpy.generate_level(level, player_pos, rng, config)
+    grid = generate_grid(player_pos, rng, config)
+    barriers, maze, sorted_rows = generate_valid_barriers(level, grid, player_pos, rng, config)
+    return grid, maze, sorted_rows
+
+
+def bfs(start, goal, maze):
+    return maze.bfs(start, goal)
+
+
+def find_nearest_food_to_player(grid, player_pos, maze):
+    visited = set()
+    queue = deque()
+    queue.append(player_pos)
+    visited.add(player_pos)
+    while queue:
+        current = queue.popleft()
+        x, y = current
+        if grid[y][x] == 1:
+            return current
+        for neighbor in maze.neighbor_cells(current):
+            if neighbor not in visited:
+                visited.add(neighbor)
+                queue.append(neighbor)
+    return None
+
+
+def get_zone(y, bands=BANDS):
+    for i, (ymin, ymax) in enumerate(bands):
+        if ymin <= y <= ymax:
+            return i
+    return None
+
+
+def roles_for_level(level, rng=random):
+    if level > 5:
+        if rng.random() < 0.5:
+            return ['bfs', 'team', 'team', 'predict']
+        return ['bfs', 'team', 'team', 'food_hunter']
+    if level == 1:
+        return ['random', 'random', 'random', 'random']
+    if level == 2:
+        return ['bfs', 'random', 'random', 'random']
+    if level == 3:
+        if rng.random() < 0.5:
+            return ['bfs', 'predict', 'random', 'random']
+        return ['bfs', 'food_hunter', 'random', 'random']
+    if level == 4:
+        if rng.random() < 0.5:
+            return ['bfs', 'predict', 'food_hunter', 'random']
+        return ['bfs', 'food_hunter', 'predict', 'random']
+    if rng.random() < 0.5:
+        return ['bfs', 'predict', 'food_hunter', 'predict']
+    return ['bfs', 'food_hunter', 'predict', 'food_hunter']
+
+
+class _FixedDraw:
+    def __init__(self, value):
+        self.value = value
+
+    def random(self):
+        return self.value
+
+
+def role_choices(level):
+    # Both lineups roles_for_level can return for a level, one per outcome of its coin flip
+    # (the same lineup twice on levels that flip none).
+    return [roles_for_level(level, _FixedDraw(value)) for value in (0.0, 0.5)]
+
+
+class LevelBuild:
+    # Everything new_level installs. It depends only on the level number and the level RNG
+    # state it starts from, so it can be built ahead of time on another thread or process.
+    def __init__(self, level, team_mode, grid, maze, sorted_rows, roles, rng_state, routing=None, food=None):
+        self.level = level
+        self.team_mode = team_mode
+        self.grid = grid
+        self.maze = maze
+        self.sorted_rows = sorted_rows
+        self.routing = RoutingTable(maze) if routing is None else routing
+        self.gaps = GapIndex(maze, sorted_rows)
+        self.food = FoodIndex(maze, grid) if food is None else food
+        self.roles = roles
+        self.rng_state = rng_state
+
+
+def build_level(level, rng_state, config=DEFAULT_CONFIG, advance=False):
+    # advance: the level is reached by levelling up, which first draws the team mode.
+    rng = random.Random()
+    rng.setstate(rng_state)
+    team_mode = None
+    if advance:
+        team_mode = 1 if rng.random() < 0.5 else 2
+    grid, maze, sorted_rows = generate_level(level, config.player_start(), rng, config)
+    roles = roles_for_level(level, rng)
+    return LevelBuild(level, team_mode, grid, maze, sorted_rows, roles, rng.getstate())
+
+
+class Game:
+    def __init__(self, seed=None, config=None, enemy_period=1, prefetcher=None, planner=None, coordinator=None,
+                 searcher=None, cache=None):
+        self.config = config or DEFAULT_CONFIG
+        self.enemy_period = enemy_period
+        self.cache = cache
+        self.prefetcher = prefetcher
+        self.planner = planner
+        self.coordinator = coordinator
+        self.searcher = searcher
+        self.width = self.config.width
+        self.height = self.config.height
+        self.reset(seed)
+
+    def reset(self, seed=None):
+        # Level generation and ghost decisions draw from separate streams, so a replay only
+        # needs the seed and the player's inputs to reproduce a run.
+        if seed is None:
+            seed = random.getrandbits(63)
+        self.seed = seed
+        self.level_rng = random.Random(f"{seed}:level")
+        self.ai_rng = random.Random(f"{seed}:ai")
+        self.player_pos = self.config.player_start()
+        self.last_player_direction = (0, 0)
+        self.score = 0
+        self.level = 1
+        self.team_mode = 0
+        self.game_over = False
+        self.game_won = False
+        self.tick = 0
+        self.level_serial = 0
+        self.enemies_held = False
+        self.new_level()
+
+    @profiled("level.generate")
+    def new_level(self, advance=False):
+        # A cached build is the one a game started with this seed plays on this level, and a
+        # prefetched one is only taken when it starts from this exact RNG state, so either way
+        # the level is the same one the game would have generated itself. Both carry the
+        # RNG state the build ends with.
+        state = self.level_rng.getstate()
+        build = None
+        if self.cache is not None and advance == (self.level > 1):
+            build = self.cache.find(self.seed, self.level, self.config)
+        if build is None and advance and self.prefetcher is not None:
+            build = self.prefetcher.take(self.level, state)
+        if build is None:
+            build = build_level(self.level, state, self.config, advance)
+        self.install_level(build)
+        if self.prefetcher is not None and self.level < LEVEL_COUNT and build.rng_state is not None:
+            self.prefetcher.request(self.level + 1, build.rng_state)
+
+    def install_level(self, build):
+        # Builds that do not come from this game's RNG chain (e.g. from a version 1 level
+        # cache) carry no rng_state and leave the stream untouched.
+        if (build.maze.width, build.maze.height) != (self.width, self.height):
+            raise ValueError(f"level is {build.maze.width}x{build.maze.height}, game is {self.width}x{self.height}")
+        if build.rng_state is not None:
+            self.level_rng.setstate(build.rng_state)
+        if build.team_mode is not None:
+            self.team_mode = build.team_mode
+        self.level = build.level
+        self.player_pos = self.config.player_start()
+        self.last_player_direction = (0, 0)
+        self.grid, self.maze, self.sorted_rows = build.grid, build.maze, build.sorted_rows
+        self.routing = build.routing
+        self.gaps = build.gaps
+        self.player_field = None
+        self.food = build.food
+        self.eaten_cells = []
+        self.level_serial += 1
+        self.init_enemies_for_level(build.roles)
+
+    def init_enemies_for_level(self, roles):
+        self.enemy_positions = self.config.enemy_starts()
+        self.enemy_team_mode = self.level > 5
+        self.enemy_roles = roles
+        self.team_target_1 = self.player_pos
+        self.team_target_2 = self.player_pos
+
+    def clone(self):
+        # The maze, routing table and config are immutable for the whole level and are
+        # shared; everything the simulation mutates is copied.
+        other = copy.copy(self)
+        other.prefetcher = None
+        other.planner = None
+        other.grid = [row[:] for row in self.grid]
+        other.food = self.food.copy()
+        other.enemy_positions = list(self.enemy_positions)
+        other.enemy_roles = list(self.enemy_roles)
+        other.eaten_cells = list(self.eaten_cells)
+        other.level_rng = random.Random()
+        other.level_rng.setstate(self.level_rng.getstate())
+        other.ai_rng = random.Random()
+        other.ai_rng.setstate(self.ai_rng.getstate())
+        return other
+
+    def no_barrier_between(self, a, b):
+        return self.maze.no_barrier_between(a, b)
+
+    @profiled("tick.player")
+    def move_player(self, direction):
+        if self.game_over or not direction:
+            return False
+        if not self.maze.is_open(self.player_pos, direction):
+            return False
+        x, y = self.player_pos
+        dx, dy = direction
+        new_pos = (x + dx, y + dy)
+        self.player_pos = new_pos
+        self.last_player_direction = (dx, dy)
+        self.player_field = None
+        nx, ny = new_pos
+        if self.grid[ny][nx] == 1:
+            self.grid[ny][nx] = 0
+            self.food.remove(new_pos)
+            self.eaten_cells.append(new_pos)
+            self.score += 1
+            if self.score >= POINTS_TO_NEXT_LEVEL * self.level:
+                if self.level == LEVEL_COUNT:
+                    self.game_won = True
+                    self.game_over = True
+                else:
+                    self.level += 1
+                    self.new_level(advance=True)
+        return True
+
+    def step(self, player_action=None, hold_enemies=False):
+        # hold_enemies keeps the ghosts where they are on an enemy tick; replays use it to
+        # repeat the ticks on which a planner missed its deadline.
+        if self.game_over:
+            return True
+        self.enemies_held = False
+        self.move_player(player_action)
+        self.tick += 1
+        if self.tick % self.enemy_period == 0:
+            self.update_enemies(hold_enemies)
+        if self.planner is not None and not self.game_over and (self.tick + 1) % self.enemy_period == 0:
+            self.planner.request(self)
+        return self.game_over
+
+    def get_target_for_predicter(self, index=1):
+        player_pos = self.player_pos
+        if self.maze.adjacent(self.enemy_positions[index], player_pos):
+            return player_pos
+        predicted_pos = (
+            player_pos[0] + 2 * self.last_player_direction[0],
+            player_pos[1] + 2 * self.last_player_direction[1]
+        )
+        if 0 <= predicted_pos[0] < self.width and 0 <= predicted_pos[1] < self.height:
+            return predicted_pos
+        return player_pos
+
+    def get_target_for_ghost2(self):
+        player_pos = self.player_pos
+        if self.maze.adjacent(self.enemy_positions[1], player_pos):
+            return player_pos
+        x, y = player_pos
+        player_zone = get_zone(y, self.config.bands)
+        ghost_zone = get_zone(self.enemy_positions[1][1], self.config.bands)
+        if player_zone is None or player_zone == 0 or player_zone == ghost_zone:
+            return player_pos
+        ymin, ymax = self.config.bands[player_zone - 1]
+        return (x, ymax)
+
+    def get_target_for_ghost3(self):
+        player_pos = self.player_pos
+        if self.maze.adjacent(self.enemy_positions[2], player_pos):
+            return player_pos
+        x, y = player_pos
+        player_zone = get_zone(y, self.config.bands)
+        ghost_zone = get_zone(self.enemy_positions[2][1], self.config.bands)
+        if player_zone is None or player_zone == len(self.config.bands) - 1 or player_zone == ghost_zone:
+            return player_pos
+        ymin, ymax = self.config.bands[player_zone + 1]
+        return (x, ymin)
+
+    def get_target_for_food_hunter(self, index=3):
+        player_pos = self.player_pos
+        if self.maze.adjacent(self.enemy_positions[index], player_pos):
+            return player_pos
+        target_food = self.nearest_food_to_player()
+        if target_food:
+            return target_food
+        return player_pos
+
+    def get_team2_targets(self):
+        band = self.gaps.band(self.player_pos[1])
+        target_pos_2 = self.gaps.gap_above(band) or self.player_pos
+        target_pos_3 = self.gaps.gap_below(band) or self.player_pos
+        return target_pos_2, target_pos_3
+
+    def get_player_field(self):
+        if self.player_field is None:
+            self.player_field = DistanceField(self.maze, self.player_pos)
+        return self.player_field
+
+    def nearest_food_to_player(self):
+        # A nearest pellet, as find_nearest_food_to_player finds, but on a tie the one with
+        # the lowest cell index rather than the first in BFS neighbour order.
+        return self.food.nearest(self.player_pos)
+
+    def step_towards(self, pos, target, taken):
+        # A full routing table answers any pair in O(1); a lazy one would keep a row per
+        # player cell, so ghosts chasing the player share the per-tick player field instead.
+        if target == self.player_pos and not self.routing.full:
+            next_step = self.get_player_field().step_from(pos)
+        else:
+            next_step = self.routing.next_hop(pos, target)
+        if next_step is not None and next_step not in taken:
+            return next_step
+        return pos
+
+    def chase(self, pos, taken):
+        # The bfs ghost's move: straight down the shortest path, or the searcher's pick when
+        # the game has one.
+        if self.searcher is not None:
+            return self.searcher.move(self, pos, taken)
+        return self.step_towards(pos, self.player_pos, taken)
+
+    @profiled("tick.enemies")
+    def update_enemies(self, hold=False):
+        # A planner hands back the move it computed ahead of time for exactly this state, or
+        # a hold when it ran past its deadline; without one the move is planned here.
+        if self.game_over:
+            return
+        plan = self.planner.take(self) if self.planner is not None and not hold else None
+        if hold:
+            new_positions = self.enemy_positions
+            self.enemies_held = True
+        elif plan is None:
+            new_positions = self.plan_enemies()
+        else:
+            new_positions = plan.positions
+            self.team_target_1, self.team_target_2 = plan.team_targets
+            self.ai_rng.setstate(plan.ai_state)
+            self.enemies_held = plan.held
+        self.enemy_positions = new_positions
+        if self.player_pos in self.enemy_positions:
+            self.game_over = True
+
+    def plan_enemies(self):
+        if self.searcher is not None:
+            self.searcher.start_tick()
+        if self.coordinator is not None:
+            return self.coordinator.plan(self)
+        if self.enemy_team_mode:
+            return self.plan_team()
+        return self.plan_independent()
+
+    def enemy_targets(self):
+        # The cell each ghost heads for this tick: the targets plan_team and plan_independent
+        # route to, for planners that move the ghosts jointly. None marks a ghost that
+        # wanders at random.
+        player_pos = self.player_pos
+        targets = []
+        if self.enemy_team_mode:
+            targets.append(player_pos)
+            if self.team_mode == 1:
+                targets.append(self.get_target_for_ghost2())
+                targets.append(self.get_target_for_ghost3())
+            else:
+                self.team_target_1, self.team_target_2 = self.get_team2_targets()
+                for index, target in ((1, self.team_target_1), (2, self.team_target_2)):
+                    adjacent = self.maze.adjacent(self.enemy_positions[index], player_pos)
+                    targets.append(player_pos if adjacent else target)
+            if self.enemy_roles[3] == 'predict':
+                targets.append(self.get_target_for_predicter(3))
+            else:
+                targets.append(self.get_target_for_food_hunter(3))
+            return targets
+        for i, pos in enumerate(self.enemy_positions):
+            role = self.enemy_roles[i] if i < len(self.enemy_roles) else 'bfs'
+            if role == 'predict':
+                targets.append(self.get_target_for_predicter(i))
+            elif role in ('random', 'food_hunter') and self.maze.adjacent(pos, player_pos):
+                targets.append(player_pos)
+            elif role == 'random':
+                targets.append(None)
+            elif role == 'food_hunter':
+                targets.append(self.nearest_food_to_player() or pos)
+            else:
+                targets.append(player_pos)
+        return targets
+
+    @profiled("ai.team")
+    def plan_team(self):
+        player_pos = self.player_pos
+        enemy_positions = self.enemy_positions
+        new_positions = []
+        new_positions.append(self.chase(enemy_positions[0], new_positions))
+        if self.team_mode == 1:
+            new_positions.append(self.step_towards(enemy_positions[1], self.get_target_for_ghost2(), new_positions))
+            new_positions.append(self.step_towards(enemy_positions[2], self.get_target_for_ghost3(), new_positions))
+        else:
+            target_pos_2, target_pos_3 = self.get_team2_targets()
+            self.team_target_1 = target_pos_2
+            self.team_target_2 = target_pos_3
+            for index, target in ((1, target_pos_2), (2, target_pos_3)):
+                pos = enemy_positions[index]
+                if self.maze.adjacent(pos, player_pos):
+                    new_positions.append(player_pos)
+                else:
+                    new_positions.append(self.step_towards(pos, target, new_positions))
+        if self.enemy_roles[3] == 'predict':
+            t4 = self.get_target_for_predicter(3)
+        else:
+            t4 = self.get_target_for_food_hunter(3)
+        new_positions.append(self.step_towards(enemy_positions[3], t4, new_positions))
+        return new_positions
+
+    def plan_independent(self):
+        profiling = PROFILER.enabled
+        new_positions = []
+        for i, pos in enumerate(self.enemy_positions):
+            role = self.enemy_roles[i] if i < len(self.enemy_roles) else 'bfs'
+            if profiling:
+                start = time.perf_counter()
+                new_positions.append(self.plan_move(pos, role, new_positions))
+                PROFILER.record("ai." + role, time.perf_counter() - start)
+            else:
+                new_positions.append(self.plan_move(pos, role, new_positions))
+        return new_positions
+
+    def plan_move(self, pos, role, taken):
+        player_pos = self.player_pos
+        neighbors = self.maze.neighbor_cells(pos)
+        if role == 'predict':
+            if player_pos in neighbors:
+                return player_pos
+            predicted_pos = (
+                player_pos[0] + 2 * self.last_player_direction[0],
+                player_pos[1] + 2 * self.last_player_direction[1]
+            )
+            if 0 <= predicted_pos[0] < self.width and 0 <= predicted_pos[1] < self.height:
+                target = predicted_pos
+            else:
+                target = player_pos
+            return self.step_towards(pos, target, taken)
+        if role == 'random':
+            if player_pos in neighbors:
+                return player_pos
+            if neighbors:
+                return self.ai_rng.choice(neighbors)
+            return pos
+        if role == 'food_hunter':
+            if player_pos in neighbors:
+                return player_pos
+            target_food = self.nearest_food_to_player()
+            if target_food:
+                return self.step_towards(pos, target_food, taken)
+            return pos
+        return self.chase(pos, taken)
@@ -0,0 +1,116 @@
+import numpy as np
+
+from engine import ENEMY_PERIOD, ROLES, Game
+from maze import WALL_BITS
+from replay import decode_action
+
+# Observation planes, all (height, width) uint8 in one buffer. "walls" holds four planes in
+# the maze direction order (left, right, up, down), 1 where that move is blocked; "ghosts"
+# holds one plane per entry of ROLES counting the ghosts of that role on each cell.
+#
+# The buffer is the env's own: the engine keeps food as a pellet set and a list-of-lists
+# grid, walls as packed bitmasks and positions as tuples, none of which NumPy can view as a
+# plane. Keeping it in sync touches only the cells a step changed; the engine records them
+# (eaten_cells, player_pos, enemy_positions) and _sync compares against that.
+PLANES = ["food", "walls", "player", "ghosts"]
+WALL_PLANES = len(WALL_BITS)
+PLANE_COUNT = 1 + WALL_PLANES + 1 + len(ROLES)
+ACTION_COUNT = 5
+
+WIN_REWARD = 10.0
+LOSS_REWARD = -10.0
+
+
+class PacmanEnv:
+    # reset() -> (observation, info), step(action) -> (observation, reward, terminated,
+    # truncated, info), with actions in the replay encoding (0 is no input, 1-4 are ACTIONS).
+    # The observation is the same dict of read-only views on every call; step() updates the
+    # buffer behind it in place, touching only the cells that changed, so copy it to keep one.
+    # Ghosts move every enemy_period ticks, ENEMY_PERIOD by default as in the real game, so
+    # agents train on the dynamics they are judged on. With a LevelCache, reset() seeds
+    # found in it load their levels instead of generating them.
+    def __init__(self, config=None, enemy_period=ENEMY_PERIOD, max_ticks=None, win_reward=WIN_REWARD,
+                 loss_reward=LOSS_REWARD, cache=None):
+        self.game = Game(0, config, enemy_period, cache=cache)
+        self.max_ticks = max_ticks
+        self.win_reward = win_reward
+        self.loss_reward = loss_reward
+        height, width = self.game.height, self.game.width
+        self.buffer = np.zeros((PLANE_COUNT, height, width), dtype=np.uint8)
+        self.planes = self.buffer.view()
+        self.planes.flags.writeable = False
+        self.food = self.buffer[0]
+        self.walls = self.buffer[1:1 + WALL_PLANES]
+        self.player = self.buffer[1 + WALL_PLANES]
+        self.ghosts = self.buffer[2 + WALL_PLANES:]
+        self.wall_shifts = np.arange(WALL_PLANES, dtype=np.uint8)[:, None, None]
+        self.observation = {}
+        for name, plane in zip(PLANES, (self.food, self.walls, self.player, self.ghosts)):
+            view = plane.view()
+            view.flags.writeable = False
+            self.observation[name] = view
+        self.level_serial = None
+
+    def reset(self, seed=None):
+        self.game.reset(seed)
+        self._load_level()
+        return self.observation, self._info()
+
+    def step(self, action):
+        game = self.game
+        finished = game.game_over
+        score = game.score
+        game.step(decode_action(int(action)))
+        reward = float(game.score - score)
+        if game.game_over and not finished:
+            reward += self.win_reward if game.game_won else self.loss_reward
+        truncated = self.max_ticks is not None and game.tick >= self.max_ticks and not game.game_over
+        if game.level_serial != self.level_serial:
+            self._load_level()
+        else:
+            self._sync()
+        return self.observation, reward, game.game_over, truncated, self._info()
+
+    def _info(self):
+        game = self.game
+        return {"score": game.score, "level": game.level, "tick": game.tick, "won": game.game_won}
+
+    def _load_level(self):
+        # Once per level: refill every plane from the game.
+        game = self.game
+        self.level_serial = game.level_serial
+        self.food[...] = game.grid
+        walls = np.frombuffer(game.maze.walls, dtype=np.uint8).reshape(game.height, game.width)
+        np.right_shift(walls, self.wall_shifts, out=self.walls)
+        np.bitwise_and(self.walls, 1, out=self.walls)
+        self.player.fill(0)
+        self.ghosts.fill(0)
+        self.roles = [ROLES.index(role) for role in game.enemy_roles]
+        self.player_pos = game.player_pos
+        self.player[game.player_pos[1], game.player_pos[0]] = 1
+        self.enemy_positions = list(game.enemy_positions)
+        for role, (x, y) in zip(self.roles, self.enemy_positions):
+            self.ghosts[role, y, x] += 1
+        self.eaten = len(game.eaten_cells)
+
+    def _sync(self):
+        # Within a level only the player, the ghosts and eaten pellets change. Positions are
+        # compared by value, so the planes follow the ghosts however their list was updated.
+        game = self.game
+        if game.player_pos != self.player_pos:
+            x, y = self.player_pos
+            self.player[y, x] = 0
+            x, y = self.player_pos = game.player_pos
+            self.player[y, x] = 1
+        eaten_cells = game.eaten_cells
+        while self.eaten < len(eaten_cells):
+            x, y = eaten_cells[self.eaten]
+            self.food[y, x] = 0
+            self.eaten += 1
+        if game.enemy_positions != self.enemy_positions:
+            ghosts = self.ghosts
+            for role, (x, y) in zip(self.roles, self.enemy_positions):
+                ghosts[role, y, x] -= 1
+            self.enemy_positions = list(game.enemy_positions)
+            for role, (x, y) in zip(self.roles, self.enemy_positions):
+                ghosts[role, y, x] += 1
@@ -0,0 +1,277 @@
+import argparse
+import array
+import mmap
+import random
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from engine import LEVEL_COUNT, ROLES, LevelBuild, LevelConfig, build_level
+from maze import Maze
+from routing import FULL_TABLE_CELLS, FoodIndex, RoutingTable
+
+# File layout: HEADER, then one INDEX entry (offset, size, crc32) per level, then the levels.
+# A level is RECORD followed by its sections, each padded to a multiple of 4 bytes:
+# food bitmap (LSB first, row-major), wall masks (one byte per cell, see maze.py),
+# sorted_rows (uint16), CSR offsets and targets (int32), the pellet index's initial distance
+# and owner arrays (int32), when the file was built with routing the full next-hop table
+# (one byte per cell pair) and, since version 2, the level RNG state the build ends with
+# (the 625 words of the Mersenne Twister state, uint32), so a game that loads a level
+# carries on generating exactly where build_level would have left it.
+MAGIC = b"PMLC"
+VERSION = 2
+VERSIONS = (1, 2)
+HEADER = struct.Struct("<4sBHHdBBBI")
+INDEX = struct.Struct("<QII")
+RECORD = struct.Struct("<QBB4sHI")
+STATE_WORDS = 625
+BACKENDS = ["python", "numpy"]
+# Refuse to write files larger than this unless asked to (see --max-mb).
+MAX_CACHE_MB = 256
+UNPACK_BITS = [bytes((byte >> k) & 1 for k in range(8)) for byte in range(256)]
+
+
+def padded(data):
+    return data + bytes(-len(data) % 4)
+
+
+def pack_bits(cells):
+    cells = bytes(cells)
+    cells += bytes(-len(cells) % 8)
+    return bytes(sum(cells[i + k] << k for k in range(8)) for i in range(0, len(cells), 8))
+
+
+def encode_level(seed, build, routing):
+    maze = build.maze
+    cells = maze.cells
+    roles = bytes(ROLES.index(role) for role in build.roles)
+    parts = [RECORD.pack(seed, build.level, build.team_mode or 0, roles, len(build.sorted_rows), len(maze.targets)),
+             padded(pack_bits(value for row in build.grid for value in row)),
+             padded(bytes(maze.walls)),
+             padded(array.array("H", build.sorted_rows).tobytes()),
+             array.array("i", maze.offsets).tobytes(),
+             array.array("i", maze.targets).tobytes(),
+             build.food.dist.tobytes(),
+             build.food.owner.tobytes()]
+    if routing:
+        parts.append(padded(b"".join(build.routing.hop_row(s) for s in range(cells))))
+    version, words, gauss_next = build.rng_state
+    if gauss_next is not None:
+        raise ValueError("level RNG state carries a pending gauss value")
+    parts.append(array.array("I", words).tobytes())
+    return b"".join(parts)
+
+
+def record_size(config, routing):
+    # Bytes one level of config takes in a file, padding included, bar the CSR targets and
+    # sorted_rows, which depend on the walls; close enough to size a build.
+    cells = config.width * config.height
+    size = RECORD.size + (cells + 7) // 8 + 3 + cells + 3 + 4 * (cells + 1) + 8 * cells + 4 * STATE_WORDS
+    if routing:
+        size += cells * cells + 3
+    return size
+
+
+def seed_levels(seed, config, routing, levels=LEVEL_COUNT):
+    # The first levels a game started with this seed would play, in order.
+    state = random.Random(f"{seed}:level").getstate()
+    records = []
+    for level in range(1, levels + 1):
+        build = build_level(level, state, config, advance=level > 1)
+        records.append(encode_level(seed, build, routing))
+        state = build.rng_state
+    return records
+
+
+def write_cache(path, config, seeds, routing=True, workers=1, levels=LEVEL_COUNT):
+    routing = routing and config.width * config.height <= FULL_TABLE_CELLS
+    if workers > 1:
+        with ProcessPoolExecutor(workers) as pool:
+            batches = list(pool.map(seed_levels, seeds, [config] * len(seeds), [routing] * len(seeds),
+                                    [levels] * len(seeds), chunksize=16))
+    else:
+        batches = [seed_levels(seed, config, routing, levels) for seed in seeds]
+    records = [record for batch in batches for record in batch]
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, config.width, config.height, config.food_density,
+                            config.row_spacing, BACKENDS.index(config.backend), routing, len(records)))
+        offset = HEADER.size + INDEX.size * len(records)
+        offset += -offset % 4
+        for record in records:
+            f.write(INDEX.pack(offset, len(record), zlib.crc32(record)))
+            offset += len(record)
+        f.write(bytes(-f.tell() % 4))
+        for record in records:
+            f.write(record)
+    return len(records)
+
+
+class LevelCache:
+    # Read-only view of a cache file. Walls, CSR arrays and routing rows are memoryviews
+    # into the mapping; only the mutable state (food grid and index) is copied per load.
+    # Levels keep views into the mapping, so closing the cache while one is still in use
+    # leaves the mapping to them: it is unmapped once the last view is released.
+    #
+    # find() serves Game.new_level: the level a game started with a seed plays as its
+    # level-th, or None when the file does not hold it or its record is corrupt.
+    def __init__(self, path, verify=True):
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.data)
+        (magic, version, width, height, food_density, row_spacing, backend, routing,
+         count) = HEADER.unpack_from(self.data)
+        if magic != MAGIC or version not in VERSIONS:
+            raise ValueError("not a Pac-Man level cache file")
+        self.version = version
+        self.config = LevelConfig(width, height, food_density, row_spacing, BACKENDS[backend])
+        self.routing = bool(routing)
+        self.count = count
+        self.verify = verify
+        self.index = None
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.data is None:
+            return
+        self.view.release()
+        try:
+            self.data.close()
+        except BufferError:
+            pass
+        self.data = None
+        self.file.close()
+
+    def record(self, index):
+        if self.data is None:
+            raise ValueError("level cache is closed")
+        if not 0 <= index < self.count:
+            raise IndexError(f"level {index} out of range for a cache of {self.count}")
+        offset, size, crc = INDEX.unpack_from(self.data, HEADER.size + index * INDEX.size)
+        record = self.view[offset:offset + size]
+        if self.verify and zlib.crc32(record) != crc:
+            raise ValueError(f"level {index} is corrupt (checksum mismatch)")
+        return record
+
+    def check(self):
+        if self.data is None:
+            raise ValueError("level cache is closed")
+        return [index for index in range(self.count) if not self._intact(index)]
+
+    def _intact(self, index):
+        offset, size, crc = INDEX.unpack_from(self.data, HEADER.size + index * INDEX.size)
+        return zlib.crc32(self.view[offset:offset + size]) == crc
+
+    def seed(self, index):
+        return RECORD.unpack_from(self.record(index))[0]
+
+    def find(self, seed, level, config):
+        if self.data is None:
+            raise ValueError("level cache is closed")
+        build = None
+        mine = self.config
+        if (config.width, config.height, config.food_density, config.row_spacing, config.backend) == \
+                (mine.width, mine.height, mine.food_density, mine.row_spacing, mine.backend):
+            if self.index is None:
+                self.index = {}
+                for i in range(self.count):
+                    offset = INDEX.unpack_from(self.data, HEADER.size + i * INDEX.size)[0]
+                    self.index.setdefault(tuple(RECORD.unpack_from(self.data, offset)[:2]), i)
+            i = self.index.get((seed, level))
+            if i is not None:
+                try:
+                    build = self.level(i)
+                except ValueError:
+                    build = None
+        if build is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return build
+
+    def level(self, index):
+        record = self.record(index)
+        seed, level, team_mode, roles, row_count, target_count = RECORD.unpack_from(record)
+        width, height = self.config.width, self.config.height
+        cells = width * height
+        pos = RECORD.size
+
+        def take(size, fmt=None):
+            nonlocal pos
+            section = record[pos:pos + size]
+            pos += size + -size % 4
+            return section.cast(fmt) if fmt else section
+
+        food = b"".join(UNPACK_BITS[byte] for byte in take((cells + 7) // 8))
+        walls = take(cells)
+        sorted_rows = take(2 * row_count, "H").tolist()
+        maze = Maze(width, height, walls, take(4 * (cells + 1), "i"), take(4 * target_count, "i"))
+        grid = [list(food[y * width:(y + 1) * width]) for y in range(height)]
+        food_index = FoodIndex(maze, grid, (take(4 * cells, "i"), take(4 * cells, "i")))
+        routing = RoutingTable(maze, flat_hops=take(cells * cells)) if self.routing else None
+        rng_state = (3, tuple(take(4 * STATE_WORDS, "I")), None) if self.version >= 2 else None
+        return LevelBuild(level, team_mode or None, grid, maze, sorted_rows,
+                          [ROLES[code] for code in roles], rng_state, routing, food_index)
+
+
+def parse_seeds(text):
+    first, _, last = text.partition("-")
+    return range(int(first), int(last or first) + 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build and inspect Pac-Man level cache files")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="generate every level of a range of seeds into one file")
+    build.add_argument("path")
+    build.add_argument("--seeds", type=parse_seeds, default=range(0, 100), help="seed range, e.g. 0-999")
+    build.add_argument("--width", type=int, default=LevelConfig().width)
+    build.add_argument("--height", type=int, default=LevelConfig().height)
+    build.add_argument("--backend", choices=BACKENDS, default="python")
+    build.add_argument("--no-routing", action="store_true", help="leave routing tables out of the file")
+    build.add_argument("--workers", type=int, default=1)
+    build.add_argument("--max-mb", type=float, default=MAX_CACHE_MB,
+                       help="refuse to write a file larger than this many megabytes")
+    info = commands.add_parser("info", help="print the header and verify every checksum")
+    info.add_argument("path")
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        config = LevelConfig(args.width, args.height, backend=args.backend)
+        routing = not args.no_routing and config.width * config.height <= FULL_TABLE_CELLS
+        size = len(args.seeds) * LEVEL_COUNT * record_size(config, routing) / 1e6
+        if size > args.max_mb:
+            parser.error(f"{len(args.seeds)} seeds would write about {size:.0f} MB, over --max-mb {args.max_mb:g}; "
+                         f"pass fewer seeds, --no-routing or a larger --max-mb")
+        start = time.perf_counter()
+        count = write_cache(args.path, config, list(args.seeds), not args.no_routing, args.workers)
+        print(f"{count} levels written to {args.path} in {time.perf_counter() - start:.1f}s")
+        return
+    with LevelCache(args.path, verify=False) as cache:
+        config = cache.config
+        print(f"{len(cache)} levels, {config.width}x{config.height}, backend {config.backend}, "
+              f"routing {'yes' if cache.routing else 'no'}")
+        start = time.perf_counter()
+        for index in range(len(cache)):
+            cache.level(index)
+        print(f"loaded every level in {(time.perf_counter() - start) / max(len(cache), 1) * 1e6:.0f} us on average")
+        corrupt = cache.check()
+        if corrupt:
+            print(f"{len(corrupt)} corrupt levels: {corrupt[:20]}")
+            sys.exit(1)
+        print("all checksums ok")
+
+
+if __name__ == "__main__":
+    main()
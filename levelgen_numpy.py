@@ -0,0 +1,124 @@
+import numpy as np
+
+from engine import DisjointSet
+from maze import Maze
+
+# Walls are two (height, width) boolean arrays: wall_right[y, x] blocks (x, y) <-> (x + 1, y)
+# and wall_down[y, x] blocks (x, y) <-> (x, y + 1). The outer border counts as a wall.
+
+
+def generate_food(config, player_pos, rng):
+    food = rng.random((config.height, config.width)) < config.food_density
+    food[player_pos[1], player_pos[0]] = False
+    return food
+
+
+def generate_walls(config, rng):
+    width, height, spacing = config.width, config.height, config.row_spacing
+    wall_right = np.zeros((height, width), dtype=bool)
+    wall_down = np.zeros((height, width), dtype=bool)
+    rows = 1 + spacing * np.arange(height // spacing)
+    wall_down[rows[:, None] - 1, np.arange(1, width - 1)] = True
+    gaps = rng.integers(1, width - 1, size=len(rows))
+    wall_down[rows - 1, gaps] = False
+    bands = rows[:-1]
+    x1 = rng.integers(1, width - 1, size=len(bands))
+    x2 = (x1 - 1 + rng.integers(1, width - 2, size=len(bands))) % (width - 2) + 1
+    wall_right[bands, x1] = True
+    wall_right[bands + 1, x1] = True
+    wall_right[bands + 1, x2] = True
+    wall_right[bands + 2, x2] = True
+    wall_right[:, -1] = True
+    wall_down[-1, :] = True
+    return wall_right, wall_down, [int(y) for y in rows]
+
+
+def open_moves(wall_right, wall_down):
+    height, width = wall_right.shape
+    moves = np.zeros((height, width, 4), dtype=bool)
+    moves[:, 1:, 0] = ~wall_right[:, :-1]
+    moves[:, :, 1] = ~wall_right
+    moves[1:, :, 2] = ~wall_down[:-1, :]
+    moves[:, :, 3] = ~wall_down
+    return moves
+
+
+def label_runs(wall_right):
+    starts = np.ones(wall_right.shape, dtype=bool)
+    starts[:, 1:] = wall_right[:, :-1]
+    return np.cumsum(starts.ravel()).reshape(wall_right.shape) - 1
+
+
+def repair_connectivity(food, wall_right, wall_down, player_pos, rng):
+    # Union-find over horizontal runs rather than cells: a row only has a handful of runs,
+    # so the Python-level work stays small even on 1000x1000 grids.
+    height, width = food.shape
+    runs = label_runs(wall_right)
+    run_count = int(runs[-1, -1]) + 1
+    weights = np.bincount(runs.ravel(), weights=food.ravel(), minlength=run_count).astype(np.int64)
+    total_food = int(food.sum())
+    components = DisjointSet(run_count, weights.tolist())
+    ys, xs = np.nonzero(~wall_down[:-1, :])
+    pairs = np.unique(runs[ys, xs].astype(np.int64) * run_count + runs[ys + 1, xs])
+    for key in pairs.tolist():
+        components.union(key // run_count, key % run_count)
+    start = int(runs[player_pos[1], player_pos[0]])
+    if components.weight[components.find(start)] == total_food:
+        return
+    down_y, down_x = np.nonzero(wall_down[:-1, :])
+    right_y, right_x = np.nonzero(wall_right[:, :-1])
+    candidates = np.concatenate([
+        np.stack([np.zeros_like(down_y), down_y, down_x], axis=1),
+        np.stack([np.ones_like(right_y), right_y, right_x], axis=1),
+    ])
+    for kind, y, x in candidates[rng.permutation(len(candidates))].tolist():
+        if kind == 0:
+            wall_down[y, x] = False
+            components.union(int(runs[y, x]), int(runs[y + 1, x]))
+        else:
+            wall_right[y, x] = False
+            components.union(int(runs[y, x]), int(runs[y, x + 1]))
+        if components.weight[components.find(start)] == total_food:
+            return
+
+
+def to_grid(food):
+    return food.astype(np.int8).tolist()
+
+
+def to_barriers(wall_right, wall_down):
+    barriers = set()
+    for y, x in zip(*np.nonzero(wall_right[:, :-1])):
+        a, b = (int(x), int(y)), (int(x) + 1, int(y))
+        barriers.add((a, b))
+        barriers.add((b, a))
+    for y, x in zip(*np.nonzero(wall_down[:-1, :])):
+        a, b = (int(x), int(y)), (int(x), int(y) + 1)
+        barriers.add((a, b))
+        barriers.add((b, a))
+    return barriers
+
+
+def to_adjacency(moves):
+    height, width, _ = moves.shape
+    deltas = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+    rows = moves.tolist()
+    adjacency = {}
+    for y in range(height):
+        for x in range(width):
+            cell = rows[y][x]
+            adjacency[(x, y)] = [(x + dx, y + dy) for k, (dx, dy) in enumerate(deltas) if cell[k]]
+    return adjacency
+
+
+def generate_level_arrays(level, player_pos, rng, config):
+    food = generate_food(config, player_pos, rng)
+    wall_right, wall_down, sorted_rows = generate_walls(config, rng)
+    repair_connectivity(food, wall_right, wall_down, player_pos, rng)
+    return food, wall_right, wall_down, sorted_rows
+
+
+def generate_level(level, player_pos, rng, config):
+    np_rng = np.random.default_rng(rng.getrandbits(64))
+    food, wall_right, wall_down, sorted_rows = generate_level_arrays(level, player_pos, np_rng, config)
+    return to_grid(food), Maze.from_walls(wall_right, wall_down), sorted_rows
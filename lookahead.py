@@ -0,0 +1,181 @@
+import random
+
+from profiler import PROFILER
+from routing import NO_HOP
+from state import NO_DIRECTION, GameState
+
+SEARCH_ROLLOUTS = 1024
+SEARCH_DEPTH = 12
+SEARCH_EPSILON = 0.2
+SEARCH_NODE_BUDGET = 1000
+
+
+class RolloutSearch:
+    # Flat Monte Carlo search for the chasing ghost. Each step it could take this tick (or
+    # staying put) is scored by rollouts // steps playouts of up to depth ticks on a
+    # GameState: the player runs from the ghosts, eating when it safely can, and every ghost
+    # has an epsilon chance of a random step and otherwise closes in on the player, along the
+    # routing table where it holds every row and by straight-line distance where it does not.
+    # A playout that catches the player at tick t scores depth + 1 - t; the step with
+    # the highest total wins, the earliest on a tie. When no playout catches the player, or
+    # every ghost is too far away for one to, the ghost takes the shortest-path chase step.
+    #
+    # node_budget caps the playout ticks per enemy tick, shared by the searching ghosts: each
+    # gets an equal part of what is left, split equally between its steps, and a step stops
+    # taking playouts once its part is spent. A ghost whose part is too small for a single
+    # playout takes the chase step. None plays every rollout.
+    #
+    # Playouts draw from a generator seeded from the game's AI stream, so the ghost plays the
+    # same from the same seed and inputs and replays reproduce.
+    def __init__(self, rollouts=SEARCH_ROLLOUTS, depth=SEARCH_DEPTH, epsilon=SEARCH_EPSILON,
+                 node_budget=SEARCH_NODE_BUDGET):
+        self.rollouts = rollouts
+        self.depth = depth
+        self.epsilon = epsilon
+        self.node_budget = node_budget
+        self.budget_left = node_budget
+        self.tables = None
+        self.playouts = 0
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["tables"] = None
+        return state
+
+    def start_tick(self):
+        self.budget_left = self.node_budget
+
+    def _chasers_after(self, game, index):
+        # Ghosts after index this tick that will search too: only the bfs role chases.
+        if game.enemy_team_mode:
+            return 0
+        roles = game.enemy_roles
+        return sum(1 for i in range(index + 1, len(game.enemy_positions))
+                   if (roles[i] if i < len(roles) else 'bfs') == 'bfs')
+
+    def _tables(self, game):
+        # Per maze: each cell's open neighbours, its (ACTIONS index, neighbour) moves and its
+        # coordinates, as plain lists for the playout loop, plus every routing row when the
+        # table is small enough to hold them all.
+        maze = game.maze
+        tables = self.tables
+        if tables is None or tables[0] is not maze:
+            offsets, targets, steps = maze.offsets, maze.targets, maze.steps
+            adjacency = [targets[offsets[i]:offsets[i + 1]].tolist() for i in range(maze.cells)]
+            moves = [[(steps.index(n - i), n) for n in near] for i, near in enumerate(adjacency)]
+            xs = [i % maze.width for i in range(maze.cells)]
+            ys = [i // maze.width for i in range(maze.cells)]
+            hops = [game.routing.hop_row(i) for i in range(maze.cells)] if game.routing.full else None
+            tables = self.tables = (maze, adjacency, moves, xs, ys, hops)
+        return tables
+
+    def move(self, game, pos, taken):
+        # taken holds the moves already planned for the ghosts before this one this tick, so
+        # this ghost is enemy_positions[len(taken)].
+        player_pos = game.player_pos
+        neighbors = game.maze.neighbor_cells(pos)
+        if player_pos in neighbors:
+            return player_pos
+        index = len(taken)
+        ghosts = list(taken) + game.enemy_positions[index:]
+        reach = 2 * self.depth + 1
+        if all(abs(x - player_pos[0]) + abs(y - player_pos[1]) > reach for x, y in ghosts):
+            return game.step_towards(pos, player_pos, taken)
+        candidates = [n for n in neighbors if n not in taken] + [pos]
+        width = game.width
+        root = GameState.from_game(game)
+        enemies = [y * width + x for x, y in ghosts]
+        rng = random.Random(game.ai_rng.getrandbits(64))
+        tables = self._tables(game)
+        depth = self.depth
+        per_step = max(1, self.rollouts // len(candidates))
+        share = None
+        if self.budget_left is not None:
+            share = self.budget_left // (1 + self._chasers_after(game, index)) // len(candidates)
+        best = None
+        best_value = 0
+        playouts = 0
+        spent = 0
+        for x, y in candidates:
+            enemies[index] = y * width + x
+            state = root.clone()
+            state.enemies = tuple(enemies)
+            value = 0
+            ticks = 0
+            for _ in range(per_step):
+                if share is not None and ticks >= share:
+                    break
+                t, played = self._playout(state, rng, tables, game.enemy_period)
+                ticks += played
+                playouts += 1
+                if t:
+                    value += depth + 1 - t
+            spent += ticks
+            if value > best_value:
+                best, best_value = (x, y), value
+        if share is not None:
+            self.budget_left -= spent
+        self.playouts += playouts
+        if PROFILER.enabled:
+            PROFILER.count("search.playouts", playouts)
+        if best is None:
+            return game.step_towards(pos, player_pos, taken)
+        return best
+
+    def _playout(self, state, rng, tables, period):
+        # Plays up to depth ticks on state and takes them all back; returns the tick the
+        # player was caught on (or 0) and the number of ticks played.
+        _, adjacency, moves, xs, ys, hops = tables
+        steps = state.maze.steps
+        food = state.food
+        rand = rng.random
+        epsilon = self.epsilon
+        caught = 0
+        t = 0
+        while t < self.depth:
+            player = state.player
+            enemies = state.enemies
+            danger = set(enemies)
+            for g in enemies:
+                danger.update(adjacency[g])
+            safe = [move for move in moves[player] if move[1] not in danger]
+            options = [move for move in safe if food[move[1]]] or safe or moves[player]
+            if options:
+                direction, player = options[int(rand() * len(options))]
+            else:
+                direction = NO_DIRECTION
+            new = None
+            if (state.tick + 1) % period == 0:
+                new = []
+                for g in enemies:
+                    near = adjacency[g]
+                    if player in near:
+                        new.append(player)
+                    elif not near:
+                        new.append(g)
+                    elif rand() < epsilon:
+                        new.append(near[int(rand() * len(near))])
+                    elif hops is not None:
+                        code = hops[g][player]
+                        new.append(g if code == NO_HOP else g + steps[code])
+                    else:
+                        px, py = xs[player], ys[player]
+                        step = near[0]
+                        best = abs(xs[step] - px) + abs(ys[step] - py)
+                        for n in near[1:]:
+                            d = abs(xs[n] - px) + abs(ys[n] - py)
+                            if d < best:
+                                step, best = n, d
+                        new.append(step)
+                new = tuple(new)
+            state.apply_move(direction, new)
+            t += 1
+            if state.caught:
+                caught = t
+                break
+            if state.score >= state.goal:
+                break
+            food = state.food
+        for _ in range(t):
+            state.undo()
+        return caught, t
@@ -0,0 +1,170 @@
+import array
+from collections import deque
+
+from profiler import PROFILER
+
+# Directions share one order everywhere: left, right, up, down. Bit k of a cell's wall
+# mask is set when moving in direction k is blocked, the outer border included.
+DELTAS = [(-1, 0), (1, 0), (0, -1), (0, 1)]
+WALL_LEFT = 1
+WALL_RIGHT = 2
+WALL_UP = 4
+WALL_DOWN = 8
+WALL_BITS = [WALL_LEFT, WALL_RIGHT, WALL_UP, WALL_DOWN]
+
+
+class Maze:
+    def __init__(self, width, height, walls, offsets=None, targets=None):
+        self.width = width
+        self.height = height
+        self.cells = width * height
+        self.walls = walls
+        self.steps = [-1, 1, -width, width]
+        if offsets is None:
+            offsets, targets = self._build_csr()
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def from_barriers(cls, barriers, width, height):
+        walls = bytearray(width * height)
+        for x in range(width):
+            walls[x] |= WALL_UP
+            walls[(height - 1) * width + x] |= WALL_DOWN
+        for y in range(height):
+            walls[y * width] |= WALL_LEFT
+            walls[y * width + width - 1] |= WALL_RIGHT
+        for (ax, ay), (bx, by) in barriers:
+            walls[ay * width + ax] |= WALL_BITS[DELTAS.index((bx - ax, by - ay))]
+        return cls(width, height, walls)
+
+    @classmethod
+    def from_walls(cls, wall_right, wall_down):
+        import numpy as np
+        height, width = wall_right.shape
+        mask = np.zeros((height, width), dtype=np.uint8)
+        mask[:, 0] |= WALL_LEFT
+        mask[:, 1:] |= np.where(wall_right[:, :-1], WALL_LEFT, 0).astype(np.uint8)
+        mask |= np.where(wall_right, WALL_RIGHT, 0).astype(np.uint8)
+        mask[0, :] |= WALL_UP
+        mask[1:, :] |= np.where(wall_down[:-1, :], WALL_UP, 0).astype(np.uint8)
+        mask |= np.where(wall_down, WALL_DOWN, 0).astype(np.uint8)
+        flat = mask.ravel()
+        is_open = (flat[:, None] & np.array(WALL_BITS, dtype=np.uint8)) == 0
+        cells = np.arange(width * height, dtype=np.int64)
+        targets = (cells[:, None] + np.array([-1, 1, -width, width]))[is_open]
+        offsets = np.zeros(width * height + 1, dtype=np.int32)
+        np.cumsum(is_open.sum(axis=1), out=offsets[1:])
+        return cls(width, height, bytearray(flat.tobytes()),
+                   array.array("i", offsets.tobytes()),
+                   array.array("i", targets.astype(np.int32).tobytes()))
+
+    def _build_csr(self):
+        walls = self.walls
+        steps = self.steps
+        offsets = array.array("i", [0]) * (self.cells + 1)
+        targets = array.array("i")
+        for i in range(self.cells):
+            mask = walls[i]
+            for k in range(4):
+                if not mask & WALL_BITS[k]:
+                    targets.append(i + steps[k])
+            offsets[i + 1] = len(targets)
+        return offsets, targets
+
+    def index(self, cell):
+        return cell[1] * self.width + cell[0]
+
+    def cell(self, i):
+        return (i % self.width, i // self.width)
+
+    def in_bounds(self, cell):
+        return 0 <= cell[0] < self.width and 0 <= cell[1] < self.height
+
+    def neighbors(self, i):
+        return self.targets[self.offsets[i]:self.offsets[i + 1]]
+
+    def neighbor_cells(self, cell):
+        width = self.width
+        return [(n % width, n // width) for n in self.neighbors(cell[1] * width + cell[0])]
+
+    def is_open(self, cell, direction):
+        if direction not in DELTAS:
+            return False
+        return not self.walls[cell[1] * self.width + cell[0]] & WALL_BITS[DELTAS.index(direction)]
+
+    def adjacent(self, a, b):
+        return self.in_bounds(a) and self.is_open(a, (b[0] - a[0], b[1] - a[1]))
+
+    def no_barrier_between(self, a, b):
+        direction = (b[0] - a[0], b[1] - a[1])
+        if direction not in DELTAS or not self.in_bounds(a) or not self.in_bounds(b):
+            return True
+        return self.is_open(a, direction)
+
+    def wall_segments(self, x0=0, y0=0, x1=None, y1=None):
+        # Yields (x, y, direction) once per interior wall, on the left/top cell of the pair,
+        # for the cells in [x0, x1) x [y0, y1). The wall masks double as a dense spatial
+        # index, so a window costs the same whatever the size of the maze.
+        width, height = self.width, self.height
+        x1 = width if x1 is None else min(x1, width)
+        y1 = height if y1 is None else min(y1, height)
+        walls = self.walls
+        for y in range(max(y0, 0), y1):
+            row = y * width
+            for x in range(max(x0, 0), x1):
+                mask = walls[row + x]
+                if mask & (WALL_RIGHT | WALL_DOWN):
+                    if mask & WALL_RIGHT and x < width - 1:
+                        yield x, y, DELTAS[1]
+                    if mask & WALL_DOWN and y < height - 1:
+                        yield x, y, DELTAS[3]
+
+    def reachable(self, start):
+        seen = bytearray(self.cells)
+        offsets, targets = self.offsets, self.targets
+        s = self.index(start)
+        seen[s] = 1
+        queue = deque()
+        queue.append(s)
+        while queue:
+            current = queue.popleft()
+            for n in targets[offsets[current]:offsets[current + 1]]:
+                if not seen[n]:
+                    seen[n] = 1
+                    queue.append(n)
+        if PROFILER.enabled:
+            PROFILER.count("bfs.calls")
+            PROFILER.count("bfs.nodes", self.cells - seen.count(0))
+        return seen
+
+    def bfs(self, start, goal):
+        offsets, targets = self.offsets, self.targets
+        s = self.index(start)
+        g = self.index(goal)
+        parent = array.array("i", [-1]) * self.cells
+        parent[s] = s
+        queue = deque()
+        queue.append(s)
+        while queue:
+            current = queue.popleft()
+            if current == g:
+                if PROFILER.enabled:
+                    self._count_search(parent)
+                path = [current]
+                while current != s:
+                    current = parent[current]
+                    path.append(current)
+                path.reverse()
+                return [self.cell(i) for i in path]
+            for n in targets[offsets[current]:offsets[current + 1]]:
+                if parent[n] == -1:
+                    parent[n] = current
+                    queue.append(n)
+        if PROFILER.enabled:
+            self._count_search(parent)
+        return None
+
+    def _count_search(self, parent):
+        PROFILER.count("bfs.calls")
+        PROFILER.count("bfs.nodes", self.cells - parent.count(-1))
@@ -1,24 +1,40 @@
+import argparse
 import pygame
 import sys
 import random
 import math
 from collections import deque
 
+from aiworker import PLAN_DEADLINE, GhostWorker
+from coop import CooperativePlanner
+from engine import (ENEMY_PERIOD, LOGIC_TICK_MS, Game, GRID_WIDTH, GRID_HEIGHT, POINTS_TO_NEXT_LEVEL, LEVEL_COUNT,
+                    LevelConfig, get_difficulty)
+from levelcache import LevelCache
+from lookahead import SEARCH_NODE_BUDGET, RolloutSearch
+from maze import WALL_DOWN, WALL_RIGHT
+from policies import greedy_food_policy
+from prefetch import PREFETCH_DEPTH, LevelPrefetcher
+from profiler import PROFILER, profiled
+from replay import Recorder, check_seed
+from scheduler import FixedStepScheduler, run_uncapped
+
 CELL_SIZE = 40
-GRID_WIDTH = 15
-GRID_HEIGHT = 15
-SCREEN_WIDTH = CELL_SIZE * GRID_WIDTH
-SCREEN_HEIGHT = CELL_SIZE * GRID_HEIGHT
-POINTS_TO_NEXT_LEVEL = 15
-ENEMY_MOVE_INTERVAL = 400
-LEVEL_COUNT = 7
+VIEW_COLS = GRID_WIDTH
+VIEW_ROWS = GRID_HEIGHT
+SCREEN_WIDTH = CELL_SIZE * VIEW_COLS
+SCREEN_HEIGHT = CELL_SIZE * VIEW_ROWS
 HUD_HEIGHT = 40
+PROFILE_PANEL_ROWS = 12
+PROFILE_PANEL_REFRESH = 15
+ENEMY_BUCKET = 16
+MINIMAP_SIZE = 150
 
 pygame.init()
 screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT + HUD_HEIGHT))
 pygame.display.set_caption("Pac-Man")
 clock = pygame.time.Clock()
 font = pygame.font.SysFont("Arial", 24)
+profile_font = pygame.font.SysFont("monospace", 13)
 
 BLACK = (0, 0, 0)
 YELLOW = (255, 255, 0)
@@ -31,230 +47,142 @@ ORANGE = (255, 165, 0)
 GREEN = (0, 255, 0)
 CYAN = (0, 255, 255)
 
-BANDS = [(0, 0), (1, 3), (4, 6), (7, 9), (10, 12), (13, 14)]
-
-player_pos = [GRID_WIDTH // 2, GRID_HEIGHT // 2]
-last_player_direction = (0, 0)
-score = 0
-level = 1
-team_mode = 0
-enemy_positions = [(0, 0), (GRID_WIDTH - 1, 0), (0, GRID_HEIGHT - 1), (GRID_WIDTH - 1, GRID_HEIGHT - 1)]
-enemy_team_mode = False
-enemy_roles = ["random", "random", "random", "random"]
-mouth_angle = 45
+ROLE_COLORS = {'bfs': PURPLE, 'predict': RED, 'random': ORANGE, 'food_hunter': GREY}
+GHOST_COLORS = [PURPLE, RED, ORANGE, GREY, BLUE, GREEN]
+PACMAN_DIRECTIONS = [(0, 0), (1, 0), (0, -1), (-1, 0), (0, 1)]
+MAX_MOUTH_ANGLE = 45
+SPRITE_PAD = 4
+
+KEY_DIRECTIONS = {
+    pygame.K_LEFT: (-1, 0),
+    pygame.K_RIGHT: (1, 0),
+    pygame.K_UP: (0, -1),
+    pygame.K_DOWN: (0, 1),
+}
+
+# The running game; main() creates it, so importing this module builds no level.
+game = None
+mouth_angle = MAX_MOUTH_ANGLE
 mouth_closing = True
-deadlocks = []
-last_enemy_move_time = pygame.time.get_ticks()
-last_player_move_time = pygame.time.get_ticks()
-game_over = False
-game_won = False
+sprite_atlas = None
 show_trajectories = False
-difficulty_labels = {1: "very easy", 2: "easy", 3: "normal", 4: "hard", 5: "very hard"}
-team_target_1=tuple(player_pos)
-team_target_2=tuple(player_pos)
-
-def get_difficulty(level):
-    return difficulty_labels.get(level, "insane")
-
-def generate_grid():
-    grid = [[0 for _ in range(GRID_WIDTH)] for _ in range(GRID_HEIGHT)]
-    for y in range(GRID_HEIGHT):
-        for x in range(GRID_WIDTH):
-            if (x, y) != tuple(player_pos) and random.random() < 0.2:
-                grid[y][x] = 1
-    return grid
-
-def generate_barriers(level):
-    barriers = set()
-    row_count = GRID_HEIGHT // 3
-    used_rows = set()
-    while len(used_rows) < row_count:
-        y = 3 * random.randint(1, GRID_HEIGHT // 3) - 2
-        if y not in used_rows:
-            used_rows.add(y)
-            gap_positions = random.sample(range(1, GRID_WIDTH - 1), 1)
-            for x in range(1, GRID_WIDTH - 1):
-                if x not in gap_positions:
-                    a = (x, y)
-                    b = (x, y - 1)
-                    barriers.add((a, b))
-                    barriers.add((b, a))
-    sorted_rows = sorted(used_rows)
-    for i in range(len(sorted_rows) - 1):
-        y_cur = sorted_rows[i]
-        x1 = random.randint(1, GRID_WIDTH - 2)
-        x2 = x1
-        while x2 == x1:
-            x2 = random.randint(1, GRID_WIDTH - 2)
-        for j in range(0, 2):
-            a = (x1, y_cur + j)
-            b = (x1 + 1, y_cur + j)
-            barriers.add((a, b))
-            barriers.add((b, a))
-        for j in range(1, 3):
-            a = (x2, y_cur + j)
-            b = (x2 + 1, y_cur + j)
-            barriers.add((a, b))
-            barriers.add((b, a))
-    return barriers, sorted_rows
-
-def generate_adjacency(barriers):
-    adjacency = {}
-    for y in range(GRID_HEIGHT):
-        for x in range(GRID_WIDTH):
-            current = (x, y)
-            neighbors = []
-            for dx, dy in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                nx, ny = x + dx, y + dy
-                neighbor = (nx, ny)
-                if 0 <= nx < GRID_WIDTH and 0 <= ny < GRID_HEIGHT:
-                    if ((current, neighbor) not in barriers):
-                        neighbors.append(neighbor)
-            adjacency[current] = neighbors
-    return adjacency
-
-def is_connected(start, adjacency):
-    visited = set()
-    queue = deque()
-    queue.append(start)
-    visited.add(start)
-    while queue:
-        current = queue.popleft()
-        for neighbor in adjacency.get(current, []):
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append(neighbor)
-    return visited
-
-def generate_valid_barriers(level, grid):
-    barriers, sorted_rows = generate_barriers(level)
-    while True:
-        adjacency = generate_adjacency(barriers)
-        reachable = is_connected(tuple(player_pos), adjacency)
-        food_cells = {(x, y) for y in range(GRID_HEIGHT) for x in range(GRID_WIDTH) if grid[y][x] == 1}
-        if food_cells.issubset(reachable):
-            return barriers, adjacency, sorted_rows
-        barrier_pairs = list({(a, b) for (a, b) in barriers if (b, a) in barriers and a < b})
-        if barrier_pairs:
-            a, b = random.choice(barrier_pairs)
-            barriers.discard((a, b))
-            barriers.discard((b, a))
-        else:
-            return set(), generate_adjacency(set()), []
-
-def bfs(start, goal, adjacency):
-    queue = deque()
-    queue.append((start, [start]))
-    visited = set()
-    visited.add(start)
-    while queue:
-        current, path = queue.popleft()
-        if current == goal:
-            return path
-        for neighbor in adjacency.get(current, []):
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append((neighbor, path + [neighbor]))
-    return None
-
-def get_zone(y):
-    for i, (ymin, ymax) in enumerate(BANDS):
-        if ymin <= y <= ymax:
-            return i
-    return None
-
-def get_target_for_predicter(player_pos):
-    neighbors = adjacency.get(enemy_positions[1], [])
-    if tuple(player_pos) in neighbors:
-        return tuple(player_pos)
-    else:
-        predicted_pos = (
-            player_pos[0] + 2 * last_player_direction[0],
-            player_pos[1] + 2 * last_player_direction[1]
-        )
-        if (0 <= predicted_pos[0] < GRID_WIDTH and 0 <= predicted_pos[1] < GRID_HEIGHT):
-            return tuple(predicted_pos)
-        else:
-            return tuple(player_pos)
-
-def get_target_for_ghost2(player_pos):
-    neighbors = adjacency.get(enemy_positions[1], [])
-    if tuple(player_pos) in neighbors:
-        return tuple(player_pos)
-    else:
-        x, y = player_pos
-        xg, yg = enemy_positions[1]
-        player_zone = get_zone(y)
-        ghost_zone = get_zone(yg)
-        if player_zone is None or player_zone == 0:
-            return tuple(player_pos)
-        elif player_zone == ghost_zone:
-            return tuple(player_pos)
-        else:
-            ymin, ymax = BANDS[player_zone - 1]
-            return (x, ymax)
-
-def get_target_for_ghost3(player_pos):
-    neighbors = adjacency.get(enemy_positions[2], [])
-    if tuple(player_pos) in neighbors:
-        return tuple(player_pos)
-    else:
-        x, y = player_pos
-        xg, yg = enemy_positions[2]
-        player_zone = get_zone(y)
-        ghost_zone = get_zone(yg)
-        if player_zone is None or player_zone == len(BANDS) - 1:
-            return tuple(player_pos)
-        elif player_zone == ghost_zone:
-            return tuple(player_pos)
-        else:
-            ymin, ymax = BANDS[player_zone + 1]
-            return (x, ymin)
-
-def draw_grid(grid):
-    for y in range(GRID_HEIGHT):
-        for x in range(GRID_WIDTH):
-            rect = pygame.Rect(x * CELL_SIZE, y * CELL_SIZE + HUD_HEIGHT, CELL_SIZE, CELL_SIZE)
-            pygame.draw.rect(screen, BLUE, rect, 1)
-            if grid[y][x] == 1:
-                pygame.draw.circle(screen, WHITE, rect.center, 5)
-
-def draw_barriers(barriers):
-    for (a, b) in barriers:
-        if a < b:
-            x1, y1 = a
-            x2, y2 = b
-            if y1 == y2:
-                x = min(x1, x2)
-                y = y1
-                start = (x * CELL_SIZE + CELL_SIZE, y * CELL_SIZE + HUD_HEIGHT)
-                end = (x * CELL_SIZE + CELL_SIZE, y * CELL_SIZE + CELL_SIZE + HUD_HEIGHT)
-                pygame.draw.line(screen, RED, start, end, 4)
-            elif x1 == x2:
-                x = x1
-                y = min(y1, y2)
-                start = (x * CELL_SIZE, y * CELL_SIZE + CELL_SIZE + HUD_HEIGHT)
-                end = (x * CELL_SIZE + CELL_SIZE, y * CELL_SIZE + CELL_SIZE + HUD_HEIGHT)
-                pygame.draw.line(screen, RED, start, end, 4)
-
-def draw_pacman(pos):
-    global mouth_angle, mouth_closing
-    if not game_over:
-        if mouth_closing:
-            mouth_angle -= 1
-            if mouth_angle <= 1:
-                mouth_closing = False
+show_profiler = False
+
+background = pygame.Surface(screen.get_size())
+background_serial = None
+background_eaten = 0
+dirty_rects = []
+force_full_redraw = True
+
+overlay = pygame.Surface(screen.get_size(), pygame.SRCALPHA)
+overlay_key = None
+overlay_on_screen = None
+
+
+class Camera:
+    # Top-left cell of the VIEW_COLS x VIEW_ROWS window. It keeps the player centred and is
+    # clamped to the maze, so mazes that fit on screen never scroll.
+    def __init__(self, cols, rows):
+        self.cols = cols
+        self.rows = rows
+        self.x = 0
+        self.y = 0
+
+    def follow(self, cell):
+        x = min(max(cell[0] - self.cols // 2, 0), max(game.width - self.cols, 0))
+        y = min(max(cell[1] - self.rows // 2, 0), max(game.height - self.rows, 0))
+        moved = (x, y) != (self.x, self.y)
+        self.x, self.y = x, y
+        return moved
+
+    def bounds(self):
+        return self.x, self.y, min(self.x + self.cols, game.width), min(self.y + self.rows, game.height)
+
+    def contains(self, cell):
+        return self.x <= cell[0] < self.x + self.cols and self.y <= cell[1] < self.y + self.rows
+
+camera = Camera(VIEW_COLS, VIEW_ROWS)
+
+class EnemyIndex:
+    # Ghost indices bucketed by ENEMY_BUCKET x ENEMY_BUCKET cells. The engine swaps in a new
+    # positions list on every enemy tick, so the buckets are rebuilt only when it does.
+    def __init__(self):
+        self.source = None
+        self.buckets = {}
+
+    def visible(self):
+        positions = game.enemy_positions
+        if positions is not self.source:
+            self.buckets = {}
+            for i, (x, y) in enumerate(positions):
+                self.buckets.setdefault((x // ENEMY_BUCKET, y // ENEMY_BUCKET), []).append(i)
+            self.source = positions
+        x0, y0, x1, y1 = camera.bounds()
+        found = []
+        for by in range(y0 // ENEMY_BUCKET, (y1 - 1) // ENEMY_BUCKET + 1):
+            for bx in range(x0 // ENEMY_BUCKET, (x1 - 1) // ENEMY_BUCKET + 1):
+                for i in self.buckets.get((bx, by), ()):
+                    if camera.contains(positions[i]):
+                        found.append(i)
+        return found
+
+enemy_index = EnemyIndex()
+
+def cell_origin(cell):
+    return ((cell[0] - camera.x) * CELL_SIZE, (cell[1] - camera.y) * CELL_SIZE + HUD_HEIGHT)
+
+def cell_center(cell):
+    x, y = cell_origin(cell)
+    return (x + CELL_SIZE // 2, y + CELL_SIZE // 2)
+
+def cell_rect(cell):
+    return pygame.Rect(cell_origin(cell), (CELL_SIZE, CELL_SIZE))
+
+@profiled("draw.grid")
+def draw_grid(surface, grid):
+    x0, y0, x1, y1 = camera.bounds()
+    for y in range(y0, y1):
+        row = grid[y]
+        for x in range(x0, x1):
+            rect = cell_rect((x, y))
+            pygame.draw.rect(surface, BLUE, rect, 1)
+            if row[x] == 1:
+                pygame.draw.circle(surface, WHITE, rect.center, 5)
+
+@profiled("draw.barriers")
+def draw_barriers(surface, maze):
+    for x, y, (dx, dy) in maze.wall_segments(*camera.bounds()):
+        left, top = cell_origin((x, y))
+        if dx == 1:
+            start = (left + CELL_SIZE, top)
+            end = (left + CELL_SIZE, top + CELL_SIZE)
         else:
-            mouth_angle += 1
-            if mouth_angle >= 25:
-                mouth_closing = True
-    else:
-        mouth_angle = 1
-    x, y = pos
-    center = (x * CELL_SIZE + CELL_SIZE // 2, y * CELL_SIZE + CELL_SIZE // 2 + HUD_HEIGHT)
-    pygame.draw.circle(screen, YELLOW, center, CELL_SIZE // 2 - 4)
+            start = (left, top + CELL_SIZE)
+            end = (left + CELL_SIZE, top + CELL_SIZE)
+        pygame.draw.line(surface, RED, start, end, 4)
+
+def sync_background():
+    # The background holds the visible window only: it is redrawn when the level changes or
+    # the camera scrolls, which costs the same for any maze size.
+    global background_serial, background_eaten, force_full_redraw
+    key = (game.level_serial, camera.x, camera.y)
+    if background_serial != key:
+        background.fill(BLACK)
+        draw_grid(background, game.grid)
+        draw_barriers(background, game.maze)
+        background_serial = key
+        background_eaten = len(game.eaten_cells)
+        force_full_redraw = True
+    eaten = game.eaten_cells
+    while background_eaten < len(eaten):
+        if camera.contains(eaten[background_eaten]):
+            pygame.draw.circle(background, BLACK, cell_center(eaten[background_eaten]), 5)
+        background_eaten += 1
+
+def render_pacman(surface, center, direction, angle):
     radius = CELL_SIZE // 2 - 4
-    dx, dy = last_player_direction
+    pygame.draw.circle(surface, YELLOW, center, radius)
+    dx, dy = direction
     angle_offset = 0
     if dx == 1 and dy == 0:
         angle_offset = 0
@@ -265,12 +193,12 @@ def draw_pacman(pos):
     elif dx == 0 and dy == 1:
         angle_offset = 270
     points = [center]
-    for angle in range(angle_offset - mouth_angle, angle_offset + mouth_angle + 1, 2):
-        rad = math.radians(angle)
+    for a in range(angle_offset - angle, angle_offset + angle + 1, 2):
+        rad = math.radians(a)
         x_point = center[0] + radius * math.cos(rad)
         y_point = center[1] - radius * math.sin(rad)
         points.append((x_point, y_point))
-    pygame.draw.polygon(screen, BLACK, points)
+    pygame.draw.polygon(surface, BLACK, points)
     eye_offset_x, eye_offset_y = 0, -radius // 2
     if dx == 1:
         eye_offset_x, eye_offset_y = 5, -10
@@ -283,423 +211,432 @@ def draw_pacman(pos):
     elif dx == 0 and dy == 0:
         eye_offset_x, eye_offset_y = 5, -10
     eye_pos = (center[0] + eye_offset_x, center[1] + eye_offset_y)
-    pygame.draw.circle(screen, BLACK, eye_pos, 4)
-
-def draw_enemies():
-    role_colors = {'bfs': PURPLE, 'predict': RED, 'random': ORANGE, 'food_hunter': GREY}
-    if not enemy_positions:
-        init_enemies_for_level()
-    if not enemy_team_mode:
-        colors = [role_colors.get(role, GREY) for role in enemy_roles]
-    else:
-        if team_mode == 2:
-            colors = [PURPLE, BLUE, BLUE, ORANGE]
+    pygame.draw.circle(surface, BLACK, eye_pos, 4)
+
+def render_ghost(surface, x_pix, y_pix, color):
+    scale = 0.75
+    w = int(CELL_SIZE * scale)
+    h = int(CELL_SIZE * scale * 1.2)
+    x_pix += (CELL_SIZE - w) // 2
+    y_pix += (CELL_SIZE - h) // 2
+    pygame.draw.circle(surface, color, (x_pix + w // 2, y_pix + h // 2 - 6), w // 2)
+    rect = pygame.Rect(x_pix, y_pix + h // 2 - 6, w, h // 2 + 6)
+    pygame.draw.rect(surface, color, rect)
+    left_leg = [(x_pix, y_pix + h), (x_pix + w // 4, y_pix + h), (x_pix + w // 4, y_pix + h - 8)]
+    pygame.draw.polygon(surface, BLACK, left_leg)
+    center_leg = [(x_pix + w // 2 - 6, y_pix + h), (x_pix + w // 2 + 6, y_pix + h), (x_pix + w // 2, y_pix + h - 10)]
+    pygame.draw.polygon(surface, BLACK, center_leg)
+    right_leg = [(x_pix + w * 3 // 4, y_pix + h), (x_pix + w, y_pix + h), (x_pix + w * 3 // 4, y_pix + h - 8)]
+    pygame.draw.polygon(surface, BLACK, right_leg)
+    eye_radius = 4
+    eye_dx = 6
+    eye_dy = -2
+    pygame.draw.circle(surface, WHITE, (x_pix + w // 2 - eye_dx, y_pix + h // 2 - 8 + eye_dy), eye_radius)
+    pygame.draw.circle(surface, WHITE, (x_pix + w // 2 + eye_dx, y_pix + h // 2 - 8 + eye_dy), eye_radius)
+    pupil_radius = 1
+    pygame.draw.circle(surface, BLACK, (x_pix + w // 2 - eye_dx, y_pix + h // 2 - 8 + eye_dy), pupil_radius)
+    pygame.draw.circle(surface, BLACK, (x_pix + w // 2 + eye_dx, y_pix + h // 2 - 8 + eye_dy), pupil_radius)
+
+
+class SpriteAtlas:
+    # Every Pac-Man mouth frame and every ghost colour, drawn once per cell size. Sprites
+    # carry SPRITE_PAD pixels of transparent margin because ghost heads poke out of the cell.
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        size = cell_size + 2 * SPRITE_PAD
+        center = (SPRITE_PAD + cell_size // 2, SPRITE_PAD + cell_size // 2)
+        self.pacman = {}
+        for direction in PACMAN_DIRECTIONS:
+            for angle in range(1, MAX_MOUTH_ANGLE + 1):
+                surface = pygame.Surface((size, size), pygame.SRCALPHA)
+                render_pacman(surface, center, direction, angle)
+                self.pacman[(direction, angle)] = surface
+        self.ghosts = {}
+        for color in GHOST_COLORS:
+            surface = pygame.Surface((size, size), pygame.SRCALPHA)
+            render_ghost(surface, SPRITE_PAD, SPRITE_PAD, color)
+            self.ghosts[color] = surface
+
+def get_atlas():
+    global sprite_atlas
+    if sprite_atlas is None or sprite_atlas.cell_size != CELL_SIZE:
+        sprite_atlas = SpriteAtlas(CELL_SIZE)
+    return sprite_atlas
+
+def sprite_origin(cell):
+    x, y = cell_origin(cell)
+    return (x - SPRITE_PAD, y - SPRITE_PAD)
+
+@profiled("draw.pacman")
+def draw_pacman(pos):
+    global mouth_angle, mouth_closing
+    if not game.game_over:
+        if mouth_closing:
+            mouth_angle -= 1
+            if mouth_angle <= 1:
+                mouth_closing = False
         else:
-            colors = [PURPLE, GREEN, GREEN, ORANGE]
-        if len(enemy_roles) > 3:
-            colors[3] = role_colors.get(enemy_roles[3], GREY)
-    for i, (ex, ey) in enumerate(enemy_positions):
-        color = colors[i % len(colors)]
-        scale = 0.75
-        w = int(CELL_SIZE * scale)
-        h = int(CELL_SIZE * scale * 1.2)
-        x_pix = ex * CELL_SIZE + (CELL_SIZE - w) // 2
-        y_pix = ey * CELL_SIZE + (CELL_SIZE - h) // 2 + HUD_HEIGHT
-        pygame.draw.circle(screen, color, (x_pix + w // 2, y_pix + h // 2 - 6), w // 2)
-        rect = pygame.Rect(x_pix, y_pix + h // 2 - 6, w, h // 2 + 6)
-        pygame.draw.rect(screen, color, rect)
-        left_leg = [(x_pix, y_pix + h), (x_pix + w // 4, y_pix + h), (x_pix + w // 4, y_pix + h - 8)]
-        pygame.draw.polygon(screen, BLACK, left_leg)
-        center_leg = [(x_pix + w // 2 - 6, y_pix + h), (x_pix + w // 2 + 6, y_pix + h), (x_pix + w // 2, y_pix + h - 10)]
-        pygame.draw.polygon(screen, BLACK, center_leg)
-        right_leg = [(x_pix + w * 3 // 4, y_pix + h), (x_pix + w, y_pix + h), (x_pix + w * 3 // 4, y_pix + h - 8)]
-        pygame.draw.polygon(screen, BLACK, right_leg)
-        eye_radius = 4
-        eye_dx = 6
-        eye_dy = -2
-        pygame.draw.circle(screen, WHITE, (x_pix + w // 2 - eye_dx, y_pix + h // 2 - 8 + eye_dy), eye_radius)
-        pygame.draw.circle(screen, WHITE, (x_pix + w // 2 + eye_dx, y_pix + h // 2 - 8 + eye_dy), eye_radius)
-        pupil_radius = 1
-        pygame.draw.circle(screen, BLACK, (x_pix + w // 2 - eye_dx, y_pix + h // 2 - 8 + eye_dy), pupil_radius)
-        pygame.draw.circle(screen, BLACK, (x_pix + w // 2 + eye_dx, y_pix + h // 2 - 8 + eye_dy), pupil_radius)
-
-def draw_trajectories(tp2,tp3):
-    if not show_trajectories:
-        return
-    role_colors = {'bfs': PURPLE, 'predict': RED, 'random': ORANGE, 'food_hunter': GREY}
-    if not enemy_team_mode:
-        colors = [role_colors.get(role, GREY) for role in enemy_roles]
+            mouth_angle += 1
+            if mouth_angle >= 25:
+                mouth_closing = True
     else:
-        if team_mode == 2:
-            colors = [PURPLE, BLUE, BLUE, ORANGE]
-        else:
-            colors = [PURPLE, GREEN, GREEN, ORANGE]
-        if len(enemy_roles) > 3:
-            colors[3] = role_colors.get(enemy_roles[3], GREY)
-    for i, pos in enumerate(enemy_positions):
+        mouth_angle = 1
+    screen.blit(get_atlas().pacman[(game.last_player_direction, mouth_angle)], sprite_origin(pos))
+
+def get_enemy_colors():
+    if not game.enemy_team_mode:
+        return [ROLE_COLORS.get(role, GREY) for role in game.enemy_roles]
+    if game.team_mode == 2:
+        colors = [PURPLE, BLUE, BLUE, ORANGE]
+    else:
+        colors = [PURPLE, GREEN, GREEN, ORANGE]
+    if len(game.enemy_roles) > 3:
+        colors[3] = ROLE_COLORS.get(game.enemy_roles[3], GREY)
+    return colors
+
+@profiled("draw.enemies")
+def draw_enemies(visible):
+    colors = get_enemy_colors()
+    ghosts = get_atlas().ghosts
+    for i in visible:
+        screen.blit(ghosts[colors[i % len(colors)]], sprite_origin(game.enemy_positions[i]))
+
+def trajectory_key():
+    return (game.level_serial, tuple(game.enemy_positions), game.player_pos, game.last_player_direction,
+            len(game.eaten_cells), game.team_target_1, game.team_target_2, camera.x, camera.y)
+
+def compute_trajectories():
+    # Only ghosts inside the view get a path, so the cost does not grow with the ghost count.
+    colors = get_enemy_colors()
+    player_pos = game.player_pos
+    trajectories = []
+    for i in enemy_index.visible():
+        pos = game.enemy_positions[i]
         color = colors[i % len(colors)]
-        role = enemy_roles[i] if i < len(enemy_roles) else 'bfs'
+        role = game.enemy_roles[i] if i < len(game.enemy_roles) else 'bfs'
         target = None
-        if enemy_team_mode:
+        if game.enemy_team_mode:
             if i == 0:
-                target = tuple(player_pos)
+                target = player_pos
             elif i == 1:
-                target = get_target_for_ghost2(player_pos) if team_mode == 1 else tp2
+                target = game.get_target_for_ghost2() if game.team_mode == 1 else game.team_target_1
             elif i == 2:
-                target = get_target_for_ghost3(player_pos) if team_mode == 1 else tp3
+                target = game.get_target_for_ghost3() if game.team_mode == 1 else game.team_target_2
             elif i == 3:
-                target = get_target_for_predicter(player_pos) if enemy_roles[3] == 'predict' else get_target_for_food_hunter(player_pos)
+                target = game.get_target_for_predicter(3) if game.enemy_roles[3] == 'predict' else game.get_target_for_food_hunter(3)
         else:
             if role == 'bfs':
-                target = tuple(player_pos)
+                target = player_pos
             elif role == 'predict':
-                target = get_target_for_predicter(player_pos)
+                target = game.get_target_for_predicter(i)
             elif role == 'random':
-                neighbors = adjacency.get(pos, [])
-                target = tuple(player_pos) if tuple(player_pos) in neighbors else random.choice(neighbors) if neighbors else pos
+                neighbors = game.maze.neighbor_cells(pos)
+                target = player_pos if player_pos in neighbors else random.choice(neighbors) if neighbors else pos
             elif role == 'food_hunter':
-                target = get_target_for_food_hunter(player_pos)
+                target = game.get_target_for_food_hunter(i)
         if target:
-            path = bfs(pos, target, adjacency)
+            path = game.routing.path(pos, target)
             if path and len(path) > 1:
-                for j in range(len(path) - 1):
-                    x1, y1 = path[j]
-                    x2, y2 = path[j + 1]
-                    start = (x1 * CELL_SIZE + CELL_SIZE // 2, y1 * CELL_SIZE + CELL_SIZE // 2 + HUD_HEIGHT)
-                    end = (x2 * CELL_SIZE + CELL_SIZE // 2, y2 * CELL_SIZE + CELL_SIZE // 2 + HUD_HEIGHT)
-                    pygame.draw.line(screen, CYAN, start, end, 2)
-                tx, ty = target
-                target_center = (tx * CELL_SIZE + CELL_SIZE // 2, ty * CELL_SIZE + CELL_SIZE // 2 + HUD_HEIGHT)
-                pygame.draw.circle(screen, color, target_center, 8, 2)
-
-def draw_info():
-    points_cnt = score % POINTS_TO_NEXT_LEVEL
-    if score==POINTS_TO_NEXT_LEVEL*LEVEL_COUNT: points_cnt = POINTS_TO_NEXT_LEVEL
-    text = font.render(f"Level: {level}/{LEVEL_COUNT} | Difficulty: {get_difficulty(level)} | Points: {points_cnt}/{POINTS_TO_NEXT_LEVEL}", True, WHITE)
-    screen.blit(text, (10, 10))
-    toggle_text = font.render("Show Paths: " + ("ON" if show_trajectories else "OFF"), True, WHITE)
-    toggle_rect = toggle_text.get_rect(topright=(SCREEN_WIDTH - 10, 10))
-    screen.blit(toggle_text, toggle_rect)
-    return toggle_rect
-
-def reset_game():
-    global player_pos, last_player_direction, score, level
-    global game_over, game_won, grid, barriers, adjacency, sorted_rows
-    global enemy_positions, enemy_roles, enemy_team_mode, team_mode
-
-    player_pos = [GRID_WIDTH // 2, GRID_HEIGHT // 2]
-    last_player_direction = (0, 0)
-    score = 0
-    level = 1
-    game_over = False
-    game_won = False
-    team_mode = 0
-
-    grid = generate_grid()
-    barriers, adjacency, sorted_rows = generate_valid_barriers(level, grid)
-    init_enemies_for_level()
+                trajectories.append((color, target, path))
+    return trajectories
+
+def draw_trajectories(surface, trajectories):
+    for color, target, path in trajectories:
+        points = [cell_center(cell) for cell in path]
+        for j in range(len(points) - 1):
+            pygame.draw.line(surface, CYAN, points[j], points[j + 1], 2)
+        pygame.draw.circle(surface, color, cell_center(target), 8, 2)
+
+@profiled("draw.trajectories")
+def update_overlay():
+    # Targets and paths only change when the engine state they read changes, which is at
+    # most once per enemy tick or player move, so the overlay is redrawn only then.
+    global overlay_key
+    key = trajectory_key()
+    if key != overlay_key:
+        overlay.fill((0, 0, 0, 0))
+        draw_trajectories(overlay, compute_trajectories())
+        overlay_key = key
+    return key
+
+class Hud:
+    # Keeps the rendered HUD text until score, level or the paths toggle change, and answers
+    # clicks on the toggle from the stored rect.
+    def __init__(self):
+        self.key = None
+        self.text = None
+        self.toggle_text = None
+        self.toggle_rect = None
+
+    def update(self):
+        key = (game.score, game.level, show_trajectories)
+        if key == self.key:
+            return
+        score = game.score
+        points_cnt = score % POINTS_TO_NEXT_LEVEL
+        if score==POINTS_TO_NEXT_LEVEL*LEVEL_COUNT: points_cnt = POINTS_TO_NEXT_LEVEL
+        self.text = font.render(f"Level: {game.level}/{LEVEL_COUNT} | Difficulty: {get_difficulty(game.level)} | Points: {points_cnt}/{POINTS_TO_NEXT_LEVEL}", True, WHITE)
+        self.toggle_text = font.render("Show Paths: " + ("ON" if show_trajectories else "OFF"), True, WHITE)
+        self.toggle_rect = self.toggle_text.get_rect(topright=(SCREEN_WIDTH - 10, 10))
+        self.key = key
+
+    @profiled("draw.hud")
+    def draw(self, surface):
+        self.update()
+        surface.blit(self.text, (10, 10))
+        surface.blit(self.toggle_text, self.toggle_rect)
+
+    def toggle_hit(self, pos):
+        self.update()
+        return self.toggle_rect.collidepoint(pos)
+
+hud = Hud()
+
+class ProfilerPanel:
+    # Slowest phases by p99 over the profiler's rolling window, plus last frame's counters.
+    # The text is re-rendered every PROFILE_PANEL_REFRESH frames so the panel itself stays
+    # out of the numbers it shows.
+    def __init__(self):
+        self.surface = None
+        self.frame = None
+
+    def update(self):
+        if self.surface is not None and PROFILER.frames - self.frame < PROFILE_PANEL_REFRESH:
+            return
+        lines = [f"{'phase (ms)':<18}{'last':>7}{'p50':>7}{'p99':>7}{'max':>7}"]
+        for name, last, p50, p99, peak in PROFILER.summary()[:PROFILE_PANEL_ROWS]:
+            lines.append(f"{name:<18}{last:7.2f}{p50:7.2f}{p99:7.2f}{peak:7.2f}")
+        for name, amount in sorted(PROFILER.last_counts.items()):
+            lines.append(f"{name:<25}{amount:>21}")
+        rendered = [profile_font.render(line, True, WHITE) for line in lines]
+        line_height = profile_font.get_linesize()
+        width = max(text.get_width() for text in rendered) + 8
+        self.surface = pygame.Surface((width, line_height * len(rendered) + 8), pygame.SRCALPHA)
+        self.surface.fill((0, 0, 0, 190))
+        for i, text in enumerate(rendered):
+            self.surface.blit(text, (4, 4 + i * line_height))
+        self.frame = PROFILER.frames
+
+    def draw(self, surface):
+        self.update()
+        return surface.blit(self.surface, (4, HUD_HEIGHT + 4))
+
+profiler_panel = ProfilerPanel()
+
+class Minimap:
+    # The whole maze scaled into MINIMAP_SIZE pixels, built once per level straight from the
+    # wall masks; each frame only adds the view frame and the player and ghost dots.
+    def __init__(self):
+        self.serial = None
+        self.surface = None
+        self.scale = 1.0
+
+    def update(self):
+        if self.serial == game.level_serial:
+            return
+        maze = game.maze
+        shade = bytes(1 if mask & (WALL_RIGHT | WALL_DOWN) else 0 for mask in range(256))
+        image = pygame.image.frombuffer(bytes(maze.walls).translate(shade), (maze.width, maze.height), "P")
+        image.set_palette([(0, 0, 60), (200, 0, 0)] + [BLACK] * 254)
+        self.scale = MINIMAP_SIZE / max(maze.width, maze.height)
+        size = (max(1, round(maze.width * self.scale)), max(1, round(maze.height * self.scale)))
+        self.surface = pygame.transform.smoothscale(image.convert(), size)
+        self.serial = game.level_serial
+
+    def point(self, cell):
+        return (self.rect.x + int(cell[0] * self.scale), self.rect.y + int(cell[1] * self.scale))
+
+    @profiled("draw.minimap")
+    def draw(self, surface):
+        self.update()
+        self.rect = self.surface.get_rect(bottomright=(SCREEN_WIDTH - 4, SCREEN_HEIGHT + HUD_HEIGHT - 4))
+        surface.blit(self.surface, self.rect)
+        colors = get_enemy_colors()
+        for i, pos in enumerate(game.enemy_positions):
+            surface.fill(colors[i % len(colors)], (self.point(pos), (2, 2)))
+        surface.fill(YELLOW, (self.point(game.player_pos), (3, 3)))
+        x0, y0, x1, y1 = camera.bounds()
+        left, top = self.point((x0, y0))
+        right, bottom = self.point((x1, y1))
+        pygame.draw.rect(surface, WHITE, (left, top, max(right - left, 2), max(bottom - top, 2)), 1)
+        return self.rect
+
+minimap = Minimap()
+
+def set_profiler_visible(visible, args):
+    global show_profiler
+    show_profiler = visible
+    if visible or args.profile_out:
+        PROFILER.enable(args.profile_out, args.profile_alloc)
+    else:
+        PROFILER.disable()
 
 def draw_game_over():
-    if game_won:
+    if game.game_won:
         text = font.render("Congratulations! You won!", True, (100, 255, 100))
     else:
         text = font.render("Game over!", True, (255, 100, 100))
     rect = text.get_rect(center=(SCREEN_WIDTH // 2, (SCREEN_HEIGHT + HUD_HEIGHT) // 2))
     screen.blit(text, rect)
 
-def find_nearest_food_to_player(grid, player_pos, adjacency):
-    visited = set()
-    queue = deque()
-    queue.append(player_pos)
-    visited.add(player_pos)
-    while queue:
-        current = queue.popleft()
-        x, y = current
-        if grid[y][x] == 1:
-            return current
-        for neighbor in adjacency.get(current, []):
-            if neighbor not in visited:
-                visited.add(neighbor)
-                queue.append(neighbor)
-    return None
-
-def get_target_for_food_hunter(player_pos):
-    neighbors = adjacency.get(enemy_positions[3], [])
-    if tuple(player_pos) in neighbors:
-        return tuple(player_pos)
+def render_frame():
+    # The maze and pellets live on the cached background and the paths on the overlay
+    # surface; a normal frame only restores and redraws the cells under moving sprites plus
+    # the HUD strip. A new overlay, a camera scroll or the game over text fall back to a
+    # full blit. Only sprites inside the view are drawn.
+    global dirty_rects, force_full_redraw, overlay_on_screen
+    camera.follow(game.player_pos)
+    sync_background()
+    wanted_overlay = update_overlay() if show_trajectories else None
+    hud_rect = pygame.Rect(0, 0, SCREEN_WIDTH, HUD_HEIGHT)
+    full = force_full_redraw or game.game_over or wanted_overlay != overlay_on_screen
+    if full:
+        screen.blit(background, (0, 0))
     else:
-        target_food = find_nearest_food_to_player(grid, tuple(player_pos), adjacency)
-        if target_food:
-            return tuple(target_food)
+        for rect in dirty_rects:
+            screen.blit(background, rect, rect)
+            if wanted_overlay is not None:
+                screen.blit(overlay, rect, rect)
+        screen.blit(background, hud_rect, hud_rect)
+    visible = enemy_index.visible()
+    sprite_rects = [cell_rect(game.player_pos).inflate(8, 8)]
+    sprite_rects += [cell_rect(game.enemy_positions[i]).inflate(8, 8) for i in visible]
+    draw_pacman(game.player_pos)
+    draw_enemies(visible)
+    if wanted_overlay is not None:
+        if full:
+            screen.blit(overlay, (0, 0))
         else:
-            return tuple(player_pos)
-
-def no_barrier_between(a, b):
-    return (a, b) not in barriers
-
-def init_enemies_for_level():
-    global enemy_positions, enemy_team_mode, enemy_roles
-    enemy_positions = [(0, 0), (GRID_WIDTH - 1, 0), (0, GRID_HEIGHT - 1), (GRID_WIDTH - 1, GRID_HEIGHT - 1)]
-    enemy_team_mode = False
-    if level > 5:
-        enemy_team_mode = True
-    if enemy_team_mode:
-        if random.random() < 0.5:
-            enemy_roles = ['bfs', 'team', 'team', 'predict']
-        else:
-            enemy_roles = ['bfs', 'team', 'team', 'food_hunter']
-    else:
-        if level == 1:
-            enemy_roles = ['random', 'random', 'random', 'random']
-        elif level == 2:
-            enemy_roles = ['bfs', 'random', 'random', 'random']
-        elif level == 3:
-            if random.random() < 0.5:
-                enemy_roles = ['bfs', 'predict', 'random', 'random']
-            else:
-                enemy_roles = ['bfs', 'food_hunter', 'random', 'random']
-        elif level == 4:
-            if random.random() < 0.5:
-                enemy_roles = ['bfs', 'predict', 'food_hunter', 'random']
-            else:
-                enemy_roles = ['bfs', 'food_hunter', 'predict', 'random']
+            for rect in sprite_rects:
+                screen.blit(overlay, rect, rect)
+    hud.draw(screen)
+    if game.width > VIEW_COLS or game.height > VIEW_ROWS:
+        sprite_rects.append(minimap.draw(screen))
+    if show_profiler:
+        sprite_rects.append(profiler_panel.draw(screen))
+    if game.game_over:
+        draw_game_over()
+    with PROFILER.section("flip"):
+        if full:
+            pygame.display.flip()
         else:
-            if random.random() < 0.5:
-                enemy_roles = ['bfs', 'predict', 'food_hunter', 'predict']
-            else:
-                enemy_roles = ['bfs', 'food_hunter', 'predict', 'food_hunter']
-
-grid = generate_grid()
-barriers, adjacency, sorted_rows = generate_valid_barriers(level, grid)
-init_enemies_for_level()
-
-running = True
-while running:
-    screen.fill(BLACK)
-    for event in pygame.event.get():
-        if event.type == pygame.QUIT:
-            running = False
-        elif event.type == pygame.MOUSEBUTTONDOWN and not game_over:
-            mouse_pos = event.pos
-            toggle_rect = draw_info()
-            if toggle_rect.collidepoint(mouse_pos):
-                show_trajectories = not show_trajectories
-        elif not game_over and event.type == pygame.KEYDOWN:
-            x, y = player_pos
-            direction = {
-                pygame.K_LEFT: (-1, 0),
-                pygame.K_RIGHT: (1, 0),
-                pygame.K_UP: (0, -1),
-                pygame.K_DOWN: (0, 1),
-            }.get(event.key)
-            if direction:
-                dx, dy = direction
-                new_pos = (x + dx, y + dy)
-                if new_pos in adjacency.get((x, y), []):
-                    player_pos = list(new_pos)
-                    last_player_direction = (dx, dy)
-                    if grid[player_pos[1]][player_pos[0]] == 1:
-                        grid[player_pos[1]][player_pos[0]] = 0
-                        score += 1
-                        if score >= POINTS_TO_NEXT_LEVEL * level:
-                            if level == LEVEL_COUNT:
-                                game_won = True
-                                game_over = True
-                            else:
-                                level += 1
-                                if random.random() < 0.5:
-                                    team_mode = 1
-                                else:
-                                    team_mode = 2
-                                player_pos = [GRID_WIDTH // 2, GRID_HEIGHT // 2]
-                                last_player_direction = (0, 0)
-                                grid = generate_grid()
-                                barriers, adjacency, sorted_rows = generate_valid_barriers(level, grid)
-                                init_enemies_for_level()
-
-    if not game_over:
-        current_time = pygame.time.get_ticks()
-        if current_time - last_enemy_move_time > ENEMY_MOVE_INTERVAL:
-            new_positions = []
-            px, py = player_pos
-            if enemy_team_mode:
-                if team_mode == 1:
-                    main_path = bfs(enemy_positions[0], tuple(player_pos), adjacency)
-                    new_positions.append(main_path[1])
-                    t2 = get_target_for_ghost2(player_pos)
-                    path2 = bfs(enemy_positions[1], t2, adjacency)
-                    t3 = get_target_for_ghost3(player_pos)
-                    path3 = bfs(enemy_positions[2], t3, adjacency)
-                    if path2 and len(path2) >= 2 and path2[1] not in new_positions:
-                        new_positions.append(path2[1])
-                    else:
-                        new_positions.append(enemy_positions[1])
-                    if path3 and len(path3) >= 2 and path3[1] not in new_positions:
-                        new_positions.append(path3[1])
-                    else:
-                        new_positions.append(enemy_positions[2])
-                elif team_mode == 2:
-                    path0 = bfs(enemy_positions[0], tuple(player_pos), adjacency)
-                    if path0 and len(path0) >= 2:
-                        new_positions.append(path0[1])
-                    else:
-                        new_positions.append(enemy_positions[0])
-                    i = None
-                    for idx in range(len(sorted_rows) - 1):
-                        if sorted_rows[idx] <= player_pos[1] < sorted_rows[idx + 1]:
-                            i = idx
-                            break
-                    if i is None:
-                        if player_pos[1] < sorted_rows[0]:
-                            i = -1
-                        else:
-                            i = len(sorted_rows) - 1
-                    if i == -1:
-                        target_pos_2 = tuple(player_pos)
-                    else:
-                        target_row_2 = sorted_rows[i] if sorted_rows else 0
-                        target_pos_2 = None
-                        for x in range(1, GRID_WIDTH - 1):
-                            cell = (x, target_row_2)
-                            above = (x, target_row_2 - 1)
-                            if 0 <= above[1] < GRID_HEIGHT:
-                                if no_barrier_between(cell, above):
-                                    target_pos_2 = cell
-                                    break
-                        if target_pos_2 is None:
-                            target_pos_2 = tuple(player_pos)
-                    team_target_1=target_pos_2
-                    path1 = bfs(enemy_positions[1], target_pos_2, adjacency)
-                    neighbors = adjacency.get(enemy_positions[1], [])
-                    if tuple(player_pos) in neighbors:
-                        new_positions.append(tuple(player_pos))
-                    else:
-                        if path1 and len(path1) >= 2 and path1[1] not in new_positions:
-                            new_positions.append(path1[1])
-                        else:
-                            new_positions.append(enemy_positions[1])
-                    if i == len(sorted_rows) - 1:
-                        target_pos_3 = tuple(player_pos)
-                    else:
-                        if sorted_rows and len(sorted_rows) >= 2 and i + 1 < len(sorted_rows):
-                            target_row_3 = sorted_rows[i + 1] - 1
-                        else:
-                            target_row_3 = min(GRID_HEIGHT - 2, (sorted_rows[0] + 1) if sorted_rows else GRID_HEIGHT // 2)
-                        target_pos_3 = None
-                        for x in range(1, GRID_WIDTH - 1):
-                            cell = (x, target_row_3)
-                            below = (x, target_row_3 + 1)
-                            if 0 <= below[1] < GRID_HEIGHT:
-                                if no_barrier_between(cell, below):
-                                    target_pos_3 = cell
-                                    break
-                        if target_pos_3 is None:
-                            target_pos_3 = tuple(player_pos)
-                    team_target_2 = target_pos_3
-                    path2 = bfs(enemy_positions[2], target_pos_3, adjacency)
-                    neighbors = adjacency.get(enemy_positions[2], [])
-                    if tuple(player_pos) in neighbors:
-                        new_positions.append(tuple(player_pos))
-                    else:
-                        if path2 and len(path2) >= 2 and path2[1] not in new_positions:
-                            new_positions.append(path2[1])
-                        else:
-                            new_positions.append(enemy_positions[2])
-                if enemy_roles[3] == 'predict':
-                    t4 = get_target_for_predicter(player_pos)
-                elif enemy_roles[3] == 'food_hunter':
-                    t4 = get_target_for_food_hunter(player_pos)
-                path4 = bfs(enemy_positions[3], t4, adjacency)
-                if path4 and len(path4) >= 2 and path4[1] not in new_positions:
-                    new_positions.append(path4[1])
+            pygame.display.update(dirty_rects + sprite_rects + [hud_rect])
+    PROFILER.end_frame(tick=game.tick)
+    dirty_rects = sprite_rects
+    overlay_on_screen = wanted_overlay
+    force_full_redraw = game.game_over
+
+def parse_seed(text):
+    try:
+        return check_seed(int(text))
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Pac-Man")
+    parser.add_argument("--speed", type=float, default=1.0, help="simulation speed relative to real time")
+    parser.add_argument("--turbo", action="store_true", help="run the simulation uncapped with the autopilot")
+    parser.add_argument("--render-every", type=int, default=100, help="in turbo mode, render every N ticks (0: never)")
+    parser.add_argument("--autopilot", action="store_true", help="let the greedy food policy drive Pac-Man")
+    parser.add_argument("--seed", type=parse_seed, default=None, help="seed for a reproducible run")
+    parser.add_argument("--width", type=int, default=GRID_WIDTH, help="maze width in cells")
+    parser.add_argument("--height", type=int, default=GRID_HEIGHT, help="maze height in cells")
+    parser.add_argument("--backend", choices=["python", "numpy"], default="python", help="level generator")
+    parser.add_argument("--level-cache", metavar="PATH", help="load levels from this cache file when it holds the seed")
+    parser.add_argument("--prefetch", type=int, default=PREFETCH_DEPTH, help="levels to build ahead (0: off)")
+    parser.add_argument("--prefetch-processes", action="store_true", help="build levels in a worker process")
+    parser.add_argument("--coop", action="store_true", help="plan the ghosts' moves jointly with cooperative A*")
+    parser.add_argument("--search-rollouts", type=int, default=0,
+                        help="let the chasing ghost pick its moves by this many rollouts per tick "
+                             "and plan the ghosts inline (0: off)")
+    parser.add_argument("--search-budget", type=int, default=SEARCH_NODE_BUDGET,
+                        help="playout ticks the searching ghosts may spend per enemy tick (0: no cap)")
+    parser.add_argument("--inline-ai", action="store_true", help="plan ghost moves in the frame instead of on a worker thread")
+    parser.add_argument("--ai-deadline", type=float, default=PLAN_DEADLINE * 1000,
+                        help="ms to wait for a late ghost plan before holding the ghosts for a tick")
+    parser.add_argument("--record", metavar="PATH", help="write a replay of this run to PATH on exit")
+    parser.add_argument("--profile", action="store_true", help="start with the profiler overlay shown (toggle: F3)")
+    parser.add_argument("--profile-out", metavar="PATH", help="write per-frame phase timings to PATH as JSON lines")
+    parser.add_argument("--profile-alloc", action="store_true", help="also track allocations (slow)")
+    return parser.parse_args(argv)
+
+def run_turbo(render_every, recorder):
+    def render():
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                return False
+        render_frame()
+        return True
+    ticks, elapsed = run_uncapped(game, greedy_food_policy, render=render, render_every=render_every,
+                                  recorder=recorder)
+    print(f"{ticks} ticks in {elapsed:.2f}s ({ticks / max(elapsed, 1e-9):.0f} ticks/s), level {game.level}, score {game.score}")
+
+def main(argv=None):
+    global game, show_trajectories
+    args = parse_args(argv)
+    # A level cache fixes the maze size and generator to the ones it was built with.
+    cache = LevelCache(args.level_cache) if args.level_cache else None
+    config = cache.config if cache is not None else LevelConfig(args.width, args.height, backend=args.backend)
+    prefetcher = LevelPrefetcher(config, args.prefetch, args.prefetch_processes) if args.prefetch else None
+    # The worker plans every move the player could make within a few milliseconds; the search
+    # spends its whole node budget on one, so it would only ever hold. Plan it inline: the
+    # default budget keeps an enemy tick well inside a frame.
+    inline = args.turbo or args.inline_ai or args.search_rollouts
+    planner = None if inline else GhostWorker(args.ai_deadline / 1000)
+    game = Game(args.seed, config, enemy_period=ENEMY_PERIOD, prefetcher=prefetcher, cache=cache,
+                planner=planner, coordinator=CooperativePlanner() if args.coop else None,
+                searcher=RolloutSearch(args.search_rollouts, node_budget=args.search_budget or None)
+                if args.search_rollouts else None)
+    set_profiler_visible(args.profile, args)
+    recorder = Recorder(game)
+    if args.turbo:
+        run_turbo(args.render_every, recorder)
+        finish(args, recorder)
+    scheduler = FixedStepScheduler(LOGIC_TICK_MS / 1000, speed=args.speed)
+    pending_moves = deque(maxlen=3)
+    elapsed = 0.0
+    running = True
+    while running:
+        with PROFILER.section("events"):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    running = False
+                elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    set_profiler_visible(not show_profiler, args)
+                elif event.type == pygame.MOUSEBUTTONDOWN and not game.game_over:
+                    if hud.toggle_hit(event.pos):
+                        show_trajectories = not show_trajectories
+                elif not game.game_over and event.type == pygame.KEYDOWN:
+                    direction = KEY_DIRECTIONS.get(event.key)
+                    if direction:
+                        pending_moves.append(direction)
+
+        with PROFILER.section("ticks"):
+            for _ in range(scheduler.advance(elapsed)):
+                if args.autopilot:
+                    action = greedy_food_policy(game)
                 else:
-                    new_positions.append(enemy_positions[3])
-            else:
-                for i, pos in enumerate(enemy_positions):
-                    role = enemy_roles[i] if i < len(enemy_roles) else 'bfs'
-                    if role == 'bfs':
-                        target = tuple(player_pos)
-                        path = bfs(pos, target, adjacency)
-                        if path and len(path) >= 2:
-                            next_step = path[1]
-                            if next_step in new_positions:
-                                new_positions.append(enemy_positions[i])
-                            else:
-                                new_positions.append(next_step)
-                        else:
-                            new_positions.append(pos)
-                    elif role == 'predict':
-                        predicted_pos = (
-                            player_pos[0] + 2 * last_player_direction[0],
-                            player_pos[1] + 2 * last_player_direction[1]
-                        )
-                        neighbors = adjacency.get(pos, [])
-                        if tuple(player_pos) in neighbors:
-                            new_positions.append(tuple(player_pos))
-                        elif (0 <= predicted_pos[0] < GRID_WIDTH and 0 <= predicted_pos[1] < GRID_HEIGHT):
-                            target = predicted_pos
-                        else:
-                            target = tuple(player_pos)
-                        path = bfs(pos, target, adjacency)
-                        if path and len(path) >= 2:
-                            next_step = path[1]
-                            if next_step in new_positions:
-                                new_positions.append(enemy_positions[i])
-                            else:
-                                new_positions.append(next_step)
-                        else:
-                            new_positions.append(pos)
-                    elif role == 'random':
-                        neighbors = adjacency.get(pos, [])
-                        if tuple(player_pos) in neighbors:
-                            new_positions.append(tuple(player_pos))
-                        elif neighbors:
-                            new_positions.append(random.choice(neighbors))
-                        else:
-                            new_positions.append(pos)
-                    elif role == "food_hunter":
-                        target_food = find_nearest_food_to_player(grid, tuple(player_pos), adjacency)
-                        neighbors = adjacency.get(pos, [])
-                        if tuple(player_pos) in neighbors:
-                            new_positions.append(tuple(player_pos))
-                        elif target_food:
-                            path_to_food = bfs(pos, target_food, adjacency)
-                            if path_to_food and len(path_to_food) > 1:
-                                next_step = path_to_food[1]
-                                if next_step not in new_positions:
-                                    new_positions.append(next_step)
-                                else:
-                                    new_positions.append(pos)
-                            else:
-                                new_positions.append(pos)
-                        else:
-                            new_positions.append(pos)
-                    else:
-                        path = bfs(pos, tuple(player_pos), adjacency)
-                        if path and len(path) >= 2:
-                            next_step = path[1]
-                            if next_step in new_positions:
-                                new_positions.append(enemy_positions[i])
-                            else:
-                                new_positions.append(next_step)
-                        else:
-                            new_positions.append(pos)
-            enemy_positions = new_positions
-            last_enemy_move_time = current_time
-            for enemy in enemy_positions:
-                if tuple(player_pos) == enemy:
-                    game_over = True
-
-    draw_grid(grid)
-    draw_barriers(barriers)
-    draw_pacman(player_pos)
-    draw_enemies()
-    draw_trajectories(team_target_1, team_target_2)
-    draw_info()
-    if game_over:
-        draw_game_over()
-    pygame.display.flip()
-    clock.tick(60)
-
-pygame.quit()
-sys.exit()
+                    action = pending_moves.popleft() if pending_moves else None
+                recorder.step(action)
+
+        render_frame()
+        elapsed = clock.tick(60) / 1000
+
+    finish(args, recorder)
+
+def finish(args, recorder):
+    if args.record:
+        recorder.replay.save(args.record)
+        print(f"replay of seed {game.seed} ({len(recorder.replay)} ticks) written to {args.record}")
+    PROFILER.disable()
+    if game.prefetcher is not None:
+        game.prefetcher.close()
+    if game.planner is not None:
+        game.planner.close()
+    if game.cache is not None:
+        game.cache.close()
+    pygame.quit()
+    sys.exit()
+
+if __name__ == "__main__":
+    main()
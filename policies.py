@@ -0,0 +1,49 @@
+import random
+
+from engine import ACTIONS
+
+
+def make_random_policy(seed=None):
+    rng = random.Random(seed)
+
+    def policy(game):
+        return rng.choice(ACTIONS)
+    return policy
+
+
+def greedy_food_policy(game):
+    target = game.nearest_food_to_player()
+    if target is None:
+        return None
+    step = game.routing.next_hop(game.player_pos, target)
+    if step is None:
+        return None
+    return (step[0] - game.player_pos[0], step[1] - game.player_pos[1])
+
+
+EVASION_DISTANCE = 3
+
+
+def ghost_distance(game, cell):
+    distances = [game.routing.distance(ghost, cell) for ghost in game.enemy_positions]
+    return min((d for d in distances if d is not None), default=game.width * game.height)
+
+
+def bfs_evasion_policy(game):
+    # Eats greedily while every ghost is at least EVASION_DISTANCE steps away; otherwise takes
+    # the move (or stays put) that keeps the nearest ghost furthest off, preferring food.
+    greedy = greedy_food_policy(game)
+    x, y = game.player_pos
+    moves = [None] + [action for action in ACTIONS if game.maze.is_open(game.player_pos, action)]
+    safety = {}
+    for action in moves:
+        cell = (x + action[0], y + action[1]) if action else game.player_pos
+        safety[action] = min(ghost_distance(game, cell), EVASION_DISTANCE)
+    if greedy is not None and safety[greedy] >= EVASION_DISTANCE:
+        return greedy
+
+    def food_distance(action):
+        cell = (x + action[0], y + action[1]) if action else game.player_pos
+        d = game.food.distance(cell)
+        return game.width * game.height if d is None else d
+    return max(moves, key=lambda action: (safety[action], action == greedy, -food_distance(action)))
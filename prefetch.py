@@ -0,0 +1,79 @@
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from engine import LEVEL_COUNT, build_level
+
+PREFETCH_DEPTH = 2
+
+
+class LevelPrefetcher:
+    # Builds the levels that follow the current one on a single worker, up to depth of them
+    # ahead. Each build ends with the RNG state the next one starts from, so the queue is a
+    # chain: an entry is submitted once the one before it has finished. Entries are keyed on
+    # (level, rng_state) and the whole chain is dropped as soon as the game asks for a key
+    # it does not start with, e.g. after a reset.
+    def __init__(self, config, depth=PREFETCH_DEPTH, processes=False):
+        self.config = config
+        self.depth = depth
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=1)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="level-prefetch")
+        self.lock = threading.RLock()
+        self.queue = deque()
+        self.tail = None
+        self.hits = 0
+        self.misses = 0
+
+    def request(self, level, rng_state):
+        with self.lock:
+            if self.queue and (self.queue[0][0], self.queue[0][1]) != (level, rng_state):
+                self.clear()
+            if not self.queue:
+                self._submit(level, rng_state)
+
+    def take(self, level, rng_state):
+        with self.lock:
+            if not self.queue or (self.queue[0][0], self.queue[0][1]) != (level, rng_state):
+                self.clear()
+                self.misses += 1
+                return None
+            future = self.queue.popleft()[2]
+            if self.tail.done():
+                self._extend(self.tail)
+        try:
+            build = future.result()
+        except Exception:
+            # A failed build also ends the chain behind it; the game builds this level inline.
+            self.clear()
+            self.misses += 1
+            return None
+        self.hits += 1
+        return build
+
+    def clear(self):
+        with self.lock:
+            for entry in self.queue:
+                entry[2].cancel()
+            self.queue.clear()
+            self.tail = None
+
+    def close(self):
+        self.clear()
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    def _submit(self, level, rng_state):
+        if level > LEVEL_COUNT or len(self.queue) >= self.depth:
+            return
+        future = self.executor.submit(build_level, level, rng_state, self.config, True)
+        self.queue.append((level, rng_state, future))
+        self.tail = future
+        future.add_done_callback(self._extend)
+
+    def _extend(self, future):
+        with self.lock:
+            if future is not self.tail or future.cancelled() or future.exception() is not None:
+                return
+            build = future.result()
+            self._submit(build.level + 1, build.rng_state)
@@ -0,0 +1,138 @@
+import functools
+import json
+import time
+import tracemalloc
+from collections import deque
+
+PROFILE_WINDOW = 300
+
+# Phases are timed inclusively: a level generated during a player move counts towards both
+# "tick.player" and "level.generate". Every hook starts with a check of PROFILER.enabled,
+# so a disabled profiler costs one attribute lookup per instrumented call.
+
+
+class _Section:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NullSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SECTION = _NullSection()
+
+
+class Profiler:
+    # frame_times and frame_counts collect the current frame; end_frame folds them into the
+    # rolling per-phase windows and, when exporting, writes the frame as one JSON line.
+    def __init__(self, window=PROFILE_WINDOW):
+        self.enabled = False
+        self.window = window
+        self.history = {}
+        self.frame_times = {}
+        self.frame_counts = {}
+        self.totals = {}
+        self.last_counts = {}
+        self.frames = 0
+        self.export = None
+        self.track_allocations = False
+
+    def enable(self, export_path=None, track_allocations=False):
+        if export_path and self.export is None:
+            self.export = open(export_path, "w")
+        if track_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.track_allocations = track_allocations
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.track_allocations and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.track_allocations = False
+        if self.export is not None:
+            self.export.close()
+            self.export = None
+
+    def section(self, name):
+        if not self.enabled:
+            return NULL_SECTION
+        return _Section(self, name)
+
+    def record(self, name, seconds):
+        self.frame_times[name] = self.frame_times.get(name, 0.0) + seconds
+
+    def count(self, name, amount=1):
+        self.frame_counts[name] = self.frame_counts.get(name, 0) + amount
+
+    def end_frame(self, **extra):
+        if not self.enabled:
+            return
+        if self.track_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            self.frame_counts["alloc.current_bytes"] = current
+            self.frame_counts["alloc.peak_bytes"] = peak
+            tracemalloc.reset_peak()
+        for name in self.frame_times.keys() | self.history.keys():
+            samples = self.history.get(name)
+            if samples is None:
+                samples = self.history[name] = deque(maxlen=self.window)
+            samples.append(self.frame_times.get(name, 0.0) * 1000)
+        for name, amount in self.frame_counts.items():
+            self.totals[name] = self.totals.get(name, 0) + amount
+        if self.export is not None:
+            line = {"frame": self.frames,
+                    "ms": {name: round(t * 1000, 4) for name, t in self.frame_times.items()},
+                    "counters": self.frame_counts}
+            line.update(extra)
+            self.export.write(json.dumps(line) + "\n")
+        self.frames += 1
+        self.last_counts = self.frame_counts
+        self.frame_times = {}
+        self.frame_counts = {}
+
+    def summary(self):
+        # (name, last, p50, p99, max) in milliseconds over the rolling window, slowest p99 first.
+        rows = []
+        for name, samples in self.history.items():
+            ordered = sorted(samples)
+            last = len(ordered) - 1
+            rows.append((name, samples[-1], ordered[last // 2], ordered[last * 99 // 100], ordered[-1]))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+
+PROFILER = Profiler()
+
+
+def profiled(name):
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
@@ -0,0 +1,187 @@
+import argparse
+import struct
+import time
+
+from coop import CooperativePlanner
+from engine import ACTIONS, Game, LevelConfig
+from lookahead import RolloutSearch
+
+# File layout: a fixed header followed by one 4-bit action code per tick, two ticks per byte.
+# Code 0 is "no input", codes 1-4 are ACTIONS in order; HELD is or-ed in on ticks where the
+# ghosts were held because their planner missed its deadline. Since version 2 the header ends
+# with the cooperative planner's window and node budget (window 0: no planner), since
+# version 3 with the rollout searcher's rollouts, depth and epsilon (rollouts 0: none) and
+# since version 4 with its node budget (0: none, as every version 3 searcher played).
+MAGIC = b"PMRP"
+VERSION = 4
+HEADERS = {1: struct.Struct("<4sBHHdBBHQI"), 2: struct.Struct("<4sBHHdBBHQIBI"),
+           3: struct.Struct("<4sBHHdBBHQIBIIBd"), 4: struct.Struct("<4sBHHdBBHQIBIIBdI")}
+HEADER = HEADERS[VERSION]
+BACKENDS = ["python", "numpy"]
+HELD = 8
+SEED_LIMIT = 2 ** 64
+
+
+def check_seed(seed):
+    # The header stores the seed as a uint64.
+    if not isinstance(seed, int) or not 0 <= seed < SEED_LIMIT:
+        raise ValueError(f"a replay seed must be an integer from 0 to 2**64 - 1, not {seed!r}")
+    return seed
+
+
+def encode_action(action):
+    return 0 if not action else ACTIONS.index(tuple(action)) + 1
+
+
+def decode_action(code):
+    return None if code == 0 else ACTIONS[code - 1]
+
+
+class Replay:
+    # coop: (window, node_budget) of the game's CooperativePlanner, search: (rollouts, depth,
+    # epsilon, node_budget) of its RolloutSearch; None without one.
+    def __init__(self, seed, config, enemy_period=1, codes=None, coop=None, search=None):
+        self.seed = seed
+        self.config = config
+        self.enemy_period = enemy_period
+        self.codes = bytearray() if codes is None else codes
+        self.coop = coop
+        self.search = search
+
+    def __len__(self):
+        return len(self.codes)
+
+    def record(self, action, held=False):
+        self.codes.append(encode_action(action) | (HELD if held else 0))
+
+    def action(self, tick):
+        return decode_action(self.codes[tick] & ~HELD)
+
+    def held(self, tick):
+        return bool(self.codes[tick] & HELD)
+
+    def new_game(self):
+        coordinator = CooperativePlanner(*self.coop) if self.coop else None
+        searcher = RolloutSearch(*self.search) if self.search else None
+        return Game(self.seed, self.config, self.enemy_period, coordinator=coordinator, searcher=searcher)
+
+    def to_bytes(self):
+        config = self.config
+        rollouts, depth, epsilon, node_budget = self.search or (0, 0, 0.0, None)
+        header = HEADER.pack(MAGIC, VERSION, config.width, config.height, config.food_density,
+                             config.row_spacing, BACKENDS.index(config.backend), self.enemy_period,
+                             self.seed, len(self.codes), *(self.coop or (0, 0)), rollouts, depth, epsilon,
+                             node_budget or 0)
+        codes = self.codes + bytearray(len(self.codes) % 2)
+        packed = bytes(codes[i] | codes[i + 1] << 4 for i in range(0, len(codes), 2))
+        return header + packed
+
+    @classmethod
+    def from_bytes(cls, data):
+        magic, version = struct.unpack_from("<4sB", data)
+        if magic != MAGIC or version not in HEADERS:
+            raise ValueError("not a Pac-Man replay file")
+        header = HEADERS[version]
+        (magic, version, width, height, food_density, row_spacing, backend, enemy_period,
+         seed, ticks, *extra) = header.unpack_from(data)
+        coop = (extra[0], extra[1]) if extra and extra[0] else None
+        search = None
+        if len(extra) > 2 and extra[2]:
+            search = (*extra[2:5], (extra[5] or None) if len(extra) > 5 else None)
+        config = LevelConfig(width, height, food_density, row_spacing, BACKENDS[backend])
+        codes = bytearray()
+        for byte in data[header.size:]:
+            codes.append(byte & 0xF)
+            codes.append(byte >> 4)
+        del codes[ticks:]
+        return cls(seed, config, enemy_period, codes, coop, search)
+
+    def save(self, path):
+        with open(path, "wb") as f:
+            f.write(self.to_bytes())
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.from_bytes(f.read())
+
+
+class Recorder:
+    # The seed is checked up front, so a run whose replay could not be saved fails to start
+    # rather than losing the recording on exit.
+    def __init__(self, game):
+        check_seed(game.seed)
+        coop = None
+        if game.coordinator is not None:
+            if game.coordinator.time_budget is not None:
+                raise ValueError("a cooperative planner with a time budget does not replay deterministically")
+            coop = (game.coordinator.window, game.coordinator.node_budget)
+        searcher = game.searcher
+        search = None
+        if searcher is not None:
+            search = (searcher.rollouts, searcher.depth, searcher.epsilon, searcher.node_budget)
+        self.game = game
+        self.replay = Replay(game.seed, game.config, game.enemy_period, coop=coop, search=search)
+
+    def step(self, action):
+        if self.game.game_over:
+            return True
+        game_over = self.game.step(action)
+        self.replay.record(action, self.game.enemies_held)
+        return game_over
+
+
+class ReplayPlayer:
+    # Re-simulates a replay headlessly. A clone of the game is kept every snapshot_every
+    # ticks, so seeking only replays the ticks since the nearest earlier snapshot.
+    def __init__(self, replay, snapshot_every=500):
+        self.replay = replay
+        self.snapshot_every = snapshot_every
+        self.game = replay.new_game()
+        self.snapshots = {0: self.game.clone()}
+
+    @property
+    def tick(self):
+        return self.game.tick
+
+    def step(self):
+        game = self.game
+        if game.tick >= len(self.replay) or game.game_over:
+            return False
+        game.step(self.replay.action(game.tick), self.replay.held(game.tick))
+        if game.tick % self.snapshot_every == 0 and game.tick not in self.snapshots:
+            self.snapshots[game.tick] = game.clone()
+        return True
+
+    def seek(self, tick):
+        tick = max(0, min(tick, len(self.replay)))
+        base = max(t for t in self.snapshots if t <= tick)
+        if self.game.tick > tick or base > self.game.tick:
+            self.game = self.snapshots[base].clone()
+        while self.game.tick < tick and self.step():
+            pass
+        return self.game
+
+    def run_to_end(self):
+        while self.step():
+            pass
+        return self.game
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-simulate a recorded Pac-Man replay headlessly")
+    parser.add_argument("path")
+    parser.add_argument("--seek", type=int, default=None, help="stop at this tick instead of the end")
+    args = parser.parse_args(argv)
+    replay = Replay.load(args.path)
+    start = time.perf_counter()
+    player = ReplayPlayer(replay)
+    game = player.seek(args.seek) if args.seek is not None else player.run_to_end()
+    elapsed = time.perf_counter() - start
+    print(f"seed {replay.seed}, {len(replay)} ticks recorded, stopped at tick {game.tick} in {elapsed * 1000:.1f} ms")
+    print(f"level {game.level}, score {game.score}, player {game.player_pos}, "
+          f"game over {game.game_over}, won {game.game_won}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,343 @@
+import array
+import heapq
+import threading
+from bisect import bisect_right
+from collections import deque
+
+from maze import DELTAS, WALL_DOWN, WALL_UP
+from profiler import PROFILER
+
+FULL_TABLE_CELLS = 1024
+LAZY_ROW_BYTES = 32 * 1024 * 1024
+NO_HOP = 255
+UNREACHABLE = -1
+
+HOP_DELTAS = DELTAS
+OPEN_CELLS = {bit: bytes(0 if mask & bit else 1 for mask in range(256)) for bit in (WALL_UP, WALL_DOWN)}
+
+
+class RoutingTable:
+    # Next hops and distances between any two cells, taking the lowest direction on a
+    # shortest path, exactly like bfs() and DistanceField.step_from, so ghosts keep their old
+    # routes.
+    #
+    # Up to FULL_TABLE_CELLS cells the whole table is built up front: hops[s][g] is the
+    # HOP_DELTAS index of the first move s -> g and dists[s][g] the distance. flat_hops can
+    # supply the hops as one buffer of cells * cells codes (e.g. a view into a level cache
+    # file); rows are then sliced out of it on first use and carry no distances.
+    #
+    # Larger mazes keep one distance field per goal instead, built on first use. A ghost's
+    # goal (the player, a pellet, a gap) changes far less often than its own cell, so rows
+    # keyed by goal keep hitting as the ghost walks. The least recently used fields are
+    # dropped once they hold more than max_bytes. The ghost worker thread shares the table
+    # with the game, so the field LRU is only changed under lock; full tables are never
+    # written after they are built.
+    def __init__(self, maze, max_bytes=LAZY_ROW_BYTES, flat_hops=None):
+        self.maze = maze
+        self.width = maze.width
+        self.height = maze.height
+        self.cells = maze.cells
+        self.full = self.cells <= FULL_TABLE_CELLS
+        self.max_fields = max(1, max_bytes // (self.cells * array.array("i").itemsize))
+        self.fields = {}
+        self.lock = threading.Lock()
+        self.hops = None
+        self.dists = None
+        self.flat_hops = flat_hops
+        if self.full:
+            self.hops = [None] * self.cells
+            self.dists = [None] * self.cells
+            if flat_hops is None:
+                offsets, targets = maze.offsets, maze.targets
+                adjacency = [targets[offsets[i]:offsets[i + 1]].tolist() for i in range(self.cells)]
+                for s in range(self.cells):
+                    self._build_row(s, adjacency)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _build_row(self, s, adjacency):
+        hop = bytearray(b"\xff") * self.cells
+        dist = array.array("i", [UNREACHABLE]) * self.cells
+        dist[s] = 0
+        steps = self.maze.steps
+        queue = deque()
+        for n in adjacency[s]:
+            dist[n] = 1
+            hop[n] = steps.index(n - s)
+            queue.append(n)
+        while queue:
+            current = queue.popleft()
+            d = dist[current] + 1
+            first = hop[current]
+            for n in adjacency[current]:
+                if dist[n] == UNREACHABLE:
+                    dist[n] = d
+                    hop[n] = first
+                    queue.append(n)
+        self.hops[s] = hop
+        self.dists[s] = dist
+        if PROFILER.enabled:
+            PROFILER.count("routing.rows")
+            PROFILER.count("bfs.nodes", self.cells - dist.count(UNREACHABLE))
+
+    def hop_row(self, s):
+        # The hop codes from cell index s to every cell. Full tables only.
+        if not self.full:
+            raise ValueError(f"a {self.width}x{self.height} routing table keeps no hop rows")
+        hop = self.hops[s]
+        if hop is None:
+            hop = self.hops[s] = self.flat_hops[s * self.cells:(s + 1) * self.cells]
+        return hop
+
+    def field(self, goal):
+        # The DistanceField out of goal, for a lazy table. A missing field is built outside
+        # the lock, so two threads may both build it; the second one's replaces the first.
+        fields = self.fields
+        with self.lock:
+            field = fields.pop(goal, None)
+            if field is not None:
+                fields[goal] = field
+                return field
+        field = DistanceField(self.maze, goal)
+        if PROFILER.enabled:
+            PROFILER.count("routing.rows")
+        with self.lock:
+            fields.pop(goal, None)
+            while len(fields) >= self.max_fields:
+                del fields[next(iter(fields))]
+            fields[goal] = field
+        return field
+
+    def distances_to(self, goal):
+        # The distance from every cell index to goal, or None when the table holds no
+        # distances (full tables read from flat_hops). The maze is undirected, so the row
+        # out of goal serves.
+        if not self.full:
+            return self.field(goal).dist
+        return self.dists[goal[1] * self.width + goal[0]]
+
+    def next_hop(self, start, goal):
+        if not self.full:
+            return self.field(goal).step_from(start)
+        x, y = start
+        code = self.hop_row(y * self.width + x)[goal[1] * self.width + goal[0]]
+        if code == NO_HOP:
+            return None
+        dx, dy = HOP_DELTAS[code]
+        return (x + dx, y + dy)
+
+    def distance(self, start, goal):
+        if not self.full:
+            return self.field(goal).distance(start)
+        dist = self.dists[start[1] * self.width + start[0]]
+        if dist is None:
+            path = self.path(start, goal)
+            return None if path is None else len(path) - 1
+        d = dist[goal[1] * self.width + goal[0]]
+        return None if d == UNREACHABLE else d
+
+    def path(self, start, goal):
+        if start == goal:
+            return [start]
+        if self.next_hop(start, goal) is None:
+            return None
+        path = [start]
+        current = start
+        while current != goal:
+            current = self.next_hop(current, goal)
+            path.append(current)
+        return path
+
+
+class DistanceField:
+    # One BFS sweep out of source, shared by every ghost that chases it.
+    def __init__(self, maze, source):
+        width = maze.width
+        offsets, targets = maze.offsets, maze.targets
+        self.width = width
+        self.maze = maze
+        self.source = source
+        dist = array.array("i", [UNREACHABLE]) * maze.cells
+        start = source[1] * width + source[0]
+        dist[start] = 0
+        queue = deque()
+        queue.append(start)
+        while queue:
+            current = queue.popleft()
+            d = dist[current] + 1
+            for n in targets[offsets[current]:offsets[current + 1]]:
+                if dist[n] == UNREACHABLE:
+                    dist[n] = d
+                    queue.append(n)
+        self.dist = dist
+        if PROFILER.enabled:
+            PROFILER.count("bfs.calls")
+            PROFILER.count("bfs.nodes", maze.cells - dist.count(UNREACHABLE))
+
+    def distance(self, cell):
+        d = self.dist[cell[1] * self.width + cell[0]]
+        return None if d == UNREACHABLE else d
+
+    def step_from(self, cell):
+        x, y = cell
+        p = y * self.width + x
+        d = self.dist[p] - 1
+        if d < 0:
+            return None
+        dist = self.dist
+        offsets, targets = self.maze.offsets, self.maze.targets
+        for n in targets[offsets[p]:offsets[p + 1]]:
+            if dist[n] == d:
+                return (n % self.width, n // self.width)
+        return None
+
+
+class FoodIndex:
+    # dist/owner hold, for every cell, the distance to and the index of its nearest pellet.
+    # Ties go to the lowest pellet index, both in the initial multi-source BFS (pellets are
+    # queued in index order) and in the repair, which orders its heap by (dist, owner).
+    # Eating a pellet only recomputes the cells that pellet owned. arrays can supply the
+    # initial (dist, owner) for grid, which are copied instead of recomputed.
+    def __init__(self, maze, grid, arrays=None):
+        width = maze.width
+        self.width = width
+        self.maze = maze
+        self.pellets = set()
+        for y, row in enumerate(grid):
+            for x, value in enumerate(row):
+                if value == 1:
+                    self.pellets.add(y * width + x)
+        if arrays is not None:
+            self.dist = array.array("i", arrays[0])
+            self.owner = array.array("i", arrays[1])
+            return
+        self.dist = array.array("i", [UNREACHABLE]) * maze.cells
+        self.owner = array.array("i", [UNREACHABLE]) * maze.cells
+        queue = deque()
+        for p in sorted(self.pellets):
+            self.dist[p] = 0
+            self.owner[p] = p
+            queue.append(p)
+        self._spread(queue)
+
+    def _spread(self, queue):
+        dist = self.dist
+        owner = self.owner
+        offsets, targets = self.maze.offsets, self.maze.targets
+        while queue:
+            current = queue.popleft()
+            d = dist[current] + 1
+            for n in targets[offsets[current]:offsets[current + 1]]:
+                if dist[n] == UNREACHABLE:
+                    dist[n] = d
+                    owner[n] = owner[current]
+                    queue.append(n)
+
+    def copy(self):
+        other = FoodIndex.__new__(FoodIndex)
+        other.width = self.width
+        other.maze = self.maze
+        other.pellets = set(self.pellets)
+        other.dist = array.array("i", self.dist)
+        other.owner = array.array("i", self.owner)
+        return other
+
+    def __len__(self):
+        return len(self.pellets)
+
+    def __contains__(self, cell):
+        return cell[1] * self.width + cell[0] in self.pellets
+
+    def nearest(self, cell):
+        o = self.owner[cell[1] * self.width + cell[0]]
+        if o == UNREACHABLE:
+            return None
+        return (o % self.width, o // self.width)
+
+    def distance(self, cell):
+        d = self.dist[cell[1] * self.width + cell[0]]
+        return None if d == UNREACHABLE else d
+
+    def remove(self, cell):
+        p = cell[1] * self.width + cell[0]
+        if p not in self.pellets:
+            return False
+        self.pellets.discard(p)
+        dist = self.dist
+        owner = self.owner
+        offsets, targets = self.maze.offsets, self.maze.targets
+        region = [p]
+        owner[p] = UNREACHABLE
+        dist[p] = UNREACHABLE
+        i = 0
+        while i < len(region):
+            r = region[i]
+            for n in targets[offsets[r]:offsets[r + 1]]:
+                if owner[n] == p:
+                    owner[n] = UNREACHABLE
+                    dist[n] = UNREACHABLE
+                    region.append(n)
+            i += 1
+        heap = []
+        for r in region:
+            for n in targets[offsets[r]:offsets[r + 1]]:
+                if owner[n] != UNREACHABLE:
+                    heap.append((dist[n], owner[n], n))
+        heapq.heapify(heap)
+        while heap:
+            d, o, current = heapq.heappop(heap)
+            if d != dist[current] or o != owner[current]:
+                continue
+            for n in targets[offsets[current]:offsets[current + 1]]:
+                if dist[n] == UNREACHABLE or d + 1 < dist[n] or (d + 1 == dist[n] and o < owner[n]):
+                    dist[n] = d + 1
+                    owner[n] = o
+                    heapq.heappush(heap, (d + 1, o, n))
+        if PROFILER.enabled:
+            PROFILER.count("food.repairs")
+            PROFILER.count("food.repaired_cells", len(region))
+        return True
+
+
+class GapIndex:
+    # Built once per level from the wall rows in sorted_rows. up[i] holds the x of every gap
+    # leading up through rows[i], down[i] every gap leading down into rows[i] from the row
+    # above; the band of a cell is found by bisection.
+    def __init__(self, maze, rows):
+        self.rows = list(rows)
+        self.up = [self._gaps(maze, y, WALL_UP) for y in self.rows]
+        self.down = [self._gaps(maze, y - 1, WALL_DOWN) for y in self.rows]
+
+    @staticmethod
+    def _gaps(maze, y, bit):
+        if not 0 <= y < maze.height:
+            return ()
+        start = y * maze.width
+        open_cells = bytes(maze.walls[start + 1:start + maze.width - 1]).translate(OPEN_CELLS[bit])
+        gaps = []
+        x = open_cells.find(1)
+        while x != -1:
+            gaps.append(x + 1)
+            x = open_cells.find(1, x + 1)
+        return tuple(gaps)
+
+    def band(self, y):
+        # Index of the last wall row at or above y, or -1 above the first one.
+        return bisect_right(self.rows, y) - 1
+
+    def gap_above(self, band):
+        if band < 0 or not self.up[band]:
+            return None
+        return (self.up[band][0], self.rows[band])
+
+    def gap_below(self, band):
+        if band + 1 >= len(self.rows) or not self.down[band + 1]:
+            return None
+        return (self.down[band + 1][0], self.rows[band + 1] - 1)
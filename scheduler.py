@@ -0,0 +1,44 @@
+import time
+
+
+class FixedStepScheduler:
+    # Turns elapsed wall-clock time into a whole number of logical ticks. Time that does not
+    # add up to a full tick stays in the accumulator; alpha is the fraction of the next tick
+    # already elapsed, for renderers that interpolate between ticks.
+    def __init__(self, tick_seconds, speed=1.0, max_steps=5):
+        self.tick_seconds = tick_seconds
+        self.speed = speed
+        self.max_steps = max_steps
+        self.accumulator = 0.0
+        self.ticks = 0
+
+    def advance(self, elapsed):
+        self.accumulator += elapsed * self.speed
+        steps = int(self.accumulator // self.tick_seconds)
+        limit = max(1, int(self.max_steps * self.speed))
+        if steps > limit:
+            steps = limit
+            self.accumulator = 0.0
+        else:
+            self.accumulator -= steps * self.tick_seconds
+        self.ticks += steps
+        return steps
+
+    @property
+    def alpha(self):
+        return self.accumulator / self.tick_seconds
+
+
+def run_uncapped(game, policy=None, max_ticks=None, render=None, render_every=0, recorder=None):
+    # Steps the game as fast as the CPU allows. render is called every render_every ticks
+    # (never when render_every is 0) and can return False to stop early.
+    step = recorder.step if recorder is not None else game.step
+    start = time.perf_counter()
+    ticks = 0
+    while not game.game_over and (max_ticks is None or ticks < max_ticks):
+        step(policy(game) if policy else None)
+        ticks += 1
+        if render is not None and render_every and ticks % render_every == 0:
+            if render() is False:
+                break
+    return ticks, time.perf_counter() - start
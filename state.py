@@ -0,0 +1,111 @@
+from engine import ACTIONS, POINTS_TO_NEXT_LEVEL
+from maze import WALL_BITS
+
+NO_DIRECTION = -1
+
+
+class GameState:
+    # Everything a tick changes within one level, packed for lookahead search: cells are
+    # maze indices (y * width + x), the player's last direction is an ACTIONS index
+    # (NO_DIRECTION before the first move), the ghosts are a tuple of cells and the food is
+    # one byte per cell. The maze is shared and never written.
+    #
+    # clone() is O(1): the food bitmap is shared until either copy eats a pellet, and the
+    # clone starts with an empty undo history. apply_move()/undo() play a tick forwards and
+    # back on one state, so a rollout needs no copies at all.
+    __slots__ = ("maze", "food", "food_owned", "player", "last_direction", "enemies", "score", "goal",
+                 "level", "team_mode", "tick", "caught", "history")
+
+    def __init__(self, maze, food, player, enemies, score=0, level=1, team_mode=0, tick=0,
+                 last_direction=NO_DIRECTION):
+        self.maze = maze
+        self.food = food
+        self.food_owned = True
+        self.player = player
+        self.last_direction = last_direction
+        self.enemies = tuple(enemies)
+        self.score = score
+        self.goal = POINTS_TO_NEXT_LEVEL * level
+        self.level = level
+        self.team_mode = team_mode
+        self.tick = tick
+        self.caught = self.player in self.enemies
+        self.history = []
+
+    @classmethod
+    def from_game(cls, game):
+        maze = game.maze
+        width = maze.width
+        food = bytearray(maze.cells)
+        for p in game.food.pellets:
+            food[p] = 1
+        direction = game.last_player_direction
+        return cls(maze, food, game.player_pos[1] * width + game.player_pos[0],
+                   [y * width + x for x, y in game.enemy_positions], game.score, game.level, game.team_mode,
+                   game.tick, ACTIONS.index(direction) if direction in ACTIONS else NO_DIRECTION)
+
+    def clone(self):
+        other = GameState.__new__(GameState)
+        other.maze = self.maze
+        other.food = self.food
+        other.player = self.player
+        other.last_direction = self.last_direction
+        other.enemies = self.enemies
+        other.score = self.score
+        other.goal = self.goal
+        other.level = self.level
+        other.team_mode = self.team_mode
+        other.tick = self.tick
+        other.caught = self.caught
+        other.history = []
+        self.food_owned = other.food_owned = False
+        return other
+
+    @property
+    def cleared(self):
+        return self.score >= self.goal
+
+    @property
+    def terminal(self):
+        return self.caught or self.score >= self.goal
+
+    def cell(self, i):
+        return self.maze.cell(i)
+
+    def _own_food(self):
+        if not self.food_owned:
+            self.food = bytearray(self.food)
+            self.food_owned = True
+
+    def apply_move(self, direction, enemies=None):
+        # One tick as Game.step plays it: the player moves (direction is an ACTIONS index, or
+        # NO_DIRECTION for no input) and eats, then on an enemy tick the ghosts move to
+        # enemies and catch the player if one lands on the player's cell. A blocked move is a
+        # no-op, as in the game. Ending the level is left to the caller: see terminal.
+        old = self.player
+        player = old
+        eaten = -1
+        maze = self.maze
+        if direction != NO_DIRECTION and not maze.walls[player] & WALL_BITS[direction]:
+            player += maze.steps[direction]
+            if self.food[player]:
+                self._own_food()
+                self.food[player] = 0
+                self.score += 1
+                eaten = player
+        self.history.append((old, self.last_direction, self.enemies, self.caught, eaten))
+        if player != old:
+            self.player = player
+            self.last_direction = direction
+        if enemies is not None:
+            self.enemies = enemies
+            self.caught = player in enemies
+        self.tick += 1
+
+    def undo(self):
+        self.player, self.last_direction, self.enemies, self.caught, eaten = self.history.pop()
+        self.tick -= 1
+        if eaten >= 0:
+            self._own_food()
+            self.food[eaten] = 1
+            self.score -= 1
@@ -0,0 +1,92 @@
+import random
+import threading
+
+import pytest
+
+from aiworker import GhostWorker
+from engine import Game, LevelConfig, build_level
+from policies import bfs_evasion_policy
+from replay import HELD, Recorder, Replay, ReplayPlayer
+from routing import FULL_TABLE_CELLS, DistanceField, RoutingTable
+
+TICKS = 600
+LAZY = LevelConfig(40, 40)
+
+
+def play(seed, enemy_period, planner=None, config=None, ticks=TICKS):
+    game = Game(seed, config or LevelConfig(), enemy_period, planner=planner)
+    recorder = Recorder(game)
+    try:
+        while not game.game_over and game.tick < ticks:
+            recorder.step(bfs_evasion_policy(game))
+    finally:
+        if planner is not None:
+            planner.close()
+    return game, recorder.replay
+
+
+def state(game):
+    return (game.tick, game.level, game.score, game.player_pos, game.enemy_positions, game.game_over,
+            game.ai_rng.getstate())
+
+
+@pytest.mark.parametrize("seed", range(4))
+@pytest.mark.parametrize("enemy_period", [1, 3])
+def test_worker_plays_like_inline_planning(seed, enemy_period):
+    # With a deadline it never misses, the worker's plans are exactly the inline ones.
+    inline, inline_replay = play(seed, enemy_period)
+    worker = GhostWorker(deadline=5.0)
+    planned, planned_replay = play(seed, enemy_period, worker)
+    assert state(planned) == state(inline)
+    assert planned_replay.codes == inline_replay.codes
+    assert worker.held == 0
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_held_ticks_replay(seed):
+    # A zero deadline holds the ghosts whenever the plan is late; the replay records those
+    # ticks and plays them back without a worker.
+    game, replay = play(seed, 2, GhostWorker(deadline=0.0))
+    assert any(code & HELD for code in replay.codes)
+    replay = Replay.from_bytes(replay.to_bytes())
+    assert state(ReplayPlayer(replay).run_to_end()) == state(game)
+
+
+@pytest.mark.parametrize("seed", range(2))
+def test_worker_on_a_lazy_board(seed, monkeypatch):
+    # Above FULL_TABLE_CELLS both threads share the routing table's distance fields; room for
+    # only a few of them keeps the LRU evicting while the worker plans.
+    assert LAZY.width * LAZY.height > FULL_TABLE_CELLS
+    monkeypatch.setattr(RoutingTable.__init__, "__defaults__", (3 * LAZY.width * LAZY.height * 4, None))
+    inline, inline_replay = play(seed, 1, config=LAZY, ticks=150)
+    worker = GhostWorker(deadline=5.0)
+    planned, planned_replay = play(seed, 1, worker, LAZY, 150)
+    assert not planned.routing.full and len(planned.routing.fields) <= 3
+    assert worker.hits > 0
+    assert state(planned) == state(inline)
+    assert planned_replay.codes == inline_replay.codes
+
+
+def test_lazy_fields_survive_concurrent_use():
+    build = build_level(1, random.Random(0).getstate(), LAZY)
+    table = RoutingTable(build.maze, max_bytes=4 * build.maze.cells * 4)
+    goals = [(x, y) for x in range(4) for y in range(4)]
+    errors = []
+
+    def hammer(seed):
+        rng = random.Random(seed)
+        try:
+            for _ in range(400):
+                goal = rng.choice(goals)
+                assert table.field(goal).source == goal
+        except Exception as error:
+            errors.append(error)
+    threads = [threading.Thread(target=hammer, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == []
+    assert len(table.fields) <= table.max_fields == 4
+    for goal, field in table.fields.items():
+        assert field.dist == DistanceField(build.maze, goal).dist
@@ -0,0 +1,78 @@
+import random
+
+import numpy as np
+import pytest
+
+from batch import BatchGame, LevelPool
+from engine import ACTIONS, POINTS_TO_NEXT_LEVEL, ROLES, Game, LevelConfig, build_level
+from policies import bfs_evasion_policy
+from replay import encode_action
+
+BOARDS = 10
+TICKS = 400
+
+# Lineups without random ghosts: those draw from a different stream in the batch.
+LINEUPS = [
+    (5, 0, ['bfs', 'predict', 'food_hunter', 'predict']),
+    (5, 0, ['bfs', 'food_hunter', 'predict', 'food_hunter']),
+    (6, 1, ['bfs', 'team', 'team', 'predict']),
+    (6, 2, ['bfs', 'team', 'team', 'food_hunter']),
+]
+
+
+def lockstep(config, level, team_mode, roles, enemy_period, seed):
+    # Plays the same board, lineup and inputs in a BatchGame and in one Game per board, and
+    # checks every game until it leaves the level (the batch then draws a board of its own).
+    # The inputs come from the evasion policy on the Game side, so games run long enough for
+    # the ghosts to close in, with a random move mixed in now and then.
+    builds = [build_level(1, random.Random(f"{seed}:{i}").getstate(), config) for i in range(BOARDS)]
+    pool = LevelPool(builds, config)
+    batch = BatchGame(BOARDS, pool, seed, enemy_period)
+    rows = np.arange(BOARDS)
+    batch.board[:] = rows
+    batch.food[:] = pool.food
+    batch.level[:] = level
+    batch.team_mode[:] = team_mode
+    batch.score[:] = POINTS_TO_NEXT_LEVEL * (level - 1)
+    batch.set_roles(rows, [[ROLES.index(role) for role in roles]] * BOARDS)
+    games = []
+    for i in range(BOARDS):
+        game = Game(seed, config, enemy_period)
+        game.install_level(build_level(1, random.Random(f"{seed}:{i}").getstate(), config))
+        game.level = level
+        game.score = POINTS_TO_NEXT_LEVEL * (level - 1)
+        game.team_mode = team_mode
+        game.init_enemies_for_level(list(roles))
+        games.append(game)
+    width = config.width
+    rng = random.Random(seed)
+    live = np.ones(BOARDS, dtype=bool)
+    checked = 0
+    for tick in range(TICKS):
+        actions = [bfs_evasion_policy(game) if rng.random() < 0.9 else rng.choice([None, *ACTIONS]) for game in games]
+        batch.step([encode_action(action) for action in actions])
+        for i in np.flatnonzero(live):
+            game = games[i]
+            game.step(actions[i])
+            if game.level != level or game.game_over:
+                live[i] = False
+                assert batch.over[i] or batch.level[i] != level
+                if game.game_over:
+                    assert batch.over[i] and batch.won[i] == game.game_won
+                continue
+            assert batch.player[i] == game.player_pos[1] * width + game.player_pos[0]
+            assert batch.enemies[i].tolist() == [y * width + x for x, y in game.enemy_positions]
+            assert batch.score[i] == game.score
+            assert not batch.over[i]
+            checked += 1
+        if not live.any():
+            break
+    return checked
+
+
+@pytest.mark.parametrize("size", [(15, 15), (21, 12)])
+@pytest.mark.parametrize("level, team_mode, roles", LINEUPS)
+@pytest.mark.parametrize("enemy_period", [1, 3])
+def test_batch_matches_game(size, level, team_mode, roles, enemy_period):
+    checked = lockstep(LevelConfig(*size), level, team_mode, roles, enemy_period, seed=sum(size) + level)
+    assert checked > BOARDS * 10
@@ -0,0 +1,142 @@
+import random
+
+import numpy as np
+import pytest
+
+from engine import ACTIONS, LEVEL_COUNT, POINTS_TO_NEXT_LEVEL, ROLES, LevelConfig
+from env import LOSS_REWARD, PLANES, WALL_PLANES, WIN_REWARD, PacmanEnv
+from maze import WALL_BITS
+from policies import bfs_evasion_policy
+from replay import encode_action
+
+STEPS = 1500
+
+
+def expected_planes(game):
+    # The planes built from scratch out of the game state.
+    height, width = game.height, game.width
+    walls = np.array(game.maze.walls, dtype=np.uint8).reshape(height, width)
+    player = np.zeros((height, width), dtype=np.uint8)
+    player[game.player_pos[1], game.player_pos[0]] = 1
+    ghosts = np.zeros((len(ROLES), height, width), dtype=np.uint8)
+    for role, (x, y) in zip(game.enemy_roles, game.enemy_positions):
+        ghosts[ROLES.index(role), y, x] += 1
+    return {
+        "food": np.array(game.grid, dtype=np.uint8),
+        "walls": np.stack([(walls & bit != 0).astype(np.uint8) for bit in WALL_BITS]),
+        "player": player,
+        "ghosts": ghosts,
+    }
+
+
+def assert_matches(observation, game):
+    for name, plane in expected_planes(game).items():
+        np.testing.assert_array_equal(observation[name], plane, err_msg=name)
+
+
+def open_neighbor(game, pos, food):
+    # An ACTIONS entry leading from pos to a cell with (food=True) or without a pellet.
+    for action in ACTIONS:
+        if game.maze.is_open(pos, action):
+            cell = (pos[0] + action[0], pos[1] + action[1])
+            if (game.grid[cell[1]][cell[0]] == 1) == food:
+                return action, cell
+    return None, None
+
+
+def next_to_pellet(game):
+    # Puts the player next to a pellet; returns the action that eats it. The tests using it
+    # keep the ghosts still with a long enemy_period.
+    for pellet in sorted(game.food.pellets):
+        cell = (pellet % game.width, pellet // game.width)
+        action, start = open_neighbor(game, cell, food=False)
+        if action is not None:
+            game.player_pos = start
+            game.player_field = None
+            return encode_action((-action[0], -action[1]))
+    raise AssertionError("no pellet with an empty open neighbour")
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("enemy_period", [1, 8])
+def test_observations_track_the_game(seed, enemy_period):
+    env = PacmanEnv(LevelConfig(), enemy_period)
+    observation, info = env.reset(seed)
+    assert_matches(observation, env.game)
+    rng = random.Random(seed)
+    levels = {env.game.level}
+    for _ in range(STEPS):
+        action = bfs_evasion_policy(env.game) if rng.random() < 0.9 else rng.choice([None, *ACTIONS])
+        observation, reward, terminated, truncated, info = env.step(encode_action(action))
+        assert_matches(observation, env.game)
+        assert info["score"] == env.game.score and info["tick"] == env.game.tick
+        levels.add(env.game.level)
+        if terminated:
+            observation, info = env.reset(rng.getrandbits(32))
+            assert_matches(observation, env.game)
+    assert len(levels) > 1
+
+
+def test_observation_views_are_read_only():
+    env = PacmanEnv(LevelConfig())
+    observation, _ = env.reset(0)
+    assert list(observation) == PLANES
+    for plane in observation.values():
+        assert not plane.flags.writeable
+        with pytest.raises(ValueError):
+            plane[(0,) * plane.ndim] = 1
+    with pytest.raises(ValueError):
+        env.planes[0, 0, 0] = 1
+    observation, *_ = env.step(0)
+    assert all(not plane.flags.writeable for plane in observation.values())
+    assert observation["walls"].shape == (WALL_PLANES, env.game.height, env.game.width)
+
+
+def test_eating_rewards_one_point():
+    env = PacmanEnv(LevelConfig(), enemy_period=1000)
+    env.reset(1)
+    action = next_to_pellet(env.game)
+    _, reward, terminated, _, info = env.step(action)
+    assert reward == 1.0 and not terminated and info["score"] == 1
+    action, _ = open_neighbor(env.game, env.game.player_pos, food=False)
+    _, reward, terminated, _, _ = env.step(encode_action(action))
+    assert reward == 0.0 and not terminated
+
+
+def test_level_clear_rewards_the_pellet_only():
+    env = PacmanEnv(LevelConfig(), enemy_period=1000)
+    env.reset(2)
+    game = env.game
+    game.score = POINTS_TO_NEXT_LEVEL - 1
+    action = next_to_pellet(game)
+    observation, reward, terminated, _, info = env.step(action)
+    assert reward == 1.0 and not terminated
+    assert info["level"] == 2
+    assert_matches(observation, game)
+
+
+def test_winning_adds_the_win_reward():
+    env = PacmanEnv(LevelConfig(), enemy_period=1000)
+    env.reset(3)
+    game = env.game
+    game.level = LEVEL_COUNT
+    game.score = POINTS_TO_NEXT_LEVEL * LEVEL_COUNT - 1
+    action = next_to_pellet(game)
+    _, reward, terminated, _, info = env.step(action)
+    assert reward == 1.0 + WIN_REWARD and terminated and info["won"]
+    _, reward, terminated, _, _ = env.step(0)
+    assert reward == 0.0 and terminated
+
+
+def test_capture_adds_the_loss_reward():
+    env = PacmanEnv(LevelConfig(), enemy_period=1)
+    env.reset(4)
+    game = env.game
+    game.enemy_team_mode = False
+    game.enemy_roles = ['bfs'] * len(game.enemy_positions)
+    action, cell = open_neighbor(game, game.player_pos, food=False)
+    game.enemy_positions = [cell] + game.enemy_positions[1:]
+    env._load_level()
+    _, reward, terminated, _, info = env.step(0)
+    assert reward == LOSS_REWARD and terminated and not info["won"]
+    assert env.observation["ghosts"][ROLES.index('bfs'), game.player_pos[1], game.player_pos[0]] >= 1
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+from engine import Game, LevelConfig, find_nearest_food_to_player
+from maze import Maze
+from routing import UNREACHABLE, DistanceField, FoodIndex
+
+
+def lowest_nearest(maze, pellets, cell):
+    # The tie-break FoodIndex promises: the lowest pellet index among the nearest pellets.
+    dist = DistanceField(maze, cell).dist
+    reachable = [p for p in pellets if dist[p] != UNREACHABLE]
+    if not reachable:
+        return None
+    best = min(reachable, key=lambda p: (dist[p], p))
+    return (best % maze.width, best // maze.width)
+
+
+def test_ties_go_to_the_lowest_pellet_index():
+    # The old per-query BFS returned the first pellet in neighbour order (left before up);
+    # the index prefers the lower cell index, which here is the pellet above.
+    maze = Maze.from_barriers([], 5, 5)
+    grid = [[0] * 5 for _ in range(5)]
+    grid[1][2] = grid[2][1] = 1
+    food = FoodIndex(maze, grid)
+    assert food.nearest((2, 2)) == (2, 1)
+    assert food.distance((2, 2)) == 1
+    assert find_nearest_food_to_player(grid, (2, 2), maze) == (1, 2)
+    food.remove((2, 1))
+    assert food.nearest((2, 2)) == (1, 2)
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_index_matches_the_tie_break_while_eating(seed):
+    game = Game(seed, LevelConfig(21, 17))
+    maze = game.maze
+    food = game.food.copy()
+    rng = random.Random(seed)
+    pellets = sorted(food.pellets)
+    rng.shuffle(pellets)
+    for eaten in pellets[:len(pellets) // 2 + 1]:
+        for _ in range(20):
+            cell = (rng.randrange(maze.width), rng.randrange(maze.height))
+            nearest = food.nearest(cell)
+            assert nearest == lowest_nearest(maze, food.pellets, cell)
+            reference = find_nearest_food_to_player(
+                [[int(y * maze.width + x in food.pellets) for x in range(maze.width)] for y in range(maze.height)],
+                cell, maze)
+            if nearest is None:
+                assert reference is None
+            else:
+                assert food.distance(cell) == len(maze.bfs(cell, reference)) - 1
+        food.remove((eaten % maze.width, eaten // maze.width))
@@ -0,0 +1,47 @@
+import pytest
+
+from engine import Game, LevelConfig
+
+
+def scan_team2_targets(game):
+    # get_team2_targets before the gap index: find the player's band in sorted_rows, then
+    # scan the row cells for the leftmost gap through its top and bottom wall rows.
+    player_pos = game.player_pos
+    sorted_rows = game.sorted_rows
+    i = None
+    for idx in range(len(sorted_rows) - 1):
+        if sorted_rows[idx] <= player_pos[1] < sorted_rows[idx + 1]:
+            i = idx
+            break
+    if i is None:
+        if not sorted_rows or player_pos[1] < sorted_rows[0]:
+            i = -1
+        else:
+            i = len(sorted_rows) - 1
+    target_pos_2 = None
+    if i != -1:
+        row = sorted_rows[i]
+        for x in range(1, game.width - 1):
+            if 0 <= row - 1 < game.height and game.no_barrier_between((x, row), (x, row - 1)):
+                target_pos_2 = (x, row)
+                break
+    target_pos_3 = None
+    if i != len(sorted_rows) - 1:
+        row = sorted_rows[i + 1] - 1
+        for x in range(1, game.width - 1):
+            if 0 <= row + 1 < game.height and game.no_barrier_between((x, row), (x, row + 1)):
+                target_pos_3 = (x, row)
+                break
+    return target_pos_2 or player_pos, target_pos_3 or player_pos
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("size", [(15, 15), (21, 12), (40, 33)])
+def test_gap_index_matches_row_scan(backend, size):
+    config = LevelConfig(*size, backend=backend)
+    for seed in range(10):
+        game = Game(seed, config)
+        for y in range(game.height):
+            for x in range(game.width):
+                game.player_pos = (x, y)
+                assert game.get_team2_targets() == scan_team2_targets(game), (seed, x, y)
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from engine import ENEMY_PERIOD, LEVEL_COUNT, Game, LevelConfig, build_level
+from levelcache import HEADER, INDEX, LevelCache, record_size, write_cache
+from policies import greedy_food_policy
+
+SEEDS = [3, 11]
+
+
+@pytest.fixture(scope="module")
+def cache_path(tmp_path_factory):
+    path = tmp_path_factory.mktemp("levels") / "levels.bin"
+    write_cache(path, LevelConfig(), SEEDS)
+    return path
+
+
+def fresh_levels(seed, config):
+    state = random.Random(f"{seed}:level").getstate()
+    for level in range(1, LEVEL_COUNT + 1):
+        build = build_level(level, state, config, advance=level > 1)
+        yield build
+        state = build.rng_state
+
+
+def assert_same_build(loaded, fresh):
+    cells = fresh.maze.cells
+    assert (loaded.level, loaded.team_mode, loaded.roles) == (fresh.level, fresh.team_mode, fresh.roles)
+    assert loaded.grid == fresh.grid
+    assert loaded.sorted_rows == fresh.sorted_rows
+    assert bytes(loaded.maze.walls) == bytes(fresh.maze.walls)
+    assert list(loaded.maze.offsets) == list(fresh.maze.offsets)
+    assert list(loaded.maze.targets) == list(fresh.maze.targets)
+    assert list(loaded.food.dist) == list(fresh.food.dist)
+    assert list(loaded.food.owner) == list(fresh.food.owner)
+    assert loaded.food.pellets == fresh.food.pellets
+    assert all(bytes(loaded.routing.hop_row(s)) == bytes(fresh.routing.hop_row(s)) for s in range(cells))
+    assert loaded.rng_state == fresh.rng_state
+
+
+def test_round_trip_matches_build_level(cache_path):
+    with LevelCache(cache_path) as cache:
+        assert len(cache) == len(SEEDS) * LEVEL_COUNT
+        assert cache.check() == []
+        index = 0
+        for seed in SEEDS:
+            for fresh in fresh_levels(seed, cache.config):
+                assert cache.seed(index) == seed
+                assert_same_build(cache.level(index), fresh)
+                index += 1
+
+
+def test_record_size_estimate(cache_path):
+    with LevelCache(cache_path) as cache:
+        sizes = [INDEX.unpack_from(cache.data, HEADER.size + i * INDEX.size)[1] for i in range(len(cache))]
+    estimate = record_size(LevelConfig(), True)
+    assert all(0.95 * estimate < size < 1.05 * estimate for size in sizes)
+
+
+def test_corrupt_record_fails_its_checksum(cache_path, tmp_path):
+    data = bytearray(cache_path.read_bytes())
+    offset, size, _ = INDEX.unpack_from(data, HEADER.size + 2 * INDEX.size)
+    data[offset + size // 2] ^= 0xFF
+    path = tmp_path / "corrupt.bin"
+    path.write_bytes(data)
+    with LevelCache(path) as cache:
+        assert cache.check() == [2]
+        with pytest.raises(ValueError, match="corrupt"):
+            cache.level(2)
+        cache.level(1)
+        assert cache.find(SEEDS[0], 3, cache.config) is None
+    with LevelCache(path, verify=False) as cache:
+        cache.record(2)
+
+
+def test_close_with_live_views(cache_path):
+    cache = LevelCache(cache_path)
+    build = cache.level(0)
+    record = cache.record(1)
+    cache.close()
+    cache.close()
+    assert bytes(build.maze.walls) == bytes(next(fresh_levels(SEEDS[0], LevelConfig())).maze.walls)
+    assert build.routing.hop_row(0) is not None
+    assert len(record) > 0
+    with pytest.raises(ValueError, match="closed"):
+        cache.level(0)
+    with pytest.raises(ValueError, match="closed"):
+        cache.check()
+    game = Game(SEEDS[0])
+    game.install_level(build)
+    game.step(greedy_food_policy(game))
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_game_loads_levels_from_the_cache(cache_path, seed):
+    # A cached game plays exactly the levels and moves of one that generates them.
+    with LevelCache(cache_path) as cache:
+        cached = Game(seed, cache.config, ENEMY_PERIOD, cache=cache)
+        plain = Game(seed, cache.config, ENEMY_PERIOD)
+        while not plain.game_over and plain.tick < 3000:
+            action = greedy_food_policy(plain)
+            plain.step(action)
+            cached.step(action)
+            assert cached.grid == plain.grid
+            assert (cached.level, cached.player_pos, cached.enemy_positions) == \
+                (plain.level, plain.player_pos, plain.enemy_positions)
+        assert plain.level > 1
+        assert cache.hits == plain.level and cache.misses == 0
+        assert cached.level_rng.getstate() == plain.level_rng.getstate()
+
+
+def test_game_falls_back_to_generating(cache_path):
+    with LevelCache(cache_path) as cache:
+        game = Game(12345, cache.config, cache=cache)
+        assert cache.misses == 1 and cache.hits == 0
+        assert game.grid == Game(12345, cache.config).grid
+        other = LevelConfig(17, 17)
+        Game(SEEDS[0], other, cache=cache)
+        assert cache.misses == 2
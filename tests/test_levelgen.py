@@ -0,0 +1,74 @@
+import random
+
+import numpy as np
+import pytest
+
+import levelgen_numpy
+from engine import (LevelConfig, generate_adjacency, generate_grid, generate_level, generate_valid_barriers,
+                    is_connected)
+from maze import Maze
+
+CONFIGS = [LevelConfig(), LevelConfig(21, 12), LevelConfig(40, 40, row_spacing=6)]
+
+
+def wall_arrays(barriers, config):
+    width, height = config.width, config.height
+    wall_right = np.zeros((height, width), dtype=bool)
+    wall_down = np.zeros((height, width), dtype=bool)
+    for (ax, ay), (bx, by) in barriers:
+        if bx == ax + 1:
+            wall_right[ay, ax] = True
+        elif by == ay + 1:
+            wall_down[ay, ax] = True
+    wall_right[:, -1] = True
+    wall_down[-1, :] = True
+    return wall_right, wall_down
+
+
+def assert_same_maze(a, b):
+    assert bytes(a.walls) == bytes(b.walls)
+    assert list(a.offsets) == list(b.offsets)
+    assert list(a.targets) == list(b.targets)
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+@pytest.mark.parametrize("seed", range(5))
+def test_wall_arrays_match_barriers(config, seed):
+    rng = random.Random(seed)
+    grid = generate_grid(config.player_start(), rng, config)
+    barriers, maze, _ = generate_valid_barriers(3, grid, config.player_start(), rng, config)
+    wall_right, wall_down = wall_arrays(barriers, config)
+    assert levelgen_numpy.to_barriers(wall_right, wall_down) == barriers
+    assert_same_maze(Maze.from_walls(wall_right, wall_down), maze)
+    adjacency = generate_adjacency(barriers, config)
+    assert levelgen_numpy.to_adjacency(levelgen_numpy.open_moves(wall_right, wall_down)) == adjacency
+    for cell, neighbors in adjacency.items():
+        assert maze.neighbor_cells(cell) == neighbors
+
+
+@pytest.mark.parametrize("config", CONFIGS)
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_walls_build_the_same_maze_as_barriers(config, seed):
+    rng = np.random.default_rng(seed)
+    food = levelgen_numpy.generate_food(config, config.player_start(), rng)
+    wall_right, wall_down, _ = levelgen_numpy.generate_walls(config, rng)
+    levelgen_numpy.repair_connectivity(food, wall_right, wall_down, config.player_start(), rng)
+    barriers = levelgen_numpy.to_barriers(wall_right, wall_down)
+    maze = Maze.from_walls(wall_right, wall_down)
+    assert_same_maze(maze, Maze.from_barriers(barriers, config.width, config.height))
+    adjacency = levelgen_numpy.to_adjacency(levelgen_numpy.open_moves(wall_right, wall_down))
+    assert adjacency == generate_adjacency(barriers, config)
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+@pytest.mark.parametrize("size", [(15, 15), (21, 12), (60, 60)])
+def test_every_pellet_is_reachable(backend, size):
+    config = LevelConfig(*size, backend=backend)
+    rng = random.Random(size[0] * 31 + size[1])
+    for level in range(1, 8):
+        grid, maze, sorted_rows = generate_level(level, config.player_start(), rng, config)
+        reachable = is_connected(config.player_start(), maze)
+        pellets = {(x, y) for y, row in enumerate(grid) for x, value in enumerate(row) if value}
+        assert pellets <= reachable
+        assert grid[config.player_start()[1]][config.player_start()[0]] == 0
+        assert sorted_rows == sorted(sorted_rows)
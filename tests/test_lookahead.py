@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+from benchmark import FRAME_US, run_case, wander
+from engine import Game, LevelConfig
+from lookahead import SEARCH_DEPTH, SEARCH_NODE_BUDGET, RolloutSearch
+from policies import bfs_evasion_policy
+from replay import Recorder, Replay, ReplayPlayer
+
+TICKS = 300
+
+
+def chasing_game(seed, searcher):
+    game = Game(seed, LevelConfig(), searcher=searcher)
+    game.enemy_team_mode = False
+    game.enemy_roles = ['bfs'] * 4
+    return game
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_search_stays_within_node_budget(seed):
+    # A step may run one playout past its part of the budget, so four ghosts with up to five
+    # steps each overshoot by less than 20 playouts.
+    searcher = RolloutSearch()
+    game = chasing_game(seed, searcher)
+    rng = random.Random(seed)
+    for _ in range(50):
+        wander(game, rng)
+        game.enemy_positions = game.plan_enemies()
+        assert SEARCH_NODE_BUDGET - searcher.budget_left < SEARCH_NODE_BUDGET + 20 * SEARCH_DEPTH
+    assert searcher.playouts > 0
+
+
+def test_unlimited_search_plays_every_rollout():
+    searcher = RolloutSearch(rollouts=40, node_budget=None)
+    game = chasing_game(0, searcher)
+    game.enemy_positions = [(game.player_pos[0] + 2, game.player_pos[1])] * 4
+    game.plan_enemies()
+    assert searcher.budget_left is None
+    assert searcher.playouts >= 40
+
+
+def test_search_enemy_tick_fits_in_a_frame():
+    # The median rather than the p99, so a loaded test machine does not fail the suite;
+    # benchmark.py checks the p99.
+    result = run_case("enemy_tick_search", 15, 3, 100, 5.0, 0, run_memory=False, mix="bfs", enemies=4)
+    assert result["p50_us"] < FRAME_US
+
+
+@pytest.mark.parametrize("seed", range(3))
+@pytest.mark.parametrize("node_budget", [SEARCH_NODE_BUDGET, None])
+def test_search_replays(seed, node_budget):
+    game = Game(seed, LevelConfig(), 2, searcher=RolloutSearch(64, node_budget=node_budget))
+    recorder = Recorder(game)
+    while not game.game_over and game.tick < TICKS:
+        recorder.step(bfs_evasion_policy(game))
+    replay = Replay.from_bytes(recorder.replay.to_bytes())
+    assert replay.search == (64, game.searcher.depth, game.searcher.epsilon, node_budget)
+    played = ReplayPlayer(replay).run_to_end()
+    assert (played.tick, played.score, played.player_pos, played.enemy_positions) == \
+        (game.tick, game.score, game.player_pos, game.enemy_positions)
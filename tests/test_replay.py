@@ -0,0 +1,27 @@
+import pytest
+
+from engine import ENEMY_PERIOD, Game, LevelConfig
+from policies import greedy_food_policy
+from replay import SEED_LIMIT, Recorder, Replay, ReplayPlayer, check_seed
+
+
+@pytest.mark.parametrize("seed", [0, 12345, SEED_LIMIT - 1])
+def test_seeds_in_range_round_trip(seed):
+    game = Game(seed, LevelConfig(), ENEMY_PERIOD)
+    recorder = Recorder(game)
+    for _ in range(200):
+        recorder.step(greedy_food_policy(game))
+    replay = Replay.from_bytes(recorder.replay.to_bytes())
+    assert replay.seed == seed
+    played = ReplayPlayer(replay).run_to_end()
+    assert (played.tick, played.score, played.player_pos) == (game.tick, game.score, game.player_pos)
+
+
+@pytest.mark.parametrize("seed", [-1, SEED_LIMIT, 2 ** 70, "7", 1.5])
+def test_out_of_range_seeds_are_refused_up_front(seed):
+    with pytest.raises(ValueError, match="seed"):
+        check_seed(seed)
+    game = Game(seed if isinstance(seed, int) else 0, LevelConfig())
+    game.seed = seed
+    with pytest.raises(ValueError, match="seed"):
+        Recorder(game)
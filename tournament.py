@@ -0,0 +1,248 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from engine import (ENEMY_PERIOD, LEVEL_COUNT, POINTS_TO_NEXT_LEVEL, Game, LevelConfig, difficulty_labels, get_difficulty,
+                    role_choices)
+from levelcache import LevelCache, write_cache
+from lookahead import RolloutSearch
+from policies import bfs_evasion_policy, greedy_food_policy, make_random_policy
+
+# A match plays one level in isolation: the player starts it with the score of a player
+# who just reached it, and the match ends when the level is cleared, the player is caught
+# or max_ticks run out. Independent lineups play as level 1 and team lineups as level 6,
+# which is all the level number changes for the ghosts. Ghosts move every enemy_period
+# ticks, ENEMY_PERIOD by default as in the real game.
+#
+# Match i of every (policy, lineup) pair uses the same game seed, so lineups are compared
+# on the same boards, and tallies are integer sums, so the tables do not depend on the
+# number of workers or the order chunks finish in.
+#
+# With a level cache (--level-cache) each match loads its board from the file instead of
+# generating it; the first run with a given seed and game count writes the file.
+
+POLICIES = {
+    "greedy_food": lambda seed: greedy_food_policy,
+    "bfs_evasion": lambda seed: bfs_evasion_policy,
+    "random": make_random_policy,
+}
+INDEPENDENT_ROLES = ['bfs', 'predict', 'food_hunter', 'random']
+TEAM_LEVEL = 6
+MAX_TICKS = 2000
+CHUNK_SIZE = 5
+
+# (upper bound on the loss rate, label) for the suggested difficulty of a level.
+DIFFICULTY_THRESHOLDS = [(0.1, difficulty_labels[1]), (0.3, difficulty_labels[2]), (0.5, difficulty_labels[3]),
+                         (0.7, difficulty_labels[4]), (0.9, difficulty_labels[5]), (1.0, get_difficulty(6))]
+
+
+def lineup_name(lineup):
+    roles, team_mode = lineup
+    if team_mode:
+        return f"team{team_mode}+{roles[3]}"
+    return "+".join(roles)
+
+
+def canonical(roles):
+    return tuple(sorted(roles, key=INDEPENDENT_ROLES.index))
+
+
+def all_lineups():
+    # Every multiset of independent roles, in engine slot order, then both team modes with
+    # either fourth ghost.
+    lineups = [(roles, 0) for roles in itertools.combinations_with_replacement(INDEPENDENT_ROLES, 4)]
+    for team_mode in (1, 2):
+        for fourth in ('predict', 'food_hunter'):
+            lineups.append((('bfs', 'team', 'team', fourth), team_mode))
+    return lineups
+
+
+def level_lineups(level):
+    # The lineups the engine can field on a level, each with its probability.
+    options = {}
+    for roles in role_choices(level):
+        if level > 5:
+            for team_mode in (1, 2):
+                options[(tuple(roles), team_mode)] = options.get((tuple(roles), team_mode), 0) + 0.25
+        else:
+            key = (canonical(roles), 0)
+            options[key] = options.get(key, 0) + 0.5
+    return options
+
+
+def match_seed(seed, index):
+    return random.Random(f"{seed}:match:{index}").getrandbits(63)
+
+
+def play_match(base, policy_name, lineup, max_ticks):
+    roles, team_mode = lineup
+    level = TEAM_LEVEL if team_mode else 1
+    game = base.clone()
+    game.level = level
+    game.score = POINTS_TO_NEXT_LEVEL * (level - 1)
+    game.team_mode = team_mode
+    game.init_enemies_for_level(list(roles))
+    policy = POLICIES[policy_name](game.seed)
+    start_score = game.score
+    while not game.game_over and game.level == level and game.tick < max_ticks:
+        game.step(policy(game))
+    cleared = game.game_won or game.level != level
+    caught = game.game_over and not game.game_won
+    return cleared, caught, game.tick, game.score - start_score
+
+
+def play_chunk(policy_name, lineups, seed, first, count, config, max_ticks, enemy_period, searcher=None,
+               cache_path=None):
+    # Plays matches first .. first + count - 1 against every lineup, building or loading
+    # each board once. Returns one tally per lineup: [games, cleared, caught, ticks, pellets].
+    tallies = {lineup: [0, 0, 0, 0, 0] for lineup in lineups}
+    cache = LevelCache(cache_path) if cache_path else None
+    try:
+        for index in range(first, first + count):
+            base = Game(match_seed(seed, index), config, enemy_period, searcher=searcher, cache=cache)
+            for lineup in lineups:
+                cleared, caught, ticks, pellets = play_match(base, policy_name, lineup, max_ticks)
+                tally = tallies[lineup]
+                tally[0] += 1
+                tally[1] += cleared
+                tally[2] += caught
+                tally[3] += ticks
+                tally[4] += pellets
+    finally:
+        if cache is not None:
+            cache.close()
+    return tallies
+
+
+def merge(tallies, policy, chunk):
+    for lineup, tally in chunk.items():
+        total = tallies.setdefault((policy, lineup), [0, 0, 0, 0, 0])
+        for i, value in enumerate(tally):
+            total[i] += value
+
+
+def write_match_cache(path, games, seed=0, config=None, workers=1):
+    # The first level of every match board, for play_chunk's cache_path.
+    config = config or LevelConfig()
+    return write_cache(path, config, [match_seed(seed, index) for index in range(games)], workers=workers, levels=1)
+
+
+def run_tournament(policies, lineups, games, seed=0, config=None, workers=1, max_ticks=MAX_TICKS,
+                   chunk_size=CHUNK_SIZE, progress=None, searcher=None, enemy_period=ENEMY_PERIOD, cache_path=None):
+    config = config or LevelConfig()
+    tasks = [(policy, first, min(chunk_size, games - first)) for policy in policies for first in range(0, games, chunk_size)]
+    tallies = {}
+    if workers <= 1:
+        for done, (policy, first, count) in enumerate(tasks, 1):
+            merge(tallies, policy, play_chunk(policy, lineups, seed, first, count, config, max_ticks, enemy_period,
+                                              searcher, cache_path))
+            if progress:
+                progress(done, len(tasks))
+        return tallies
+    with ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(play_chunk, policy, lineups, seed, first, count, config, max_ticks, enemy_period,
+                               searcher, cache_path): policy
+                   for policy, first, count in tasks}
+        for done, future in enumerate(as_completed(futures), 1):
+            merge(tallies, futures[future], future.result())
+            if progress:
+                progress(done, len(tasks))
+    return tallies
+
+
+def rates(tally):
+    games, cleared, caught, ticks, pellets = tally
+    return {"games": games, "clear_rate": cleared / games, "loss_rate": caught / games,
+            "survival_ticks": ticks / games, "pellets": pellets / games}
+
+
+def suggest_label(loss_rate):
+    for bound, label in DIFFICULTY_THRESHOLDS:
+        if loss_rate <= bound:
+            return label
+    return DIFFICULTY_THRESHOLDS[-1][1]
+
+
+def level_table(tallies, policy):
+    # Per level: the lineup results weighted by how likely the engine is to field each one.
+    rows = []
+    for level in range(1, LEVEL_COUNT + 1):
+        row = {"level": level, "label": get_difficulty(level)}
+        totals = {"clear_rate": 0.0, "loss_rate": 0.0, "survival_ticks": 0.0, "pellets": 0.0}
+        for lineup, weight in level_lineups(level).items():
+            stats = rates(tallies[(policy, lineup)])
+            for name in totals:
+                totals[name] += weight * stats[name]
+        row.update(totals)
+        row["suggested"] = suggest_label(row["loss_rate"])
+        rows.append(row)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Play scripted players against every ghost lineup")
+    parser.add_argument("--games", type=int, default=200, help="matches per policy and lineup")
+    parser.add_argument("--policies", default=",".join(POLICIES), help="comma-separated, from " + ", ".join(POLICIES))
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-ticks", type=int, default=MAX_TICKS)
+    parser.add_argument("--enemy-period", type=int, default=ENEMY_PERIOD, help="ticks between ghost moves")
+    parser.add_argument("--width", type=int, default=LevelConfig().width)
+    parser.add_argument("--height", type=int, default=LevelConfig().height)
+    parser.add_argument("--search-rollouts", type=int, default=0,
+                        help="let the chasing ghost pick its moves by this many rollouts per tick (0: off)")
+    parser.add_argument("--level-cache", metavar="PATH",
+                        help="load match boards from this level cache, writing it first if it does not exist")
+    parser.add_argument("--output", help="write every table as JSON")
+    args = parser.parse_args(argv)
+    policies = [name for name in args.policies.split(",") if name]
+    for name in policies:
+        if name not in POLICIES:
+            parser.error(f"unknown policy {name}; choose from {', '.join(POLICIES)}")
+
+    lineups = all_lineups()
+    config = LevelConfig(args.width, args.height)
+    if args.level_cache and not os.path.exists(args.level_cache):
+        start = time.perf_counter()
+        count = write_match_cache(args.level_cache, args.games, args.seed, config, args.workers)
+        print(f"{count} boards written to {args.level_cache} in {time.perf_counter() - start:.1f}s")
+    start = time.perf_counter()
+
+    def progress(done, total):
+        print(f"\r{done}/{total} chunks", end="", flush=True)
+    tallies = run_tournament(policies, lineups, args.games, args.seed, config,
+                             args.workers, args.max_ticks, progress=progress,
+                             searcher=RolloutSearch(args.search_rollouts) if args.search_rollouts else None,
+                             enemy_period=args.enemy_period, cache_path=args.level_cache)
+    elapsed = time.perf_counter() - start
+    matches = sum(tally[0] for tally in tallies.values())
+    print(f"\r{matches} matches in {elapsed:.1f}s ({matches / elapsed:.0f}/s)")
+
+    report = {"seed": args.seed, "games": args.games, "max_ticks": args.max_ticks, "enemy_period": args.enemy_period,
+              "search_rollouts": args.search_rollouts, "lineups": [], "levels": {}}
+    for policy in policies:
+        print(f"\n{policy}")
+        print(f"{'lineup':<36} {'clear':>6} {'caught':>7} {'ticks':>8} {'pellets':>8}")
+        ranked = sorted(lineups, key=lambda lineup: -rates(tallies[(policy, lineup)])["loss_rate"])
+        for lineup in ranked:
+            stats = rates(tallies[(policy, lineup)])
+            report["lineups"].append({"policy": policy, "lineup": lineup_name(lineup), **stats})
+            print(f"{lineup_name(lineup):<36} {stats['clear_rate']:>6.0%} {stats['loss_rate']:>7.0%} "
+                  f"{stats['survival_ticks']:>8.1f} {stats['pellets']:>8.1f}")
+        print(f"\n{'level':<6} {'label':<10} {'clear':>6} {'caught':>7} {'ticks':>8} {'pellets':>8}  suggested")
+        report["levels"][policy] = level_table(tallies, policy)
+        for row in report["levels"][policy]:
+            print(f"{row['level']:<6} {row['label']:<10} {row['clear_rate']:>6.0%} {row['loss_rate']:>7.0%} "
+                  f"{row['survival_ticks']:>8.1f} {row['pellets']:>8.1f}  {row['suggested']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"\ntables written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()